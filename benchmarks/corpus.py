@@ -0,0 +1,124 @@
+"""Synthetic corpora and topic trees for the benchmark suite."""
+
+import random
+
+import pandas as pd
+
+SYLLABLES = "ba ce di fo gu ha je ki lo mu na pe qui ro sa te vi wo xa ze".split()
+COMMON_WORDS = (
+    "the of and to in is for that with on as by this from are be at or was it"
+).split()
+
+
+def _word(rng, syllables=(2, 4)):
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(*syllables)))
+
+
+def make_vocabularies(num_topics, words_per_topic=40, seed=0):
+    """
+    Build one keyword vocabulary per topic.
+
+    Parameters:
+    - num_topics: Number of topics
+    - words_per_topic: Keywords per topic
+    - seed: Random seed
+
+    Returns:
+    - labels: Topic labels (letters and spaces only)
+    - vocabularies: List of keyword lists, one per topic
+    """
+    rng = random.Random(seed)
+    labels, seen = [], set()
+    while len(labels) < num_topics:
+        label = " ".join(_word(rng).capitalize() for _ in range(rng.randint(1, 2)))
+        if label.lower() not in seen:
+            seen.add(label.lower())
+            labels.append(label)
+    vocabularies = [
+        [_word(rng, (2, 3)) for _ in range(words_per_topic)] for _ in labels
+    ]
+    return labels, vocabularies
+
+
+def make_corpus(num_docs, doc_len, num_topics, seed=0, duplicate_rate=0.0):
+    """
+    Generate documents mixing topic keywords with filler words.
+
+    Parameters:
+    - num_docs: Number of documents
+    - doc_len: Mean document length in words (actual lengths vary by +-50%)
+    - num_topics: Number of latent topics
+    - seed: Random seed
+    - duplicate_rate: Fraction of documents that repeat an earlier document
+
+    Returns:
+    - df: DataFrame with id, text and label columns
+    """
+    rng = random.Random(seed)
+    labels, vocabularies = make_vocabularies(num_topics, seed=seed)
+    rows = []
+    for i in range(num_docs):
+        if rows and rng.random() < duplicate_rate:
+            rows.append(dict(rows[rng.randrange(len(rows))], id=i))
+            continue
+        topic = rng.randrange(num_topics)
+        length = max(1, int(doc_len * rng.uniform(0.5, 1.5)))
+        words = [
+            (
+                rng.choice(vocabularies[topic])
+                if rng.random() < 0.4
+                else rng.choice(COMMON_WORDS)
+            )
+            for _ in range(length)
+        ]
+        sentences = [
+            " ".join(words[j : j + 12]).capitalize() + "."
+            for j in range(0, len(words), 12)
+        ]
+        rows.append({"id": i, "text": " ".join(sentences), "label": labels[topic]})
+    return pd.DataFrame(rows)
+
+
+def write_corpus(path, num_docs, doc_len, num_topics, seed=0, duplicate_rate=0.0):
+    """Write make_corpus() output as JSONL and return the DataFrame."""
+    df = make_corpus(num_docs, doc_len, num_topics, seed, duplicate_rate)
+    df.to_json(path, lines=True, orient="records")
+    return df
+
+
+def topic_lines(num_topics, num_subtopics=0, seed=0):
+    """
+    Build a topic hierarchy in the TopicTree file format.
+
+    Parameters:
+    - num_topics: Number of top-level topics
+    - num_subtopics: Number of second-level topics per top-level topic
+    - seed: Random seed
+
+    Returns:
+    - lines: Topic lines ("[1] Label (Count: n): desc", subtopics indented)
+    """
+    rng = random.Random(seed)
+    labels, vocabularies = make_vocabularies(num_topics, seed=seed)
+    lines = []
+    for label, vocabulary in zip(labels, vocabularies):
+        keywords = ", ".join(rng.sample(vocabulary, 5))
+        lines.append(
+            f"[1] {label} (Count: {rng.randint(1, 100)}): "
+            f"Documents about {label.lower()}, such as {keywords}."
+        )
+        for k in range(num_subtopics):
+            sub = f"{label} {_word(rng).capitalize()}"
+            lines.append(
+                f"    [2] {sub} (Count: {rng.randint(1, 20)}): "
+                f"Aspect {k + 1} of {label.lower()}."
+            )
+    return lines
+
+
+def write_topic_file(path, num_topics, num_subtopics=0, seed=0):
+    """Write topic_lines() to a topic file and return the lines."""
+    lines = topic_lines(num_topics, num_subtopics, seed)
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    return lines
@@ -0,0 +1,438 @@
+"""
+Benchmark every pipeline stage and the tokenizer/embedding hot spots.
+
+All LLM calls go to the offline mock backend (APIClient(api="mock")), so the
+numbers measure the pipeline's own overhead plus the simulated latency.
+Results are written as JSON for comparison across commits:
+
+    python benchmarks/run_benchmarks.py --docs 500 --doc-len 300 --topics 50 \
+        --out benchmarks/results/$(git rev-parse --short HEAD).json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path[:0] = [BENCH_DIR, REPO_DIR]
+
+from corpus import write_corpus, write_topic_file  # noqa: E402
+from topicgpt_python.utils import APIClient, TopicTree  # noqa: E402
+
+TEMPLATES = os.path.join(REPO_DIR, "templates")
+STAGES = ["generation_1", "refinement", "generation_2", "assignment", "correction"]
+HOTSPOTS = [
+    "tokenizer_cold",
+    "tokenizer_warm",
+    "construct_document",
+    "topic_pairs",
+    "topic_tree",
+    "compact_tree",
+    "assignment_prompts",
+]
+
+
+class EmbeddingCounter:
+    """Count SentenceTransformer model loads, encode calls and sentences."""
+
+    def __init__(self):
+        self.loads = 0
+        self.calls = 0
+        self.sentences = 0
+
+    def install(self):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            return self
+        counter = self
+        init, encode = SentenceTransformer.__init__, SentenceTransformer.encode
+
+        def counted_init(self, *args, **kwargs):
+            counter.loads += 1
+            return init(self, *args, **kwargs)
+
+        def counted_encode(self, sentences, *args, **kwargs):
+            counter.calls += 1
+            counter.sentences += 1 if isinstance(sentences, str) else len(sentences)
+            return encode(self, sentences, *args, **kwargs)
+
+        SentenceTransformer.__init__ = counted_init
+        SentenceTransformer.encode = counted_encode
+        return self
+
+    def snapshot(self):
+        return self.loads, self.calls, self.sentences
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def measure(fn, items, api_client, embeddings, quiet=True):
+    """
+    Run `fn` once and report timing and counters.
+
+    Parameters:
+    - fn: Zero-argument callable; may return the number of items processed
+      as an int
+    - items: Default number of items (documents, topics, ...) processed, or
+      a zero-argument callable counting them, called after fn
+    - api_client: APIClient whose tokenizer and telemetry are tracked
+    - embeddings: EmbeddingCounter
+    - quiet: Silence the stage's own stdout
+
+    Returns:
+    - dict: seconds, items, items_per_sec, requests, tokenizer_calls,
+      tokenizer_hits, embedding_loads, embedding_calls, embedded_sentences,
+      peak_rss_mb
+    """
+    counter = api_client.token_counter
+    encode0, hits0 = counter.encode_calls, counter.hits
+    requests0 = api_client.telemetry.summary()["requests"]
+    loads0, calls0, sentences0 = embeddings.snapshot()
+
+    output = contextlib.redirect_stdout(io.StringIO()) if quiet else None
+    start = time.perf_counter()
+    with output or contextlib.nullcontext():
+        processed = fn()
+    seconds = time.perf_counter() - start
+
+    if isinstance(processed, int):
+        items = processed
+    elif callable(items):
+        items = items()
+    loads, calls, sentences = embeddings.snapshot()
+    return {
+        "seconds": round(seconds, 4),
+        "items": items,
+        "items_per_sec": round(items / seconds, 2) if seconds > 0 else None,
+        "requests": api_client.telemetry.summary()["requests"] - requests0,
+        "tokenizer_calls": counter.encode_calls - encode0,
+        "tokenizer_hits": counter.hits - hits0,
+        "embedding_loads": loads - loads0,
+        "embedding_calls": calls - calls0,
+        "embedded_sentences": sentences - sentences0,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def _rows(path):
+    with open(path) as f:
+        return sum(1 for line in f if line.strip())
+
+
+def _topics(topic_file):
+    from topicgpt_python.utils import TopicTree
+
+    return len(TopicTree().from_topic_list(topic_file, from_file=True).to_topic_list())
+
+
+def _reprompted(data_file, topic_file):
+    """Rows correction re-prompts: errors and hallucinated topics."""
+    import pandas as pd
+
+    from topicgpt_python.correction import topic_parser
+    from topicgpt_python.utils import TopicTree
+
+    topics_root = TopicTree().from_topic_list(topic_file, from_file=True)
+    error, hallucinated = topic_parser(topics_root, pd.read_json(data_file, lines=True))
+    return len(error) + len(hallucinated)
+
+
+def run_stages(args, work_dir, embeddings):
+    """Run the pipeline end to end on the mock backend, timing each stage."""
+    from topicgpt_python.assignment import assign_topics
+    from topicgpt_python.correction import correct_topics
+    from topicgpt_python.generation_1 import generate_topic_lvl1
+    from topicgpt_python.generation_2 import generate_topic_lvl2
+    from topicgpt_python.refinement import refine_topics
+
+    api_client = make_client(args)
+    path = lambda name: os.path.join(work_dir, name)  # noqa: E731
+    template = lambda name: os.path.join(TEMPLATES, name)  # noqa: E731
+    data = path("corpus.jsonl")
+    write_topic_file(path("assignment_topics.md"), args.topics, args.subtopics)
+
+    stages = {
+        "generation_1": lambda: (
+            generate_topic_lvl1(
+                None,
+                None,
+                data,
+                template("generation_1.txt"),
+                template("seed_1.md"),
+                path("generation_1.jsonl"),
+                path("generation_1.md"),
+                False,
+                early_stop=args.early_stop,
+                api_client=api_client,
+            ),
+            _rows(path("generation_1.jsonl")),
+        )[1],
+        "refinement": lambda: refine_topics(
+            None,
+            None,
+            template("refinement.txt"),
+            path("generation_1.jsonl"),
+            path("generation_1.md"),
+            path("refinement.md"),
+            path("refinement.jsonl"),
+            False,
+            False,
+            path("refiner_mapping.json"),
+            api_client=api_client,
+        ),
+        "generation_2": lambda: (
+            generate_topic_lvl2(
+                None,
+                None,
+                path("refinement.md"),
+                path("refinement.jsonl"),
+                template("generation_2.txt"),
+                path("generation_2.jsonl"),
+                path("generation_2.md"),
+                False,
+                api_client=api_client,
+            ),
+            _rows(path("refinement.jsonl")),
+        )[1],
+        "assignment": lambda: assign_topics(
+            None,
+            None,
+            data,
+            template("assignment.txt"),
+            path("assignment.jsonl"),
+            path("assignment_topics.md"),
+            False,
+            concurrency=args.concurrency,
+            api_client=api_client,
+        ),
+        "correction": lambda: correct_topics(
+            None,
+            None,
+            path("assignment.jsonl"),
+            template("correction.txt"),
+            path("assignment_topics.md"),
+            path("correction.jsonl"),
+            False,
+            api_client=api_client,
+            concurrency=args.concurrency,
+        ),
+    }
+    # Refinement works on first-level topics and correction on the rows it
+    # re-prompts; the other stages count documents. Inputs are unchanged by
+    # the stage, so these are counted after it, outside the timing.
+    items = {
+        "refinement": ("topics", lambda: _topics(path("generation_1.md"))),
+        "correction": (
+            "rows",
+            lambda: _reprompted(path("assignment.jsonl"), path("assignment_topics.md")),
+        ),
+    }
+    results = {}
+    for name in args.stages:
+        unit, count = items.get(name, ("docs", args.docs))
+        results[name] = measure(stages[name], count, api_client, embeddings, args.quiet)
+        results[name]["unit"] = unit
+        results[name]["telemetry"] = api_client.telemetry.summary(name)
+        print(f"{name}: {results[name]['seconds']:.2f}s", file=sys.stderr)
+    return results
+
+
+def run_hotspots(args, work_dir, embeddings):
+    """Time the tokenizer and embedding hot spots in isolation."""
+    from topicgpt_python.assignment import build_assignment_prompts
+    from topicgpt_python.generation_2 import construct_document
+    from topicgpt_python.refinement import topic_pairs
+    from topicgpt_python.compact_tree import CompactTopicTree
+
+    docs = pd.read_json(os.path.join(work_dir, "corpus.jsonl"), lines=True)[
+        "text"
+    ].tolist()
+    topic_file = os.path.join(work_dir, "hotspot_topics.md")
+    lines = write_topic_file(topic_file, args.topics, args.subtopics)
+    tree = TopicTree().from_topic_list(topic_file, from_file=True)
+    topic_sent = tree.to_topic_list(desc=True, count=False)
+
+    tokenizer_client = make_client(args)
+    client = make_client(args)
+
+    def tree_ops(tree_cls=TopicTree):
+        for _ in range(args.tree_rounds):
+            t = tree_cls.from_topic_list(lines)
+            t.to_topic_list(desc=True, count=False)
+            t.to_prompt_view()
+            for node in t.root.descendants:
+                t.find_duplicates(node.name, node.lvl)
+        return args.tree_rounds * len(lines)
+
+    def pair_rounds():
+        all_pairs = []
+        for _ in range(args.pair_rounds):
+            new_pairs, all_pairs = topic_pairs(topic_sent, all_pairs)
+            if len(new_pairs) <= 1:
+                break
+        return len(all_pairs)
+
+    hotspots = {
+        "tokenizer_cold": (
+            lambda: tokenizer_client.estimate_token_counts(docs),
+            len(docs),
+            tokenizer_client,
+        ),
+        "tokenizer_warm": (
+            lambda: [tokenizer_client.estimate_token_count(d) for d in docs],
+            len(docs),
+            tokenizer_client,
+        ),
+        "construct_document": (
+            lambda: construct_document(client, docs, args.context_len),
+            len(docs),
+            client,
+        ),
+        "topic_pairs": (pair_rounds, len(topic_sent), client),
+        "topic_tree": (tree_ops, len(lines), client),
+        "compact_tree": (lambda: tree_ops(CompactTopicTree), len(lines), client),
+        "assignment_prompts": (
+            lambda: build_assignment_prompts(
+                client,
+                tree,
+                docs,
+                open(os.path.join(TEMPLATES, "assignment.txt")).read(),
+                args.context_len,
+                False,
+            ),
+            len(docs),
+            client,
+        ),
+    }
+    if "tokenizer_warm" in args.hotspots and "tokenizer_cold" not in args.hotspots:
+        tokenizer_client.estimate_token_counts(docs)
+    results = {}
+    for name in args.hotspots:
+        fn, items, api_client = hotspots[name]
+        results[name] = measure(fn, items, api_client, embeddings, args.quiet)
+        print(f"{name}: {results[name]['seconds']:.2f}s", file=sys.stderr)
+    return results
+
+
+def make_client(args):
+    return APIClient(
+        api="mock",
+        model=args.model,
+        mock_options=dict(
+            latency=args.latency,
+            error_rate=args.error_rate,
+            rate_limit_rate=args.rate_limit_rate,
+            hallucination_rate=args.hallucination_rate,
+            num_topics=args.topics,
+            seed=args.seed,
+        ),
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--docs", type=int, default=200, help="Number of documents")
+    parser.add_argument("--doc-len", type=int, default=200, help="Words per doc")
+    parser.add_argument("--topics", type=int, default=30, help="Top-level topics")
+    parser.add_argument("--subtopics", type=int, default=2, help="Subtopics each")
+    parser.add_argument("--duplicate-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--model", type=str, default="gpt-4o")
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Mock median latency (s)"
+    )
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--hallucination-rate",
+        type=float,
+        default=0.1,
+        help="Share of mock assignments outside the hierarchy (feeds correction)",
+    )
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--early-stop", type=int, default=50)
+    parser.add_argument(
+        "--context-len",
+        type=int,
+        default=1000,
+        help="Context length for the prompt-building hot spots (small values "
+        "force topic pruning)",
+    )
+    parser.add_argument("--pair-rounds", type=int, default=20)
+    parser.add_argument("--tree-rounds", type=int, default=5)
+    parser.add_argument(
+        "--stages", nargs="*", default=STAGES, choices=STAGES, help="Stages to run"
+    )
+    parser.add_argument(
+        "--hotspots", nargs="*", default=HOTSPOTS, choices=HOTSPOTS, help="Hot spots"
+    )
+    parser.add_argument("--work-dir", type=str, default=None)
+    parser.add_argument("--out", type=str, default=None, help="JSON results file")
+    parser.add_argument(
+        "--no-quiet", dest="quiet", action="store_false", help="Show stage output"
+    )
+    args = parser.parse_args(argv)
+
+    embeddings = EmbeddingCounter().install()
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="topicgpt-bench-")
+    os.makedirs(work_dir, exist_ok=True)
+    write_corpus(
+        os.path.join(work_dir, "corpus.jsonl"),
+        args.docs,
+        args.doc_len,
+        args.topics,
+        args.seed,
+        args.duplicate_rate,
+    )
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": {k: v for k, v in vars(args).items() if k != "out"},
+        },
+        "stages": run_stages(args, work_dir, embeddings) if args.stages else {},
+        "hotspots": run_hotspots(args, work_dir, embeddings) if args.hotspots else {},
+    }
+    results["meta"]["peak_rss_mb"] = round(peak_rss_mb(), 1)
+
+    text = json.dumps(results, indent=2)
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import asyncio
+import random
+import re
+import zlib
+from functools import lru_cache
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from topicgpt_python import utils
+
+
+class WhitespaceEncoding:
+    """Stand-in for a tiktoken encoding: one token per word or whitespace run."""
+
+    pattern = re.compile(r"\S+|\s+")
+
+    def encode(self, text):
+        return self.pattern.findall(text)
+
+    def encode_batch(self, texts):
+        return [self.encode(text) for text in texts]
+
+    def decode(self, tokens):
+        return "".join(tokens)
+
+
+@lru_cache(maxsize=None)
+def _tiktoken_available():
+    try:
+        utils._get_encoding("gpt-4o")
+        return True
+    except Exception:
+        return False
+
+
+@pytest.fixture(autouse=True)
+def offline_encoding(monkeypatch):
+    """Fall back to a whitespace tokenizer when tiktoken cannot download its encoding."""
+    if not _tiktoken_available():
+        monkeypatch.setattr(utils, "_get_encoding", lambda model: WhitespaceEncoding())
+
+
+class FakeChat:
+    """
+    Stand-in for an OpenAI-style SDK client.
+
+    Answers every prompt with "Response to: <prompt>", counts calls (keeping
+    the last request), and raises `error` instead when it is set. Raw responses carry `headers`.
+    `aio` is the matching async client, which waits up to `delay` seconds
+    per call.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.error = None
+        self.delay = 0.0
+        self.headers = {}
+        self.last_request = None
+        self.chat = SimpleNamespace(
+            completions=SimpleNamespace(
+                create=self.create,
+                with_raw_response=SimpleNamespace(create=self.create_raw),
+            )
+        )
+        self.aio = SimpleNamespace(
+            chat=SimpleNamespace(
+                completions=SimpleNamespace(
+                    create=self.acreate,
+                    with_raw_response=SimpleNamespace(create=self.acreate_raw),
+                )
+            )
+        )
+
+    @staticmethod
+    def respond(prompt):
+        return f"Response to: {prompt}"
+
+    def create(self, model, messages, **kwargs):
+        self.calls += 1
+        self.last_request = dict(kwargs, model=model, messages=messages)
+        if self.error is not None:
+            raise self.error
+        prompt = messages[-1]["content"]
+        return SimpleNamespace(
+            choices=[
+                SimpleNamespace(message=SimpleNamespace(content=self.respond(prompt)))
+            ],
+            usage=SimpleNamespace(
+                prompt_tokens=len(prompt.split()), completion_tokens=3
+            ),
+        )
+
+    async def acreate(self, model, messages, **kwargs):
+        await asyncio.sleep(self.delay * random.random())
+        return self.create(model, messages, **kwargs)
+
+    def create_raw(self, **kwargs):
+        completion = self.create(**kwargs)
+        return SimpleNamespace(headers=self.headers, parse=lambda: completion)
+
+    async def acreate_raw(self, **kwargs):
+        completion = await self.acreate(**kwargs)
+        return SimpleNamespace(headers=self.headers, parse=lambda: completion)
+
+
+@pytest.fixture
+def client():
+    """APIClient for an OpenAI-compatible endpoint, answered by FakeChat."""
+    client = utils.APIClient(
+        api="openai-compatible",
+        model="gpt-4o",
+        base_url="http://localhost:1/v1",
+        api_key="test",
+    )
+    client.client = FakeChat()
+    client._get_async_client = lambda: client.client.aio
+    return client
+
+
+class BagOfWordsModel:
+    """Stand-in for a SentenceTransformer: hashed bag-of-words vectors."""
+
+    dim = 64
+
+    def __init__(self):
+        self.calls = 0
+
+    def encode(self, sentences, **kwargs):
+        self.calls += 1
+        vectors = np.zeros((len(sentences), self.dim), dtype=np.float32)
+        for row, sentence in enumerate(sentences):
+            for word in re.findall(r"\w+", sentence.lower()):
+                vectors[row, zlib.crc32(word.encode()) % self.dim] += 1
+        return vectors
+
+
+@pytest.fixture
+def embedder(monkeypatch):
+    """EmbeddingService backed by BagOfWordsModel, installed as the shared one."""
+    from topicgpt_python import embeddings
+
+    service = embeddings.EmbeddingService()
+    service._model = BagOfWordsModel()
+    monkeypatch.setattr(embeddings, "_SERVICE", service)
+    return service
@@ -0,0 +1,179 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from conftest import FakeChat
+from topicgpt_python.utils import (
+    APIClient,
+    clear_shared_clients,
+    resolve_concurrency,
+    shared_client,
+)
+
+
+def test_concurrent_prompt_keeps_input_order(client):
+    client.client.delay = 0.01
+    prompts = [f"prompt {i}" for i in range(20)]
+    responses = client.concurrent_prompt(prompts, 100, 0.0, concurrency=8)
+    assert responses == [FakeChat.respond(p) for p in prompts]
+
+
+def test_concurrent_prompt_consumes_generators_and_returns_exceptions(client):
+    client.client.error = RuntimeError("boom")
+    responses = client.concurrent_prompt(
+        (p for p in ["a", "b"]),
+        100,
+        0.0,
+        concurrency=2,
+        num_try=1,
+        return_exceptions=True,
+    )
+    assert len(responses) == 2
+    assert all(isinstance(r, RuntimeError) for r in responses)
+    with pytest.raises(RuntimeError):
+        client.concurrent_prompt(["a"], 100, 0.0, num_try=1)
+
+
+def test_concurrent_prompt_works_inside_a_running_loop(client):
+    async def notebook_cell():
+        return client.concurrent_prompt(["a", "b"], 100, 0.0)
+
+    assert asyncio.run(notebook_cell()) == [
+        FakeChat.respond("a"),
+        FakeChat.respond("b"),
+    ]
+
+
+def test_async_iterative_prompt(client):
+    response = asyncio.run(client.async_iterative_prompt("a", 100, 0.0))
+    assert response == FakeChat.respond("a")
+
+
+def test_clients_for_one_endpoint_share_the_sdk_client():
+    def make(base_url):
+        return APIClient(
+            api="openai-compatible", model="gpt-4o", base_url=base_url, api_key="k"
+        )
+
+    first, second = make("http://localhost:1/v1"), make("http://localhost:1/v1")
+    assert first.client is second.client
+    assert make("http://localhost:2/v1").client is not first.client
+    clear_shared_clients()
+    assert make("http://localhost:1/v1").client is not first.client
+
+
+def test_shared_client_builds_once_per_key():
+    built = []
+
+    def factory():
+        built.append(object())
+        return built[-1]
+
+    key = ("test", None, None)
+    assert shared_client(key, factory) is shared_client(key, factory) is built[0]
+    assert len(built) == 1
+    clear_shared_clients()
+
+
+def test_batch_prompt_iter_pulls_prompts_one_chunk_at_a_time(client):
+    client.api = "vllm"
+    batches, pulled = [], []
+
+    def generate(prompts, *args):
+        batches.append(prompts)
+        return [FakeChat.respond(p) for p in prompts], (len(prompts), len(prompts))
+
+    client._generate_batch = generate
+
+    def prompts():
+        for i in range(5):
+            pulled.append(i)
+            yield f"prompt {i}"
+
+    chunks = client.batch_prompt_iter(prompts(), 100, 0.0, chunk_size=2)
+    assert next(chunks) == [FakeChat.respond("prompt 0"), FakeChat.respond("prompt 1")]
+    assert len(pulled) == 2
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+
+
+def test_concurrent_duplicates_share_one_call(client):
+    client.client.delay = 0.05
+    responses = client.concurrent_prompt(["same"] * 4, 100, 0.7, concurrency=4)
+    assert responses == [FakeChat.respond("same")] * 4
+    assert client.client.calls == 1
+
+
+def test_duplicates_across_threads_share_one_call(client):
+    release = threading.Event()
+    create = client.client.create
+
+    def slow_create(*args, **kwargs):
+        release.wait(5)
+        return create(*args, **kwargs)
+
+    client.client.chat.completions.create = slow_create
+    with ThreadPoolExecutor(4) as pool:
+        futures = [
+            pool.submit(client.iterative_prompt, "same", 100, 0.7) for _ in range(4)
+        ]
+        time.sleep(0.05)
+        release.set()
+        assert {f.result() for f in futures} == {FakeChat.respond("same")}
+    assert client.client.calls == 1
+
+
+def test_completed_deterministic_responses_are_reused(client):
+    client.iterative_prompt("p", 100, 0.0)
+    _, stats = client.iterative_prompt("p", 100, 0.0, return_stats=True)
+    assert stats["deduplicated"] and client.client.calls == 1
+
+
+def test_errors_reach_every_waiter(client):
+    client.client.delay = 0.05
+    client.client.error = RuntimeError("boom")
+    responses = client.concurrent_prompt(
+        ["same"] * 3, 100, 0.0, num_try=1, return_exceptions=True
+    )
+    assert all(isinstance(r, RuntimeError) for r in responses)
+    assert client.client.calls == 1
+
+
+def test_dedupe_off_sends_every_request(client):
+    client.dedupe = False
+    client.client.delay = 0.02
+    client.concurrent_prompt(["same"] * 3, 100, 0.0, concurrency=3)
+    client.iterative_prompt("same", 100, 0.0)
+    assert client.client.calls == 4
+
+
+def test_client_keeps_one_event_loop_until_closed(client):
+    client.concurrent_prompt(["a", "b"], 10, 0.0)
+    loop = client._loop
+    threads = threading.active_count()
+    for _ in range(5):
+        client.concurrent_prompt(["c", "d"], 10, 0.0)
+    assert client._loop is loop and threading.active_count() == threads
+    client.close()
+    assert client._loop is None and loop.is_closed()
+    assert client.concurrent_prompt(["e"], 10, 0.0) == [FakeChat.respond("e")]
+    client.close()
+
+
+def test_concurrency_defaults_per_api(client):
+    assert resolve_concurrency(client) == 8
+    assert resolve_concurrency(client, 0) == 1
+    client.api = "vllm"
+    assert resolve_concurrency(client) == 1
+    assert resolve_concurrency(client, 4) == 4
+
+
+def test_sampled_responses_are_not_reused(client):
+    client.iterative_prompt("hello", 10, 0.7)
+    client.iterative_prompt("hello", 10, 0.7)
+    client.concurrent_prompt(["hello", "hello"], 10, 0.7)
+    # The two concurrent duplicates still share one call
+    assert client.client.calls == 3
@@ -0,0 +1,10 @@
+from topicgpt_python.assignment import build_assignment_prompt
+
+
+def test_truncating_a_document_is_always_reported(client, capsys):
+    doc = " ".join(["word"] * 100)
+    prompt, truncated = build_assignment_prompt(
+        client, doc, "[1] Trade", 3, 5, "{tree}\n{Document}", 60, verbose=False
+    )
+    assert len(truncated) < len(doc) and prompt.endswith(truncated)
+    assert "Truncating document from" in capsys.readouterr().out
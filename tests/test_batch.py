@@ -0,0 +1,177 @@
+import json
+
+from conftest import FakeChat
+from topicgpt_python.batch import (
+    LocalBatchBackend,
+    read_batch_output,
+    run_batch,
+    write_batch_input,
+)
+
+
+def test_write_batch_input(tmp_path):
+    path = str(tmp_path / "input.jsonl")
+    ids = write_batch_input(path, ["a", "b"], "gpt-4o", 100, 0.0, 1.0)
+    assert ids == ["request-0", "request-1"]
+    with open(path) as f:
+        requests = [json.loads(line) for line in f]
+    assert [r["custom_id"] for r in requests] == ids
+    assert requests[1]["body"]["messages"][1] == {"role": "user", "content": "b"}
+    assert requests[0]["body"]["max_tokens"] == 100
+
+
+def test_read_batch_output_marks_failures(tmp_path):
+    path = tmp_path / "output.jsonl"
+    ok = {"status_code": 200, "body": {"choices": [{"message": {"content": "x"}}]}}
+    records = [
+        {"custom_id": "request-0", "response": ok, "error": None},
+        {"custom_id": "request-1", "response": None, "error": {"message": "boom"}},
+        {"custom_id": "request-2", "response": dict(ok, status_code=500)},
+    ]
+    path.write_text("\n".join(json.dumps(r) for r in records) + "\n")
+    assert read_batch_output(str(path)) == {
+        "request-0": "x",
+        "request-1": None,
+        "request-2": None,
+    }
+
+
+def _upper(body):
+    prompt = body["messages"][1]["content"]
+    if prompt == "fail":
+        raise RuntimeError("boom")
+    return prompt.upper()
+
+
+def test_run_batch_joins_results_in_prompt_order(tmp_path):
+    backend = LocalBatchBackend(str(tmp_path / "local"), handler=_upper)
+    responses = run_batch(
+        backend,
+        ["a", "fail", "c"],
+        str(tmp_path / "batch"),
+        "mock",
+        100,
+        0.0,
+        1.0,
+        poll_interval=0,
+    )
+    assert responses == ["A", "Error", "C"]
+
+
+def test_local_backend_uses_the_client(tmp_path, client):
+    backend = LocalBatchBackend(str(tmp_path / "local"), api_client=client)
+    responses = run_batch(
+        backend, ["hello"], str(tmp_path / "batch"), "gpt-4o", 100, 0.0, 1.0
+    )
+    assert responses == [FakeChat.respond("hello")]
+
+
+def test_run_batch_shards_by_count_and_size(tmp_path):
+    backend = LocalBatchBackend(str(tmp_path / "local"), handler=_upper)
+    batch_dir = tmp_path / "batch"
+    prompts = ["a", "b", "c", "d" * 2000, "e"]
+    responses = run_batch(
+        backend,
+        prompts,
+        str(batch_dir),
+        "mock",
+        100,
+        0.0,
+        1.0,
+        max_requests=2,
+        max_bytes=1000,
+    )
+    assert responses == [p.upper() for p in prompts]
+    # [a, b], [c], [d...] (over max_bytes on its own), [e]
+    sizes = [
+        len((batch_dir / f"batch_input_{k}.jsonl").read_text().splitlines())
+        for k in range(4)
+    ]
+    assert sizes == [2, 1, 1, 1]
+    manifest = json.loads((batch_dir / "batch_manifest.json").read_text())
+    assert [b["requests"] for b in manifest["batches"]] == sizes
+
+
+class _Interrupted(LocalBatchBackend):
+    """Counts submissions; the first status check after one fails."""
+
+    def __init__(self, *args, fail_after=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.submitted, self.fail_after = 0, fail_after
+
+    def submit(self, input_path):
+        self.submitted += 1
+        return super().submit(input_path)
+
+    def status(self, batch_id):
+        if self.fail_after is not None:
+            raise KeyboardInterrupt
+        return super().status(batch_id)
+
+
+def test_run_batch_resumes_submitted_batches(tmp_path):
+    work_dir, batch_dir = str(tmp_path / "local"), str(tmp_path / "batch")
+    args = (["a", "fail", "c"], batch_dir, "mock", 100, 0.0, 1.0)
+    first = _Interrupted(work_dir, handler=_upper, fail_after=0)
+    try:
+        run_batch(first, *args, max_requests=2)
+    except KeyboardInterrupt:
+        pass
+    assert first.submitted == 2
+
+    rerun = _Interrupted(work_dir, handler=_upper)
+    assert run_batch(rerun, *args, max_requests=2) == ["A", "Error", "C"]
+    assert rerun.submitted == 0
+    # Different requests start new batches
+    assert run_batch(rerun, ["b"], batch_dir, "mock", 100, 0.0, 1.0) == ["B"]
+    assert rerun.submitted == 1
+
+
+class _ProviderBackend(LocalBatchBackend):
+    """Local backend whose output reports usage, as the provider's does."""
+
+    records_usage = False
+
+    def download(self, batch_id, output_path):
+        with open(self._path(batch_id, "output.jsonl")) as f:
+            records = [json.loads(line) for line in f]
+        with open(output_path, "w") as f:
+            for record in records:
+                if record["response"]:
+                    record["response"]["body"]["usage"] = {
+                        "prompt_tokens": 10,
+                        "completion_tokens": 2,
+                    }
+                f.write(json.dumps(record) + "\n")
+
+
+def test_run_batch_records_usage_in_the_client_telemetry(tmp_path, client):
+    client.stage = "assignment"
+    backend = _ProviderBackend(str(tmp_path / "local"), handler=_upper)
+    run_batch(
+        backend,
+        ["a", "fail", "c"],
+        str(tmp_path / "batch"),
+        "gpt-4o",
+        100,
+        0.0,
+        1.0,
+        api_client=client,
+    )
+    summary = client.telemetry.summary("assignment")
+    assert summary["requests"] == 3 and summary["errors"] == 1
+    assert (summary["prompt_tokens"], summary["completion_tokens"]) == (20, 4)
+    # Requests the client already sent itself are not counted twice
+    client.stage = "correction"
+    local = LocalBatchBackend(str(tmp_path / "local"), api_client=client)
+    run_batch(
+        local,
+        ["hello"],
+        str(tmp_path / "batch2"),
+        "gpt-4o",
+        100,
+        0.0,
+        1.0,
+        api_client=client,
+    )
+    assert client.telemetry.summary("correction")["requests"] == 1
@@ -0,0 +1,49 @@
+import json
+import os
+import sys
+
+BENCH_DIR = os.path.join(os.path.dirname(__file__), os.pardir, "benchmarks")
+sys.path.insert(0, BENCH_DIR)
+
+from corpus import make_corpus, topic_lines  # noqa: E402
+from run_benchmarks import HOTSPOTS, STAGES, main  # noqa: E402
+
+from topicgpt_python.utils import TopicTree  # noqa: E402
+
+
+def test_corpus_is_deterministic_per_seed():
+    first, second = make_corpus(20, 30, 5, seed=1), make_corpus(20, 30, 5, seed=1)
+    assert first.equals(second)
+    assert not first.equals(make_corpus(20, 30, 5, seed=2))
+    assert make_corpus(50, 30, 5, duplicate_rate=0.5)["text"].nunique() < 50
+    assert len(topic_lines(4, 2)) == 12
+
+
+def test_smoke_run_reports_every_stage_and_hotspot(tmp_path):
+    out = tmp_path / "results.json"
+    main(
+        [
+            "--docs=12",
+            "--doc-len=20",
+            "--topics=4",
+            "--early-stop=5",
+            "--pair-rounds=2",
+            "--tree-rounds=1",
+            f"--work-dir={tmp_path / 'work'}",
+            f"--out={out}",
+        ]
+    )
+    results = json.loads(out.read_text())
+    assert list(results["stages"]) == STAGES
+    assert list(results["hotspots"]) == HOTSPOTS
+    assignment = results["stages"]["assignment"]
+    assert assignment["items"] == 12 and assignment["requests"] > 0
+    assert assignment["telemetry"]["stage"] == "assignment"
+    assert assignment["unit"] == "docs"
+    refinement, correction = (results["stages"][s] for s in STAGES[1::3])
+    topics = TopicTree.from_topic_list(
+        str(tmp_path / "work" / "generation_1.md"), from_file=True
+    ).to_topic_list()
+    assert (refinement["unit"], refinement["items"]) == ("topics", len(topics))
+    assert correction["unit"] == "rows"
+    assert correction["items"] == correction["telemetry"]["requests"]
@@ -0,0 +1,55 @@
+from topicgpt_python.cache import ResponseCache
+
+
+def test_key_depends_on_every_parameter():
+    base = ["openai", "gpt-4o", "sys", "prompt", 100, 0.0, 1.0]
+    keys = {ResponseCache.make_key(*base)}
+    for i, value in enumerate(["vllm", "gpt-4", "other", "other", 200, 0.5, 0.9]):
+        keys.add(ResponseCache.make_key(*base[:i], value, *base[i + 1 :]))
+    assert len(keys) == 8
+
+
+def test_get_set_persist_across_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = ResponseCache(path)
+    assert cache.get("k") is None
+    cache.set("k", "response")
+    assert cache.get("k") == "response"
+    cache.close()
+
+    reopened = ResponseCache(path)
+    assert reopened.get("k") == "response"
+    assert reopened.stats() == {
+        "hits": 1,
+        "misses": 0,
+        "entries": 1,
+        "size_bytes": len("response"),
+    }
+    reopened.close()
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), max_size_bytes=10)
+    cache.set("a", "aaaa")
+    cache.set("b", "bbbb")
+    cache.get("a")  # "b" is now the least recently used entry
+    cache.set("c", "cccc")
+    assert cache.get("b") is None
+    assert cache.get("a") == "aaaa"
+    assert cache.get("c") == "cccc"
+    assert cache.stats()["size_bytes"] == 8
+    cache.close()
+
+
+def test_client_serves_repeated_requests_from_cache(tmp_path, client):
+    path = str(tmp_path / "cache.sqlite")
+    client.cache = ResponseCache(path)
+    response = client.iterative_prompt("prompt", 100, 0.7)
+    assert client.client.calls == 1
+    client.cache.close()
+
+    client.cache = ResponseCache(path)
+    assert client.iterative_prompt("prompt", 100, 0.7) == response
+    assert client.iterative_prompt("other prompt", 100, 0.7) != response
+    assert client.client.calls == 2
+    client.cache.close()
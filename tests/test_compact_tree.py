@@ -0,0 +1,94 @@
+import random
+
+import pytest
+
+from topicgpt_python.compact_tree import CompactTopicTree
+from topicgpt_python.utils import TopicTree
+
+
+def _random_topics(seed, n=300):
+    rng = random.Random(seed)
+    names = ["Trade", "trade", "Health", "Soil", "Water", "Tax", "Energy", "Law"]
+    topics, lvl = [], 1
+    for _ in range(n):
+        lvl = rng.randint(1, min(lvl + 1, 3))
+        desc = rng.choice(["", "Some description", "Another one"])
+        topics.append(
+            f"[{lvl}] {rng.choice(names)} (Count: {rng.randint(1, 5)}): {desc}"
+        )
+    return topics
+
+
+def _outputs(tree, tmp_path, name):
+    fname = str(tmp_path / f"{name}.md")
+    tree.to_file(fname, sidecar=False)
+    return (
+        [tree.to_topic_list(desc, count) for desc in (0, 1) for count in (0, 1)],
+        tree.to_prompt_view(),
+        tree.get_root_descendants_name(),
+        open(fname).read(),
+    )
+
+
+def _assert_same(a, b, tmp_path):
+    assert _outputs(a, tmp_path, "a") == _outputs(b, tmp_path, "b")
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_from_topic_list_matches(seed, tmp_path):
+    topics = _random_topics(seed)
+    _assert_same(
+        TopicTree.from_topic_list(topics),
+        CompactTopicTree.from_topic_list(topics),
+        tmp_path,
+    )
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_edits_match(seed, tmp_path):
+    topics = _random_topics(seed)
+    trees = [
+        TopicTree.from_topic_list(topics),
+        CompactTopicTree.from_topic_list(topics),
+    ]
+    rng = random.Random(seed)
+    names = ["Trade", "Health", "Soil", "Water", "Tax", "Merged"]
+    for _ in range(60):
+        op, name, lvl = rng.randrange(4), rng.choice(names), rng.randint(1, 3)
+        other = rng.choice(names)
+        for tree in trees:
+            if op == 0:
+                tree._add_node(lvl, name, 2, "Added", tree.level_nodes.get(lvl - 1))
+            elif op == 1:
+                tree.update_tree([(name, lvl), (other, lvl)], "Merged", "Merged topic")
+            elif op == 2:
+                tree._remove_node_by_name_lvl(name, lvl)
+            else:
+                node = tree.find(name, lvl)
+                if node:
+                    node.name, node.desc = other, "Renamed"
+                    node.count += 1
+        _assert_same(*trees, tmp_path)
+        a, b = (tree.find_duplicates(name, lvl) for tree in trees)
+        assert [(n.name, n.count, n.parent.name) for n in a] == [
+            (n.name, n.count, n.parent.name) for n in b
+        ]
+
+
+def test_seed_file_and_sidecar_match(tmp_path):
+    seed = tmp_path / "seed.md"
+    seed.write_text("[1] Trade\n[2] Tariffs\n[1] Health\n[1] trade\n[2] Tariffs\n")
+    a = TopicTree().from_seed_file(str(seed))
+    b = CompactTopicTree().from_seed_file(str(seed))
+    assert isinstance(b, CompactTopicTree)
+    _assert_same(a, b, tmp_path)
+
+    a._add_node(2, "Quotas", 1, "", a.find("Health", 1))
+    a.find("Trade", 1).desc = "Imports and exports"
+    fname = str(tmp_path / "topics.md")
+    a.to_file(fname)
+    # Either class reads the other's sidecar
+    loaded = CompactTopicTree.from_topic_list(fname, from_file=True)
+    _assert_same(a, loaded, tmp_path)
+    loaded.to_file(fname)
+    _assert_same(a, TopicTree.from_topic_list(fname, from_file=True), tmp_path)
@@ -0,0 +1,74 @@
+import pandas as pd
+
+from topicgpt_python import correction
+from topicgpt_python.utils import TopicTree
+
+PROMPT = "{Message}\n{tree}\n{Document}"
+TOPICS = [f"[1] Topic {i} (Count: 1): About subject {i}" for i in range(30)]
+
+
+def _frame(n):
+    return pd.DataFrame(
+        {
+            "prompted_docs": [f"Document {i} " + "word " * 40 for i in range(n)],
+            "responses": ["[1] Unknown"] * n,
+        }
+    )
+
+
+def test_correction_prompts_build_the_topic_index_once(embedder, client, monkeypatch):
+    built, get_topic_index = [], correction.get_topic_index
+
+    def counting(lines, api_client):
+        built.append(lines)
+        return get_topic_index(lines, api_client)
+
+    monkeypatch.setattr(correction, "get_topic_index", counting)
+    tree, df = TopicTree.from_topic_list(TOPICS), _frame(5)
+    prompts = correction.build_correction_prompts(
+        client, tree, df, PROMPT, 200, list(range(5))
+    )
+    assert len(built) == 1 and len(prompts) == 5
+    all_topics = "\n".join(tree.to_topic_list(desc=True, count=False))
+    assert prompts == [
+        correction.build_correction_prompt(
+            client,
+            doc,
+            "[1] Unknown",
+            all_topics,
+            client.estimate_token_count(PROMPT),
+            PROMPT,
+            200,
+        )
+        for doc in df["prompted_docs"]
+    ]
+
+
+def test_concurrent_correction_matches_sequential(client):
+    tree = TopicTree.from_topic_list(TOPICS)
+    results = [
+        correction.correct(
+            client, tree, _frame(6), PROMPT, 200, [1, 3, 4], concurrency=n
+        )
+        for n in (1, 4)
+    ]
+    pd.testing.assert_frame_equal(*results)
+    assert results[1].at[3, "responses"].startswith("Response to: ")
+    assert results[1].at[2, "responses"] == "[1] Unknown"
+
+
+def test_a_failing_prompt_only_fails_its_own_row(client):
+    df = _frame(6)
+    df.at[3, "prompted_docs"] = None
+    df = correction.correct(
+        client,
+        TopicTree.from_topic_list(TOPICS),
+        df,
+        PROMPT,
+        200,
+        [1, 3, 4],
+        concurrency=1,
+    )
+    assert df.at[3, "responses"] == "Error"
+    assert df.at[1, "responses"].startswith("Response to: ")
+    assert df.at[4, "responses"].startswith("Response to: ")
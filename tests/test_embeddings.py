@@ -0,0 +1,163 @@
+import sys
+
+import numpy as np
+import pytest
+
+from topicgpt_python import embeddings
+from topicgpt_python.embeddings import (
+    EmbeddingService,
+    EmbeddingStore,
+    TopicIndex,
+    get_topic_index,
+)
+
+
+def test_encode_many_normalizes_and_memoizes(embedder):
+    vectors = embedder.encode_many(["trade tariffs", "health care", "trade tariffs"])
+    np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), 1.0, rtol=1e-6)
+    np.testing.assert_array_equal(vectors[0], vectors[2])
+    assert embedder.encode_calls == 1 and embedder.sentences == 2
+    embedder.encode_many(["health care", "trade tariffs"])
+    assert embedder.encode_calls == 1
+
+
+def test_rank_orders_candidates_by_similarity(embedder):
+    candidates = ["[1] Health: care", "[1] Trade: tariffs", "[1] Health: care"]
+    assert embedder.rank("New tariffs on trade", candidates) == [
+        "[1] Trade: tariffs",
+        "[1] Health: care",
+    ]
+
+
+def test_missing_sentence_transformers_is_reported_once(monkeypatch):
+    monkeypatch.setitem(sys.modules, "sentence_transformers", None)
+    service = EmbeddingService()
+    assert not service.available
+    assert service.loads == 0
+    with pytest.raises(RuntimeError):
+        service.encode("text")
+
+
+def test_one_service_per_process(monkeypatch):
+    monkeypatch.setattr(embeddings, "_SERVICE", None)
+    service = embeddings.get_embedding_service()
+    assert embeddings.get_embedding_service() is service
+    replaced = embeddings.configure_embeddings(cache_size=0)
+    assert embeddings.get_embedding_service() is replaced is not service
+
+
+LINES = [f"[1] Topic {word}: About {word}" for word in "abcdefghij"]
+
+
+def test_topic_index_top_matches_a_full_sort(client, embedder):
+    index = TopicIndex(LINES, client, embedder)
+    doc = "About c and c and e"
+    scores = embedder.encode_many(LINES) @ embedder.encode(doc)
+    expected = sorted(range(len(LINES)), key=lambda i: (-scores[i], i))
+    for k in (1, 2, len(LINES), 50):  # no ties at the cut
+        assert list(index.top(doc, k)) == expected[:k]
+
+
+def test_pack_fills_the_budget_with_the_most_similar_lines(client, embedder):
+    index = TopicIndex(LINES, client, embedder)
+    line_len = int(index.token_lengths[0])
+    packed = index.pack("About c", 3 * line_len)
+    assert packed[0] == "[1] Topic c: About c" and len(packed) == 3
+    assert index.pack("About c", 0) == []
+    assert len(index.pack("About c", 0, min_lines=2)) == 2
+
+
+def test_without_a_model_lines_keep_their_order(client):
+    unavailable = EmbeddingService()
+    unavailable._failed = True
+    index = TopicIndex(LINES + LINES[:2], client, unavailable)
+    assert not index.ranked and index.lines == LINES
+    budget = int(index.token_lengths[:4].sum())
+    assert index.pack("About j", budget) == LINES[:4]
+
+
+def test_topic_index_is_reused_per_topic_list(client):
+    first = get_topic_index(LINES, client)
+    assert get_topic_index(list(LINES), client) is first
+    assert get_topic_index(LINES[:3], client) is not first
+
+
+def _unit(rows, dim=8, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(rows, dim))
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_store_round_trips_and_persists(tmp_path):
+    vectors = _unit(3)
+    store = EmbeddingStore(str(tmp_path), "model-a")
+    store.add_many(["a", "b", "c"], vectors)
+    store.add_many(["a", "d"], _unit(2, seed=1))  # "a" is kept, "d" appended
+    assert len(store) == 4
+
+    reopened = EmbeddingStore(str(tmp_path), "model-a")
+    a, missing, c = reopened.get_many(["a", "zzz", "c"])
+    assert missing is None
+    np.testing.assert_allclose(a, vectors[0], atol=1e-3)
+    np.testing.assert_allclose(c, vectors[2], atol=1e-3)
+
+
+def test_store_grows_and_stays_a_valid_npy_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(EmbeddingStore, "MIN_ROWS", 2)
+    store = EmbeddingStore(str(tmp_path), "model-a")
+    vectors = _unit(5)
+    for start in (0, 2, 4):
+        texts = [str(i) for i in range(start, min(start + 2, 5))]
+        store.add_many(texts, vectors[start : start + 2])
+    on_disk = np.load(tmp_path / "vectors.npy", mmap_mode="r")
+    assert on_disk.dtype == np.float16 and on_disk.shape[0] >= 5
+    found = EmbeddingStore(str(tmp_path), "model-a").get_many(["4", "x", "0"])
+    assert found[1] is None
+    np.testing.assert_allclose(
+        np.stack([found[0], found[2]]), vectors[[4, 0]], atol=1e-3
+    )
+
+
+def test_store_rejects_another_model(tmp_path):
+    EmbeddingStore(str(tmp_path), "model-a").add_many(["a"], _unit(1))
+    with pytest.raises(ValueError):
+        EmbeddingStore(str(tmp_path), "model-b")
+
+
+def test_store_ignores_rows_from_an_interrupted_append(tmp_path):
+    store = EmbeddingStore(str(tmp_path), "model-a")
+    store.add_many(["a"], _unit(1))
+    # Vectors are written before keys: a crash leaves an unreferenced row
+    rows = np.lib.format.open_memmap(str(tmp_path / "vectors.npy"), mode="r+")
+    rows[1] = 1.0
+    rows.flush()
+    del rows
+
+    reopened = EmbeddingStore(str(tmp_path), "model-a")
+    assert len(reopened) == 1
+    vectors = _unit(1, seed=2)
+    reopened.add_many(["b"], vectors)
+    np.testing.assert_allclose(
+        EmbeddingStore(str(tmp_path), "model-a").get_many(["b"])[0],
+        vectors[0],
+        atol=1e-3,
+    )
+
+
+def test_service_serves_stored_embeddings_without_the_model(tmp_path):
+    vectors = _unit(2)
+    EmbeddingStore(str(tmp_path), "model-a").add_many(["a", "b"], vectors)
+    service = EmbeddingService("model-a", store_dir=str(tmp_path))
+    np.testing.assert_allclose(
+        service.encode_many(["b", "a"]), vectors[::-1], atol=1e-3
+    )
+    assert service.loads == 0 and service.encode_calls == 0
+
+
+def test_service_writes_new_embeddings_through_to_the_store(tmp_path, embedder):
+    embedder.open_store(str(tmp_path))
+    vectors = embedder.encode_many(["a b", "c d"])
+    fresh = EmbeddingService(store_dir=str(tmp_path))
+    np.testing.assert_allclose(
+        fresh.encode_many(["c d", "a b"]), vectors[::-1], atol=1e-3
+    )
+    assert fresh.loads == 0
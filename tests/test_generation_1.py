@@ -0,0 +1,215 @@
+import json
+import os
+import re
+from collections import OrderedDict
+
+import pandas as pd
+import pytest
+
+from conftest import WhitespaceEncoding
+from topicgpt_python import embeddings, utils
+from topicgpt_python.generation_1 import (
+    TopicPromptBuilder,
+    generate_topic_lvl1,
+    load_checkpoint,
+)
+
+TEMPLATES = os.path.join(os.path.dirname(__file__), os.pardir, "templates")
+PROMPT_FILE = os.path.join(TEMPLATES, "generation_1.txt")
+SEED_FILE = os.path.join(TEMPLATES, "seed_1.md")
+
+
+def _mock_client():
+    return utils.APIClient(api="mock", model="mock", mock_options={"latency": 0})
+
+
+@pytest.fixture
+def mock():
+    """APIClient on the offline mock backend, without simulated latency."""
+    client = _mock_client()
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    path = tmp_path / "data.jsonl"
+    with open(path, "w") as f:
+        for i in range(40):
+            f.write(json.dumps({"text": f"Document {i} about subject {i % 7}."}) + "\n")
+    return str(path)
+
+
+def _run(client, data_file, out_dir, **kwargs):
+    out_dir.mkdir(exist_ok=True)
+    out_file, topic_file = str(out_dir / "out.jsonl"), str(out_dir / "topics.md")
+    generate_topic_lvl1(
+        None,
+        None,
+        data_file,
+        PROMPT_FILE,
+        SEED_FILE,
+        out_file,
+        topic_file,
+        api_client=client,
+        **{"verbose": False, "early_stop": 1000, "checkpoint_every": 3, **kwargs},
+    )
+    return out_file, topic_file
+
+
+def _failing(client, n):
+    """Make the client's nth iterative_prompt call (0-based) raise."""
+    calls, prompt = [0], client.iterative_prompt
+
+    def iterative_prompt(*args, **kwargs):
+        calls[0] += 1
+        if calls[0] == n + 1:
+            raise RuntimeError("provider went away")
+        return prompt(*args, **kwargs)
+
+    client.iterative_prompt = iterative_prompt
+    return client
+
+
+def _results(out_file, topic_file):
+    return (
+        pd.read_json(out_file, lines=True)["responses"].tolist(),
+        open(topic_file).read(),
+    )
+
+
+@pytest.mark.parametrize("fail_at", [0, 7, 17])
+def test_resume_after_a_failure_matches_an_uninterrupted_run(
+    mock, data_file, tmp_path, fail_at
+):
+    expected = _results(*_run(mock, data_file, tmp_path / "full"))
+
+    client = _failing(_mock_client(), fail_at)
+    out_file, topic_file = _run(client, data_file, tmp_path / "resumed")
+    responses = pd.read_json(out_file, lines=True)["responses"].tolist()
+    assert responses[-1] == "Error" and len(responses) == fail_at + 1
+    state = load_checkpoint(out_file + ".checkpoint")
+    assert state["cursor"] == fail_at and len(state["responses"]) == fail_at
+
+    _run(client, data_file, tmp_path / "resumed", resume=True)
+    assert _results(out_file, topic_file) == expected
+    assert not os.path.exists(out_file + ".checkpoint")
+
+
+def test_resume_drops_responses_logged_after_the_last_checkpoint(
+    mock, data_file, tmp_path
+):
+    out_file, _ = _run(_failing(mock, 10), data_file, tmp_path)
+    checkpoint_file = out_file + ".checkpoint"
+    # A crash between appending to the log and replacing the state file
+    with open(checkpoint_file + ".responses", "a") as f:
+        f.write(json.dumps("torn") + "\n")
+    state = load_checkpoint(checkpoint_file)
+    assert "torn" not in state["responses"] and len(state["responses"]) == 10
+    with open(checkpoint_file + ".responses") as f:
+        assert len(f.readlines()) == 10
+
+
+def _scripted(client):
+    """Answer "new X" documents with a new topic X, others with an existing one."""
+
+    def respond(prompt):
+        doc = prompt.split("[Document]\n")[1].split("\n")[0]
+        label = doc[4:] if doc.startswith("new ") else "Existing"
+        return f"[1] {label}: About {label.lower()}."
+
+    client.client.respond = respond
+    return client
+
+
+@pytest.mark.parametrize("window", [1, 2, 4])
+def test_early_stop_counts_documents_in_order_across_windows(mock, tmp_path, window):
+    docs = ["new A", "old", "old", "new B", "old", "new C"] + ["old"] * 6
+    data_file = tmp_path / "data.jsonl"
+    data_file.write_text("".join(json.dumps({"text": d}) + "\n" for d in docs))
+    out_file, topic_file = _run(
+        _scripted(mock),
+        str(data_file),
+        tmp_path / "out",
+        early_stop=3,
+        window=window,
+        dedup_threshold=None,
+    )
+    # Document 8 is the third in a row without a new topic; it is counted
+    # but not kept, and later documents are never applied
+    responses = pd.read_json(out_file, lines=True)["responses"].tolist()
+    assert len(responses) == 8
+    topics = [line.split("):")[0] + ")" for line in open(topic_file)]
+    assert topics[-4:] == [
+        "[1] A (Count: 1)",
+        "[1] Existing (Count: 6)",
+        "[1] B (Count: 1)",
+        "[1] C (Count: 1)",
+    ]
+
+
+def test_window_does_not_duplicate_topics_proposed_together(mock, tmp_path):
+    docs = ["new A", "new a", "new A", "old"]
+    data_file = tmp_path / "data.jsonl"
+    data_file.write_text("".join(json.dumps({"text": d}) + "\n" for d in docs))
+    _, topic_file = _run(
+        _scripted(mock),
+        str(data_file),
+        tmp_path / "out",
+        window=4,
+        dedup_threshold=None,
+    )
+    assert "[1] A (Count: 3): About a." in open(topic_file).read().splitlines()
+
+
+class MergingEncoding(WhitespaceEncoding):
+    """Tokenizer that merges a newline into the punctuation before it."""
+
+    pattern = re.compile(r"\w+|[^\w\s]+\n?|\s")
+
+
+def _reference_prompt(generation_prompt, api_client, doc, topics_list, context_len):
+    """Prompt formatting as it was before TopicPromptBuilder (no embeddings)."""
+    topic_str = "\n".join(topic.split(":")[0].strip() for topic in topics_list)
+    doc_len = api_client.estimate_token_count(doc)
+    prompt_len = api_client.estimate_token_count(generation_prompt)
+    topic_len = api_client.estimate_token_count(topic_str)
+    if prompt_len + doc_len + topic_len <= context_len:
+        return generation_prompt.format(Document=doc, Topics=topic_str)
+    if doc_len > context_len - prompt_len - 500:
+        doc = api_client.truncating(doc, context_len - prompt_len - 500)
+        return generation_prompt.format(Document=doc, Topics=topic_str)
+    seed_len, seed_str = 0, ""
+    for top in topics_list:
+        token_count = api_client.estimate_token_count(top + "\n")
+        if seed_len + token_count > context_len - prompt_len - doc_len:
+            break
+        seed_str += top + "\n"
+        seed_len += token_count
+    return generation_prompt.format(Document=doc, Topics=seed_str)
+
+
+@pytest.mark.parametrize("encoding", [None, MergingEncoding()])
+def test_builder_prompts_match_formatting_from_scratch(mock, monkeypatch, encoding):
+    if encoding is not None:
+        monkeypatch.setattr(utils, "_get_encoding", lambda model: encoding)
+    # Topic indexes are cached per model name, which assumes a fixed tokenizer
+    monkeypatch.setattr(embeddings, "_INDEXES", OrderedDict())
+    with open(PROMPT_FILE) as f:
+        template = f.read()
+    seeds = ["[1] Trade: Imports and exports.", "[1] U.S. Policy: Federal rules."]
+    builder = TopicPromptBuilder(template, mock, seeds)
+    assert builder.lines == seeds
+    for i in range(60):
+        builder.add(f"[1] Topic {i} (e.g., item {i}.)")
+    # The tree's topic list is rebuilt without descriptions after an add
+    assert builder.lines[:2] == ["[1] Trade", "[1] U.S. Policy"]
+
+    doc = "A short document about trade policy."
+    full = mock.estimate_token_count(
+        template.format(Document=doc, Topics=builder.block)
+    )
+    for context_len in range(full - 80, full + 80):
+        assert builder.build(doc, context_len, False) == _reference_prompt(
+            template, mock, doc, builder.lines, context_len
+        )
@@ -0,0 +1,51 @@
+import pytest
+
+from topicgpt_python.generation_1 import parse_topics
+from topicgpt_python.mock import MockAPIError, MockLLM
+from topicgpt_python.utils import APIClient
+
+GENERATION_PROMPT = "[Top-level topics]\n[1] Trade\n[Documents]\nSome text."
+ASSIGNMENT_PROMPT = (
+    "[Topic Hierarchy]\n[1] Trade: Exports\n[1] Health: Care\n[Examples]\n"
+    "[Document]\nA document about tariffs and exports.\n\n"
+)
+
+
+def test_responses_are_deterministic_per_seed():
+    assert MockLLM(seed=1).respond(GENERATION_PROMPT) == MockLLM(seed=1).respond(
+        GENERATION_PROMPT
+    )
+    responses = {MockLLM(seed=s).respond(GENERATION_PROMPT) for s in range(20)}
+    assert len(responses) > 1
+
+
+def test_generation_response_parses_as_a_top_level_topic():
+    ((lvl, name, desc),) = parse_topics(MockLLM().respond(GENERATION_PROMPT))
+    assert lvl == 1 and name and desc
+
+
+def test_assignment_picks_a_listed_topic_unless_hallucinating():
+    response = MockLLM().respond(ASSIGNMENT_PROMPT)
+    assert response.startswith(("[1] Trade:", "[1] Health:"))
+    hallucinated = MockLLM(hallucination_rate=1.0).respond(ASSIGNMENT_PROMPT)
+    assert hallucinated.startswith("[1] Unlisted Topic")
+
+
+def test_complete_reports_usage_and_simulated_errors():
+    text, (prompt_tokens, completion_tokens) = MockLLM(latency=0).complete("hello")
+    assert text == "Mock response." and prompt_tokens > 0 and completion_tokens > 0
+    with pytest.raises(MockAPIError) as info:
+        MockLLM(latency=0, rate_limit_rate=1.0, retry_after=0.5).complete("hello")
+    assert info.value.status_code == 429
+    assert info.value.response.headers == {"retry-after-ms": "500"}
+
+
+def test_client_runs_on_the_mock_backend():
+    client = APIClient(api="mock", model="mock", mock_options={"latency": 0})
+    prompts = [GENERATION_PROMPT, ASSIGNMENT_PROMPT]
+    assert client.concurrent_prompt(prompts, 100, 0.0) == [
+        client.client.respond(p) for p in prompts
+    ]
+    assert client.iterative_prompt(GENERATION_PROMPT, 100, 0.0) == (
+        client.client.respond(GENERATION_PROMPT)
+    )
@@ -0,0 +1,84 @@
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from topicgpt_python.rate_limit import RateLimiter, parse_reset, parse_retry_after
+
+
+def test_requests_within_burst_do_not_wait():
+    limiter = RateLimiter(requests_per_minute=600, burst_seconds=1)  # 10 per burst
+    assert [limiter.reserve() for _ in range(10)] == [0.0] * 10
+
+
+def test_requests_beyond_burst_wait_in_arrival_order():
+    limiter = RateLimiter(requests_per_minute=60, burst_seconds=1)  # 1 per second
+    assert limiter.reserve() == 0.0
+    waits = [limiter.reserve() for _ in range(3)]
+    assert waits == sorted(waits)
+    assert waits[0] == pytest.approx(1.0, abs=0.05)
+    assert waits[2] == pytest.approx(3.0, abs=0.05)
+
+
+def test_token_quota_is_charged_per_request():
+    limiter = RateLimiter(tokens_per_minute=6000, burst_seconds=1)  # 100 tokens
+    assert limiter.reserve(tokens=100) == 0.0
+    assert limiter.reserve(tokens=50) == pytest.approx(0.5, abs=0.05)
+
+
+def test_headers_pause_and_tighten_limits():
+    limiter = RateLimiter(requests_per_minute=6000, burst_seconds=1)
+    limiter.update_from_headers(
+        {"retry-after-ms": "2000", "x-ratelimit-limit-requests": "60"}
+    )
+    assert limiter.requests.rate == pytest.approx(1.0)
+    assert limiter.reserve() == pytest.approx(2.0, abs=0.05)
+
+
+def test_parse_retry_after():
+    assert parse_retry_after({"retry-after-ms": "250"}) == 0.25
+    assert parse_retry_after({"Retry-After": "3"}) == 3.0
+    assert parse_retry_after({}) is None
+
+
+def test_client_waits_for_the_limiter_and_reads_its_headers(client):
+    client.rate_limiter = RateLimiter(requests_per_minute=6000, burst_seconds=1)
+    client.client.headers = {"x-ratelimit-limit-requests": "60"}
+    client.iterative_prompt("a", 100, 0.0)
+    assert client.rate_limiter.requests.rate == pytest.approx(1.0)
+    # The tightened bucket holds one request
+    waits = [client.rate_limiter.reserve() for _ in range(2)]
+    assert waits[0] == 0.0 and waits[1] == pytest.approx(1.0, abs=0.05)
+
+
+def test_remaining_quota_is_scaled_to_the_bucket():
+    limiter = RateLimiter(requests_per_minute=600, burst_seconds=6)  # 60 requests
+    limiter.update_from_headers({"x-ratelimit-remaining-requests": "5"})
+    assert limiter.requests.level == pytest.approx(60)
+    limiter.update_from_headers(
+        {"x-ratelimit-limit-requests": "600", "x-ratelimit-remaining-requests": "300"}
+    )
+    assert limiter.requests.level == pytest.approx(30, abs=0.1)
+
+
+def test_exhausted_quota_waits_for_the_reset():
+    limiter = RateLimiter(tokens_per_minute=60000)
+    limiter.update_from_headers(
+        {"x-ratelimit-remaining-tokens": "0", "x-ratelimit-reset-tokens": "2s"}
+    )
+    assert limiter.reserve(tokens=1) == pytest.approx(2.0, abs=0.05)
+
+
+def test_parse_reset():
+    assert parse_reset("6m0s") == 360.0
+    assert parse_reset("1.5s") == 1.5
+    assert parse_reset("20ms") == pytest.approx(0.02)
+    assert parse_reset("7") == 7.0
+    assert (
+        0
+        < parse_reset(
+            datetime.fromtimestamp(time.time() + 30, timezone.utc).isoformat()
+        )
+        <= 30
+    )
+    assert parse_reset("soon") is None and parse_reset(None) is None
@@ -0,0 +1,221 @@
+import random
+
+import pytest
+
+from topicgpt_python.refinement import TopicPairSelector, topic_pairs
+
+WORDS = ["trade", "tariffs", "health", "care", "tax", "law", "water", "energy"]
+
+
+DESCS = {
+    "Trade": "commerce imports exports duties",
+    "Tariffs": "commerce imports exports duties",
+    "Health": "medicine hospitals doctors clinics",
+    "Care": "medicine hospitals doctors clinics",
+    "Water": "rivers dams power grids",
+    "Energy": "rivers dams power grids",
+}
+
+
+def _tree():
+    from topicgpt_python.utils import TopicTree
+
+    return TopicTree.from_topic_list(
+        [f"[1] {name} (Count: 1): {desc}" for name, desc in DESCS.items()]
+    )
+
+
+def _topics(seed, n=25):
+    rng = random.Random(seed)
+    return [f"[1] Topic {i}: About {' '.join(rng.sample(WORDS, 3))}" for i in range(n)]
+
+
+def _reference_pairs(embedder, topics, prompted, threshold, num_pair):
+    """Pair selection as it was before TopicPairSelector: sort every pair."""
+    sims = embedder.encode_many(topics) @ embedder.encode_many(topics).T
+    pairs = sorted(
+        (
+            (sims[i, j], i, j)
+            for i in range(len(topics))
+            for j in range(i + 1, len(topics))
+        ),
+        key=lambda pair: -pair[0],
+    )
+    selected = []
+    for score, i, j in pairs:
+        key = sorted([topics[i], topics[j]])
+        if len(selected) < num_pair and score > threshold and key not in prompted:
+            selected.append([topics[i], topics[j]])
+            prompted.append(key)
+    return [topic for pair in selected for topic in pair]
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_topic_pairs_match_a_full_sort(embedder, seed):
+    topics = _topics(seed)
+    prompted, expected_prompted = [], []
+    for _ in range(6):
+        selected, prompted = topic_pairs(topics, prompted, 0.5, 3)
+        assert selected == _reference_pairs(embedder, topics, expected_prompted, 0.5, 3)
+    assert prompted == expected_prompted
+
+
+def test_without_a_model_pairs_come_in_list_order(monkeypatch):
+    from topicgpt_python import embeddings
+
+    unavailable = embeddings.EmbeddingService()
+    unavailable._failed = True
+    monkeypatch.setattr(embeddings, "_SERVICE", unavailable)
+    selector = TopicPairSelector(["a", "b", "c"])
+    assert selector.select(3) == [["a", "b"], ["a", "c"], ["b", "c"]]
+    assert selector.select(1) == []
+
+
+def test_sync_drops_merged_topics_and_scores_new_ones(embedder):
+    topics = ["[1] A: trade tariffs", "[1] B: trade tariffs tax", "[1] C: health"]
+    selector = TopicPairSelector(topics, threshold=0.1)
+    selector.sync(topics[1:] + ["[1] D: trade tariffs law"])
+    pairs = selector.select(5)
+    assert all(topics[0] not in pair for pair in pairs)
+    assert pairs[0] == ["[1] B: trade tariffs tax", "[1] D: trade tariffs law"]
+
+
+def test_max_pairs_per_topic_caps_candidates(embedder):
+    topics = _topics(0, 10)
+    selector = TopicPairSelector(topics, threshold=-1.0, max_pairs_per_topic=2)
+    pairs = selector.select(100)
+    assert 0 < len(pairs) <= 2 * len(topics)
+    assert len(TopicPairSelector(topics, threshold=-1.0).select(100)) == 45
+
+
+def test_select_groups_are_disjoint_and_keep_skipped_pairs(embedder):
+    topics = _topics(1, 12)
+    groups = TopicPairSelector(topics, threshold=0.3).select_groups(3)
+    seen = [{topic for pair in group for topic in pair} for group in groups]
+    assert len(groups) == 3
+    assert all(not a & b for n, a in enumerate(seen) for b in seen[n + 1 :])
+
+    selector, reference = (TopicPairSelector(topics, threshold=0.3) for _ in "ab")
+    assert selector.select_groups(1) == [reference.select(2)]
+    selector.select_groups(3)
+    prompted = set(selector.prompted)
+    rest = [tuple(sorted(pair)) for pair in selector.select(1000)]
+    full = [tuple(sorted(pair)) for pair in reference.select(1000)]
+    assert sorted(rest) == sorted(set(full) - prompted)
+
+
+def test_apply_merges_updates_tree_and_mapping():
+    from topicgpt_python.refinement import apply_merges
+    from topicgpt_python.utils import TopicTree
+
+    tree = TopicTree.from_topic_list(
+        ["[1] Trade (Count: 2): Imports", "[1] Tariffs (Count: 3): Duties"]
+    )
+    mapping = {}
+    tree = apply_merges(
+        "[1] Commerce: Trade and duties ([1] Trade, [1] Tariffs)\nnoise", tree, mapping
+    )
+    assert [(n.name, n.count) for n in tree.root.children] == [("Commerce", 5)]
+    assert mapping == {"Trade": "Commerce", "Tariffs": "Commerce"}
+
+
+def test_concurrent_merge_prompts_disjoint_groups(embedder, client):
+    from topicgpt_python.refinement import merge_topics
+
+    names = list(DESCS)
+    tree = _tree()
+    prompts = []
+
+    def respond(prompt):
+        prompts.append(prompt)
+        first, second = [line.split(":")[0][4:] for line in prompt.split("\n")[:2]]
+        return f"[1] {first} {second}: merged ([1] {first}, [1] {second})"
+
+    client.client.respond = respond
+    responses, tree, mapping = merge_topics(
+        tree, {}, "{Topics}", client, 0, 100, 1.0, False, concurrency=3
+    )
+    assert len(responses) == len(prompts) > 1
+    first_round = [set(prompt.split("\n")) for prompt in prompts[:3]]
+    assert all(
+        not a & b for n, a in enumerate(first_round) for b in first_round[n + 1 :]
+    )
+    assert sum(n.count for n in tree.root.children) == len(names)
+    assert set(mapping) <= set(names) and mapping
+
+
+def test_clusters_are_components_split_by_size(embedder):
+    topics = _tree().to_topic_list(desc=True, count=False)
+    selector = TopicPairSelector(topics)
+    assert selector.clusters(0.8) == [topics[0:2], topics[2:4], topics[4:6]]
+    assert selector.clusters(0.0, max_size=4) == [topics[:4], topics[4:]]
+    selector.sync(topics[1:])
+    assert selector.clusters(0.8)[0] == topics[2:4]
+
+
+def test_cluster_strategy_prompts_each_cluster_once(embedder, client):
+    from topicgpt_python.refinement import merge_topics
+
+    responses, tree, mapping = merge_topics(
+        _tree(), {}, "{Topics}", client, 0, 100, 1.0, False, strategy="clusters"
+    )
+    assert client.client.calls == len(responses) == 3
+    with pytest.raises(ValueError):
+        merge_topics(
+            _tree(), {}, "{Topics}", client, 0, 100, 1.0, False, strategy="graph"
+        )
+
+
+def test_remapper_rewrites_labels_only():
+    from topicgpt_python.refinement import TopicRemapper, replace_topic_key
+
+    remapper = TopicRemapper({"Trade": "Commerce", "Commerce": "Economy"})
+    text = "[1] Trade: Trade deals\n- [2] trade (Count: 2)\n[1] Trade Policy: x"
+    assert remapper.sub(text) == (
+        "[1] Economy: Trade deals\n- [2] Economy (Count: 2)\n[1] Trade Policy: x"
+    )
+    assert TopicRemapper({"A": "B", "B": "A"}).sub("[1] A: x") == "[1] B: x"
+    assert replace_topic_key("[1] Trade: x", {}) == "[1] Trade: x"
+
+
+def test_update_generation_file_writes_refined_responses(tmp_path):
+    import pandas as pd
+
+    from topicgpt_python.refinement import update_generation_file
+
+    path = tmp_path / "generation.jsonl"
+    pd.DataFrame({"responses": ["[1] Trade: deals", None]}).to_json(
+        path, lines=True, orient="records"
+    )
+    update_generation_file(
+        path, tmp_path / "out.jsonl", {"Trade": "Commerce"}, False, None
+    )
+    df = pd.read_json(tmp_path / "out.jsonl", lines=True)
+    assert df["refined_responses"].tolist()[0] == "[1] Commerce: deals"
+
+
+def test_refine_topics_passes_cluster_options(embedder, client, tmp_path):
+    from topicgpt_python.refinement import refine_topics
+
+    (tmp_path / "prompt.txt").write_text("{Topics}")
+    _tree().to_file(str(tmp_path / "topics.md"))
+    (tmp_path / "generation.jsonl").write_text('{"responses": "[1] Trade: x"}\n')
+    for size, calls in [(2, 3), (6, 1)]:
+        client.client.calls = 0
+        refine_topics(
+            None,
+            None,
+            str(tmp_path / "prompt.txt"),
+            str(tmp_path / "generation.jsonl"),
+            str(tmp_path / "topics.md"),
+            str(tmp_path / "refined.md"),
+            str(tmp_path / "refined.jsonl"),
+            False,
+            False,
+            str(tmp_path / "mapping.json"),
+            api_client=client,
+            strategy="clusters",
+            cluster_threshold=0.0,
+            max_cluster_size=size,
+        )
+        assert client.client.calls == calls
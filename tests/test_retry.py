@@ -0,0 +1,119 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from topicgpt_python import utils
+from topicgpt_python.retry import RetryPolicy, call_with_timeout
+
+
+class APIStatusError(Exception):
+    """SDK-style error carrying an HTTP status and response headers."""
+
+    def __init__(self, message, status_code, headers=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.response = SimpleNamespace(status_code=status_code, headers=headers or {})
+
+
+class BadRequestError(Exception):
+    pass
+
+
+class APIConnectionError(Exception):
+    pass
+
+
+@pytest.mark.parametrize(
+    "error, retryable",
+    [
+        (APIStatusError("rate limited", 429), True),
+        (APIStatusError("server error", 503), True),
+        (APIStatusError("unauthorized", 401), False),
+        (BadRequestError("bad request"), False),
+        (Exception("This model's maximum context length is 8192 tokens"), False),
+        (APIConnectionError("connection reset"), True),
+        (ValueError("unknown"), True),
+    ],
+)
+def test_is_retryable(error, retryable):
+    assert RetryPolicy.is_retryable(error) is retryable
+
+
+def test_backoff_is_exponential_capped_and_honours_retry_after():
+    policy = RetryPolicy(base_delay=1.0, max_delay=5.0, jitter=False)
+    assert [policy.backoff(i) for i in range(4)] == [1.0, 2.0, 4.0, 5.0]
+    assert policy.backoff(0, retry_after=3.5) == 3.5
+    assert policy.backoff(0, retry_after=300) == 5.0
+    jittered = RetryPolicy(base_delay=1.0, max_delay=5.0)
+    assert all(0 <= jittered.backoff(3) <= 5.0 for _ in range(20))
+
+
+def test_deadline():
+    assert RetryPolicy().within_deadline(100, 100)
+    assert RetryPolicy(deadline=10).within_deadline(4, 5)
+    assert not RetryPolicy(deadline=10).within_deadline(6, 5)
+
+
+def test_client_retries_server_errors_up_to_max_attempts(client):
+    client.retry_policy = RetryPolicy(max_attempts=3, base_delay=0.001, jitter=False)
+    client.client.error = APIStatusError("server error", 503)
+    with pytest.raises(APIStatusError):
+        client.iterative_prompt("prompt", 100, 0.0)
+    assert client.client.calls == 3
+
+
+def test_client_does_not_retry_fatal_errors(client):
+    client.retry_policy = RetryPolicy(max_attempts=3, base_delay=0.001)
+    client.client.error = BadRequestError("bad request")
+    with pytest.raises(BadRequestError):
+        client.iterative_prompt("prompt", 100, 0.0)
+    assert client.client.calls == 1
+
+
+def test_client_passes_the_timeout_to_every_request(client):
+    client.retry_policy = RetryPolicy(timeout=7.5)
+    client.iterative_prompt("prompt", 100, 0.0)
+    assert client.client.last_request["timeout"] == 7.5
+
+
+def _raise(error):
+    raise error
+
+
+def test_call_with_timeout_returns_raises_and_gives_up():
+    release = threading.Event()
+    assert call_with_timeout(lambda x: x + 1, 1.0, 1) == 2
+    with pytest.raises(BadRequestError):
+        call_with_timeout(_raise, 1.0, BadRequestError("bad"))
+    with pytest.raises(TimeoutError):
+        call_with_timeout(release.wait, 0.01)
+    release.set()
+
+
+def test_vertex_gemini_calls_are_bounded_by_the_timeout(client, monkeypatch):
+    release, timeouts = threading.Event(), []
+
+    def generate_content(prompt, generation_config, safety_settings):
+        release.wait()
+        return SimpleNamespace(text="late", usage_metadata=None)
+
+    def bounded(fn, timeout, *args, **kwargs):
+        timeouts.append(timeout)
+        return call_with_timeout(fn, timeout, *args, **kwargs)
+
+    monkeypatch.setattr(utils, "call_with_timeout", bounded)
+    client.api, client.model = "vertex", "gemini-1.5-pro"
+    client.model_obj = SimpleNamespace(generate_content=generate_content)
+    client._vertex_generation_args = lambda *args: (None, None)
+    client.retry_policy = RetryPolicy(max_attempts=2, base_delay=0.001, timeout=0.02)
+    with pytest.raises(TimeoutError):
+        client.iterative_prompt("prompt", 100, 0.0)
+    release.set()
+    assert timeouts == [0.02, 0.02]
+
+
+def test_retry_after_without_a_limiter_is_capped(client):
+    client.retry_policy = RetryPolicy(max_delay=5.0)
+    error = APIStatusError("rate limited", 429, {"retry-after": "300"})
+    assert client._failure_delay(error, 0) == 5.0
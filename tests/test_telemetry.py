@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+from topicgpt_python.telemetry import LatencyHistogram, Telemetry
+
+
+def test_histogram_percentiles_are_within_one_bucket():
+    histogram = LatencyHistogram()
+    for ms in range(1, 101):
+        histogram.observe(ms / 1000)
+    assert histogram.percentile(0.5) == pytest.approx(0.05, rel=0.2)
+    assert histogram.percentile(0.99) == pytest.approx(0.099, rel=0.2)
+    assert histogram.percentile(1.0) == pytest.approx(0.1)
+    assert LatencyHistogram().percentile(0.5) == 0.0
+
+
+def test_summary_totals_per_stage_and_cost(tmp_path):
+    path = str(tmp_path / "records.jsonl")
+    telemetry = Telemetry(path=path, prices={"gpt-4o": (2.5, 10.0)})
+    telemetry.record("openai", "gpt-4o", "assignment", 1000, 100, 0.5, attempts=2)
+    telemetry.record("openai", "gpt-4o", "assignment", cache_hit=True, latency=0.01)
+    telemetry.record("openai", "gpt-4o", "correction", 10, 1, 0.2, error="boom")
+
+    summary = telemetry.summary("assignment")
+    assert summary["requests"] == 2 and summary["cache_hits"] == 1
+    assert summary["retries"] == 1
+    assert (summary["prompt_tokens"], summary["completion_tokens"]) == (1000, 100)
+    assert summary["cost_usd"] == pytest.approx(0.0035)
+    assert telemetry.summary()["errors"] == 1
+    with open(path) as f:
+        assert [json.loads(line)["stage"] for line in f] == [
+            "assignment",
+            "assignment",
+            "correction",
+        ]
+
+
+def test_prometheus_text_has_one_series_per_stage():
+    telemetry = Telemetry()
+    telemetry.record("mock", "m", "a", latency=0.1)
+    telemetry.record("mock", "m", "b", latency=0.1)
+    text = telemetry.to_prometheus()
+    assert 'topicgpt_requests_total{backend="mock",model="m",stage="a"} 1' in text
+    assert 'topicgpt_requests_total{backend="mock",model="m",stage="b"} 1' in text
+
+
+def test_client_records_each_call_for_its_stage(client):
+    client.stage = "assignment"
+    client.iterative_prompt("one two three", 100, 0.0)
+    client.iterative_prompt("one two three", 100, 0.0)
+    summary = client.stage_summary()
+    assert summary["requests"] == 2 and summary["deduplicated"] == 1
+    assert (summary["prompt_tokens"], summary["completion_tokens"]) == (3, 3)
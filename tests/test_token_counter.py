@@ -0,0 +1,35 @@
+from topicgpt_python.utils import TokenCounter
+
+
+def test_counts_are_memoized():
+    counter = TokenCounter("gpt-4o")
+    first = counter.count("a short sentence")
+    assert counter.count("a short sentence") == first
+    assert counter.encode_calls == 1 and counter.hits == 1
+
+
+def test_count_many_matches_count_and_encodes_misses_once():
+    counter = TokenCounter("gpt-4o")
+    texts = ["one", "two words", "one", "three more words"]
+    counts = counter.count_many(texts)
+    assert counts == [TokenCounter("gpt-4o").count(t) for t in texts]
+    assert counter.encode_calls == 3
+    assert counter.count_many(texts) == counts
+    assert counter.encode_calls == 3
+
+
+def test_memo_is_bounded():
+    counter = TokenCounter("gpt-4o", cache_size=2)
+    for text in ["a", "b", "c"]:
+        counter.count(text)
+    counter.count("a")
+    assert counter.encode_calls == 4
+
+
+def test_truncate():
+    counter = TokenCounter("gpt-4o")
+    text = "word " * 50
+    assert counter.truncate("short", 10) == "short"
+    truncated = counter.truncate(text, 10)
+    assert counter.count(truncated) <= 10
+    assert text.startswith(truncated)
@@ -0,0 +1,123 @@
+import os
+
+from topicgpt_python.utils import TopicTree
+
+TOPICS = [
+    "[1] Agriculture (Count: 3): Farming and crops",
+    "[2] Soil (Count: 1): Soil health",
+    "[2] Irrigation (Count: 1): Water for crops",
+    "[1] Trade (Count: 2): Imports and exports",
+    "[2] Tariffs (Count: 2): Taxes on imports",
+    "[2] soil (Count: 1): Soil as a traded good",
+]
+
+
+def test_find_is_case_insensitive_and_in_tree_order():
+    tree = TopicTree.from_topic_list(TOPICS)
+    duplicates = tree.find_duplicates("SOIL", 2)
+    assert [(n.name, n.parent.name) for n in duplicates] == [
+        ("Soil", "Agriculture"),
+        ("soil", "Trade"),
+    ]
+    assert tree.find("soil", 2).name == "Soil"
+    assert tree.find("soil", 2, exact=True).parent.name == "Trade"
+    assert tree.find("Soil", 1) is None
+
+
+def test_add_node_merges_only_under_the_same_parent():
+    tree = TopicTree.from_topic_list(TOPICS)
+    agriculture, trade = tree.root.children
+    assert tree._add_node(2, "Soil", 4, "", agriculture).count == 5
+    node = tree._add_node(2, "Soil", 4, "Soil exports", trade)
+    assert node.parent is trade and node.count == 4
+    assert [n.name for n in trade.children] == ["Tariffs", "soil", "Soil"]
+
+
+def test_index_follows_renames_and_detaches():
+    tree = TopicTree.from_topic_list(TOPICS)
+    tree.find("Tariffs", 2).name = "Duties"
+    assert tree.find("Tariffs", 2) is None
+    assert tree.find("duties", 2).parent.name == "Trade"
+
+    tree._remove_node_by_name_lvl("Trade", 1)
+    assert tree.find("Duties", 2) is None
+    assert [n.parent.name for n in tree.find_duplicates("soil", 2)] == ["Agriculture"]
+
+
+def test_update_tree_merges_duplicates_case_insensitively():
+    tree = TopicTree.from_topic_list(TOPICS)
+    tree.update_tree([("Soil", 2), ("Irrigation", 2)], "Land", "Land and water")
+    assert tree.to_topic_list() == [
+        "[1] Agriculture (Count: 3): Farming and crops",
+        "[2] Land (Count: 3): Land and water",
+        "[1] Trade (Count: 2): Imports and exports",
+        "[2] Tariffs (Count: 2): Taxes on imports",
+    ]
+
+
+def test_sidecar_round_trips_nodes_without_descriptions(tmp_path):
+    tree = TopicTree.from_topic_list(TOPICS)
+    tree._add_node(2, "Seeds", 1, "", tree.find("Agriculture", 1))
+    fname = str(tmp_path / "topics.md")
+    tree.to_file(fname)
+    assert TopicTree.sidecar_path(fname) == str(tmp_path / "topics.tree.json")
+
+    loaded = TopicTree.from_topic_list(fname, from_file=True)
+    assert loaded.to_topic_list() == tree.to_topic_list()
+    assert loaded.find("Seeds", 2).desc == ""
+    # The topic file itself leaves it out
+    assert "Seeds" not in open(fname).read()
+
+
+def test_stale_sidecar_is_rejected(tmp_path):
+    tree = TopicTree.from_topic_list(TOPICS)
+    tree._add_node(2, "Seeds", 1, "", tree.find("Agriculture", 1))
+    fname = str(tmp_path / "topics.md")
+    tree.to_file(fname)
+    sidecar = TopicTree.sidecar_path(fname)
+    stat = os.stat(sidecar)
+    with open(fname, "a") as f:
+        f.write("[1] Health (Count: 1): Medicine\n")
+    # Same mtime as the sidecar, so only the hash gives the edit away
+    os.utime(fname, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    assert TopicTree._load_sidecar(fname) is None
+    loaded = TopicTree.from_topic_list(fname, from_file=True)
+    assert loaded.find("Health", 1) is not None
+    assert loaded.find("Seeds", 2) is None
+
+
+def test_sidecar_older_than_the_topic_file_is_rejected(tmp_path):
+    fname = str(tmp_path / "topics.md")
+    TopicTree.from_topic_list(TOPICS).to_file(fname)
+    sidecar = TopicTree.sidecar_path(fname)
+    mtime = os.stat(fname).st_mtime
+    os.utime(sidecar, (mtime - 10, mtime - 10))
+    assert TopicTree._load_sidecar(fname) is None
+
+
+def test_corrupt_sidecar_falls_back_to_the_topic_file(tmp_path):
+    fname = str(tmp_path / "topics.md")
+    TopicTree.from_topic_list(TOPICS).to_file(fname)
+    with open(TopicTree.sidecar_path(fname), "w") as f:
+        f.write("{not json")
+    loaded = TopicTree.from_topic_list(fname, from_file=True)
+    assert loaded.to_topic_list() == TopicTree.from_topic_list(TOPICS).to_topic_list()
+
+
+def test_add_node_finds_the_child_among_many_same_named_ones():
+    from topicgpt_python.compact_tree import CompactTopicTree
+
+    topics = []
+    for i in range(50):
+        topics += [f"[1] Parent {i} (Count: 1): x", "[2] Soil (Count: 1): y"]
+        topics += ["[2] Water (Count: 1): z"]
+    for cls in (TopicTree, CompactTopicTree):
+        tree = cls.from_topic_list(topics)
+        parent = tree.find("Parent 7", 1)
+        assert tree._add_node(2, "Water", 2, "", parent).count == 3
+        assert [(n.name, n.count) for n in parent.children] == [
+            ("Soil", 1),
+            ("Water", 3),
+        ]
+        assert sum(n.count for n in tree.find_duplicates("Water", 2)) == 52
@@ -1,21 +1,93 @@
 import pandas as pd
 from topicgpt_python.utils import *
+from topicgpt_python.batch import make_batch_backend, run_batch
+from topicgpt_python.embeddings import get_embedding_service, get_topic_index
 
-import openai
 import numpy as np
-from tqdm import trange
+from tqdm import tqdm
 import traceback
-import random
-from sentence_transformers import SentenceTransformer, util
 import argparse
 import os
 
-from concurrent.futures import ThreadPoolExecutor, as_completed
+os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
-from tqdm.std import tqdm
 
-os.environ["TOKENIZERS_PARALLELISM"] = "false"
-sbert = SentenceTransformer("all-MiniLM-L6-v2")
+def build_assignment_prompt(
+    api_client,
+    doc,
+    tree_str,
+    tree_len,
+    prompt_len,
+    assignment_prompt,
+    context_len,
+    verbose=False,
+    topic_index=None,
+):
+    """
+    Build the assignment prompt for one document
+
+    Parameters:
+    - api_client: APIClient object
+    - doc: document text
+    - tree_str: newline-joined topic list
+    - tree_len: token count of tree_str
+    - prompt_len: token count of assignment_prompt
+    - assignment_prompt: str
+    - context_len: int
+    - verbose: bool
+    - topic_index: TopicIndex over tree_str's lines (built if None)
+
+    Returns:
+    - prompt: formatted prompt
+    - doc: document as it appears in the prompt (possibly truncated)
+    """
+    # Include only most relevant topics such that the total length
+    # of tree_str is less than context_len
+    if tree_len > context_len:
+        if topic_index is None:
+            topic_index = get_topic_index(tree_str.split("\n"), api_client)
+        seed_str = "".join(top + "\n" for top in topic_index.pack(doc, context_len))
+    else:
+        seed_str = tree_str
+
+    # Truncate document if too long
+    max_doc_len = context_len - prompt_len - api_client.estimate_token_count(seed_str)
+    doc_len = api_client.estimate_token_count(doc)
+    if doc_len > max_doc_len:
+        print(f"Truncating document from {doc_len} to {max_doc_len}")
+        doc = api_client.truncating(doc, max_doc_len)
+
+    return assignment_prompt.format(Document=doc, tree=seed_str), doc
+
+
+def _assignment_prompts(
+    api_client, topics_root, docs, assignment_prompt, context_len, verbose
+):
+    """
+    Yield (prompt, prompted_doc) for each document, sharing the static token
+    counts across documents.
+    """
+    tree_str = "\n".join(topics_root.to_topic_list(desc=True, count=False))
+    # Static token counts and the topic embedding matrix are computed once
+    # and shared across documents.
+    tree_len = api_client.estimate_token_count(tree_str)
+    prompt_len = api_client.estimate_token_count(assignment_prompt)
+    topic_index = None
+    if tree_len > context_len:
+        topic_index = get_topic_index(tree_str.split("\n"), api_client)
+
+    for doc in docs:
+        yield build_assignment_prompt(
+            api_client,
+            doc,
+            tree_str,
+            tree_len,
+            prompt_len,
+            assignment_prompt,
+            context_len,
+            verbose,
+            topic_index,
+        )
 
 
 def assignment(
@@ -28,152 +100,114 @@ def assignment(
     top_p,
     max_tokens,
     verbose,
-    # NEW:
-    concurrency: int = 8,
+    concurrency: int = None,
 ):
     """
     Return documents with topics assigned to them
-    ...
+
+    Parameters:
+    - api_client: APIClient object
+    - topics_root: TopicTree object
+    - docs: list of documents
+    - assignment_prompt: str
+    - context_len: int
+    - temperature: float
+    - top_p: float
+    - max_tokens: int
     - verbose: bool
-    - concurrency: int  # NEW: number of concurrent API request threads (OpenAI/openai-compatible only)
+    - concurrency: int, number of requests in flight at once (1 for
+      sequential; None for 8 with openai/openai-compatible, else 1)
+
+    Returns:
+    - res: list of responses
+    - prompted_docs: list of documents as prompted
     """
-    tree_str = "\n".join(topics_root.to_topic_list(desc=True, count=False))
-    # keep names the same downstream:
-    prompted_docs, res = [], []
+    prompts = _assignment_prompts(
+        api_client, topics_root, docs, assignment_prompt, context_len, verbose
+    )
 
-    # === NEW: concurrent path for OpenAI/openai-compatible ===
-    if concurrency > 1 and api_client.api in {"openai", "openai-compatible"}:
-        # preallocate in-order outputs
-        res = [None] * len(docs)
-        prompted_docs = [None] * len(docs)
-
-        def _worker(i: int):
-            doc = docs[i]
-            cos_sim = {}
-            doc_emb = sbert.encode(doc, convert_to_tensor=True)
-
-            # Same seed selection logic as before
-            if api_client.estimate_token_count(tree_str) > context_len:
-                for top in tree_str.split("\n"):
-                    top_emb = sbert.encode(top, convert_to_tensor=True)
-                    cos_sim[top] = util.cos_sim(top_emb, doc_emb).item()
-                top_top = sorted(cos_sim, key=cos_sim.get, reverse=True)
-
-                seed_len = 0
-                seed_str = ""
-                while seed_len < context_len and len(top_top) > 0:
-                    new_seed = top_top.pop(0)
-                    token_count = api_client.estimate_token_count(new_seed + "\n")
-                    if seed_len + token_count > context_len:
-                        break
-                    else:
-                        seed_str += new_seed + "\n"
-                        seed_len += token_count
-            else:
-                seed_str = tree_str
-
-            # Truncate doc
-            max_doc_len = (
-                context_len
-                - api_client.estimate_token_count(assignment_prompt)
-                - api_client.estimate_token_count(seed_str)
-            )
-            if api_client.estimate_token_count(doc) > max_doc_len:
-                if verbose:
-                    print(
-                        f"[{i}] Truncating document from "
-                        f"{api_client.estimate_token_count(doc)} to {max_doc_len}"
-                    )
-                doc_local = api_client.truncating(doc, max_doc_len)
-            else:
-                doc_local = doc
-
-            # Call API
-            try:
-                prompt = assignment_prompt.format(Document=doc_local, tree=seed_str)
-                response = api_client.iterative_prompt(
-                    prompt, max_tokens, temperature, top_p=top_p, verbose=verbose
+    # Concurrent path: one event loop drives up to `concurrency` requests;
+    # prompts are built lazily as slots free up.
+    concurrency = resolve_concurrency(api_client, concurrency)
+    if concurrency > 1:
+        prompted_docs = []
+
+        def _consume():
+            for prompt, doc in prompts:
+                prompted_docs.append(doc)
+                yield prompt
+
+        results = api_client.concurrent_prompt(
+            _consume(),
+            max_tokens,
+            temperature,
+            top_p=top_p,
+            concurrency=concurrency,
+            return_exceptions=True,
+            progress="Assigning topics",
+        )
+        res = []
+        for i, response in enumerate(results):
+            if isinstance(response, Exception):
+                traceback.print_exception(
+                    type(response), response, response.__traceback__
                 )
-            except Exception:
-                traceback.print_exc()
                 response = "Error"
-
             if verbose:
                 print(f"[{i}] Response: {response}\n--------------------")
-
-            # return index to keep original order
-            return i, response, doc_local
-
-        with ThreadPoolExecutor(max_workers=concurrency) as ex:
-            futures = [ex.submit(_worker, i) for i in range(len(docs))]
-            for fut in tqdm(
-                as_completed(futures),
-                total=len(futures),
-                desc="Assigning topics",
-                unit="doc",
-                leave=True,
-            ):
-                i, response, doc_local = fut.result()
-                res[i] = response
-                prompted_docs[i] = doc_local
-
+            res.append(response)
         return res, prompted_docs
 
-    # === ORIGINAL sequential path (unchanged) ===
+    # Sequential path
     prompted_docs, res = [], []
-    for i in trange(len(docs)):
-        doc = docs[i]
-        cos_sim = {}
-        doc_emb = sbert.encode(doc, convert_to_tensor=True)
-
-        if api_client.estimate_token_count(tree_str) > context_len:
-            for top in tree_str.split("\n"):
-                top_emb = sbert.encode(top, convert_to_tensor=True)
-                cos_sim[top] = util.cos_sim(top_emb, doc_emb)
-            top_top = sorted(cos_sim, key=cos_sim.get, reverse=True)
-
-            seed_len = 0
-            seed_str = ""
-            while seed_len < context_len and len(top_top) > 0:
-                new_seed = top_top.pop(0)
-                token_count = api_client.estimate_token_count(new_seed + "\n")
-                if seed_len + token_count > context_len:
-                    break
-                else:
-                    seed_str += new_seed + "\n"
-                    seed_len += token_count
-        else:
-            seed_str = tree_str
-
-        max_doc_len = (
-            context_len
-            - api_client.estimate_token_count(assignment_prompt)
-            - api_client.estimate_token_count(seed_str)
-        )
-        if api_client.estimate_token_count(doc) > max_doc_len:
-            print(
-                f"Truncating document from {api_client.estimate_token_count(doc)} to {max_doc_len}"
-            )
-            doc = api_client.truncating(doc, max_doc_len)
-
+    for prompt, doc in tqdm(prompts, total=len(docs)):
         try:
-            prompt = assignment_prompt.format(Document=doc, tree=seed_str)
             response = api_client.iterative_prompt(
                 prompt, max_tokens, temperature, top_p=top_p, verbose=verbose
             )
-            res.append(response)
         except Exception:
-            res.append("Error")
+            response = "Error"
             traceback.print_exc()
 
         if verbose:
             print(f"Response: {response}")
             print("--------------------")
+        res.append(response)
         prompted_docs.append(doc)
 
     return res, prompted_docs
 
 
+def build_assignment_prompts(
+    api_client, topics_root, docs, assignment_prompt, context_len, verbose
+):
+    """
+    Build assignment prompts for all documents without sending them
+
+    Parameters:
+    - api_client: APIClient object
+    - topics_root: TopicTree object
+    - docs: list of documents
+    - assignment_prompt: str
+    - context_len: int
+    - verbose: bool
+
+    Returns:
+    - prompts: list of prompts
+    - prompted_docs: list of documents as prompted
+    """
+    prompts, prompted_docs = [], []
+    for prompt, doc in tqdm(
+        _assignment_prompts(
+            api_client, topics_root, docs, assignment_prompt, context_len, verbose
+        ),
+        total=len(docs),
+    ):
+        prompts.append(prompt)
+        prompted_docs.append(doc)
+    return prompts, prompted_docs
+
+
 def assignment_batch(
     api_client,
     topics_root,
@@ -184,6 +218,7 @@ def assignment_batch(
     top_p,
     max_tokens,
     verbose,
+    chunk_size=512,
 ):
     """
     Return documents with topics assigned to them
@@ -198,63 +233,117 @@ def assignment_batch(
     - top_p: float
     - max_tokens: int
     - verbose: bool
+    - chunk_size: int, number of prompts per vLLM generate call
 
     Returns:
     - res: list of responses
+    - prompted_docs: list of documents as prompted
     """
-    tree_str = "\n".join(topics_root.to_topic_list(desc=True, count=False))
-    prompted_docs, res = [], []
-    prompts = []
-
-    for i in trange(len(docs)):
-        doc = docs[i]
-        cos_sim = {}
-        doc_emb = sbert.encode(doc, convert_to_tensor=True)
-
-        # Include only most relevant topics such that the total length
-        # of tree_str is less than max_top_len
-        if api_client.estimate_token_count(tree_str) > context_len:
-            for top in tree_str.split("\n"):
-                top_emb = sbert.encode(top, convert_to_tensor=True)
-                cos_sim[top] = util.cos_sim(top_emb, doc_emb)
-            top_top = sorted(cos_sim, key=cos_sim.get, reverse=True)
-
-            seed_len = 0
-            seed_str = ""
-            while seed_len < context_len and len(top_top) > 0:
-                new_seed = top_top.pop(0)
-                if (
-                    seed_len + api_client.estimate_token_count(new_seed + "\n")
-                    > context_len
-                ):
-                    break
-                else:
-                    seed_str += new_seed + "\n"
-                    seed_len += api_client.estimate_token_count(new_seed + "\n")
-        else:
-            seed_str = tree_str
-
-        # Truncate document if too long
-        max_doc_len = (
-            context_len
-            - api_client.estimate_token_count(assignment_prompt)
-            - api_client.estimate_token_count(seed_str)
-        )
-        if api_client.estimate_token_count(doc) > max_doc_len:
-            print(
-                f"Truncating document from {api_client.estimate_token_count(doc)} to {max_doc_len}"
-            )
-            doc = api_client.truncating(doc, max_doc_len)
-        prompt = assignment_prompt.format(Document=doc, tree=seed_str)
-        prompts.append(prompt)
-        prompted_docs.append(doc)
-
-    responses = api_client.batch_prompt(
-        prompts, max_tokens, temperature, top_p, verbose
-    )
+    responses, prompted_docs = [], []
+    for chunk_responses, chunk_docs in _assignment_chunks(
+        api_client,
+        topics_root,
+        docs,
+        assignment_prompt,
+        context_len,
+        temperature,
+        top_p,
+        max_tokens,
+        verbose,
+        chunk_size,
+    ):
+        responses.extend(chunk_responses)
+        prompted_docs.extend(chunk_docs)
     return responses, prompted_docs
 
 
+def _assignment_chunks(
+    api_client,
+    topics_root,
+    docs,
+    assignment_prompt,
+    context_len,
+    temperature,
+    top_p,
+    max_tokens,
+    verbose,
+    chunk_size,
+):
+    """
+    Yield (responses, prompted_docs) per chunk of documents; prompts are built
+    lazily so only one chunk of prompts is held in memory at a time.
+    """
+    prompted_docs = []
+
+    def _consume():
+        for prompt, doc in _assignment_prompts(
+            api_client, topics_root, docs, assignment_prompt, context_len, verbose
+        ):
+            prompted_docs.append(doc)
+            yield prompt
+
+    for responses in api_client.batch_prompt_iter(
+        _consume(), max_tokens, temperature, top_p, chunk_size=chunk_size
+    ):
+        chunk_docs = prompted_docs[: len(responses)]
+        del prompted_docs[: len(responses)]
+        yield responses, chunk_docs
+
+
+def assignment_stream(
+    api_client,
+    topics_root,
+    df,
+    assignment_prompt,
+    context_len,
+    temperature,
+    top_p,
+    max_tokens,
+    verbose,
+    out_file,
+    chunk_size=512,
+):
+    """
+    Assign topics with vLLM and append each finished chunk to the output file
+
+    Parameters:
+    - api_client: APIClient object
+    - topics_root: TopicTree object
+    - df: DataFrame with a "text" column
+    - assignment_prompt: str
+    - context_len: int
+    - temperature: float
+    - top_p: float
+    - max_tokens: int
+    - verbose: bool
+    - out_file: str, JSONL file to write (replaced once all chunks are done)
+    - chunk_size: int, number of prompts per vLLM generate call
+    """
+    tmp_file = out_file + ".tmp"
+    start = 0
+    with open(tmp_file, "w") as f, tqdm(total=len(df), desc="Assigning topics") as bar:
+        for responses, prompted_docs in _assignment_chunks(
+            api_client,
+            topics_root,
+            df["text"],
+            assignment_prompt,
+            context_len,
+            temperature,
+            top_p,
+            max_tokens,
+            verbose,
+            chunk_size,
+        ):
+            part = df.iloc[start : start + len(responses)].copy()
+            part["prompted_docs"] = prompted_docs
+            part["responses"] = responses
+            f.write(part.to_json(orient="records", lines=True).rstrip("\n") + "\n")
+            f.flush()
+            start += len(responses)
+            bar.update(len(responses))
+    os.replace(tmp_file, out_file)
+
+
 def assign_topics(
     api,
     model,
@@ -265,9 +354,15 @@ def assign_topics(
     verbose,
     base_url=None,
     api_key=None,
-    concurrency=8,
+    concurrency=None,
     sample_size=None,
     sample_seed=None,
+    batch=None,
+    batch_dir="data/output/batch/assignment",
+    api_client=None,
+    chunk_size=512,
+    summary_file=None,
+    embedding_dir=None,
 ):
     """
     Assign topics to a list of documents
@@ -280,11 +375,22 @@ def assign_topics(
     - out_file (str): Output file
     - topic_file (str): File to write topics to
     - verbose (bool): Whether to print out results
-    - concurrency (int): Number of concurrent API requests
+    - concurrency (int): Number of concurrent API requests (None for 8 with openai/openai-compatible, else sequential)
     - sample_size (int): Number of documents to sample from the data. If None, all documents are used.
     - sample_seed (int): Seed for the random number generator. If None, a random seed is used.
+    - batch (str): Run offline through a batch backend: "api" for the provider Batch API, "local" for the file-based stand-in (or a backend instance). None sends requests directly.
+    - batch_dir (str): Directory for batch-input/output JSONL files
+    - api_client (APIClient): Existing client to reuse (e.g. shared across stages); api/model/base_url/api_key are ignored when given
+    - chunk_size (int): vLLM only; number of prompts per generate call. Results are appended to out_file chunk by chunk.
+    - summary_file (str): Optional JSON file for the run summary (requests, tokens, latency percentiles, retries, cache hits)
+    - embedding_dir (str): Optional persistent embedding store; document and topic embeddings are read from it and new ones appended, so reruns skip re-embedding
     """
-    api_client = APIClient(api=api, model=model, base_url=base_url, api_key=api_key)
+    if embedding_dir is not None:
+        get_embedding_service().open_store(embedding_dir)
+    if api_client is None:
+        api_client = APIClient(api=api, model=model, base_url=base_url, api_key=api_key)
+    api, model = api_client.api, api_client.model
+    api_client.stage = "assignment"
     max_tokens, temperature, top_p = 1000, 0.0, 1.0
 
     if verbose:
@@ -314,18 +420,38 @@ def assign_topics(
     topics_root = TopicTree().from_topic_list(topic_file, from_file=True)
 
     # Prompting ----
-    if api == "vllm":
-        responses, prompted_docs = assignment_batch(
+    if batch is not None:
+        prompts, prompted_docs = build_assignment_prompts(
+            api_client, topics_root, docs, assignment_prompt, context_len, verbose
+        )
+        responses = run_batch(
+            make_batch_backend(api_client, batch, batch_dir),
+            prompts,
+            batch_dir,
+            model,
+            max_tokens,
+            temperature,
+            top_p,
+            verbose=verbose,
+            api_client=api_client,
+        )
+    elif api == "vllm":
+        # Streamed: results are written chunk by chunk instead of held in memory
+        assignment_stream(
             api_client,
             topics_root,
-            docs,
+            df,
             assignment_prompt,
             context_len,
             temperature,
             top_p,
             max_tokens,
             verbose,
+            out_file,
+            chunk_size,
         )
+        api_client.stage_summary(summary_file, verbose)
+        return
     else:
         responses, prompted_docs = assignment(
             api_client,
@@ -350,6 +476,7 @@ def assign_topics(
         with open(f"data/output/assignment_backup_{model}.txt", "w") as f:
             for line in responses:
                 print(line, file=f)
+    api_client.stage_summary(summary_file, verbose)
 
 
 if __name__ == "__main__":
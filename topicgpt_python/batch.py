@@ -0,0 +1,500 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+
+# Provider limits for a single batch (OpenAI Batch API)
+MAX_BATCH_REQUESTS = 50000
+MAX_BATCH_BYTES = 200 * 1024 * 1024
+
+
+def _batch_request(
+    custom_id, prompt, model, max_tokens, temperature, top_p, system_message, url
+):
+    """One batch-input JSONL line (without the trailing newline)."""
+    request = {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": url,
+        "body": {
+            "model": model,
+            "messages": [
+                {"role": "system", "content": system_message},
+                {"role": "user", "content": prompt},
+            ],
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "top_p": top_p,
+        },
+    }
+    return json.dumps(request, ensure_ascii=False)
+
+
+def write_batch_input(
+    path,
+    prompts,
+    model,
+    max_tokens,
+    temperature,
+    top_p,
+    system_message="You are a helpful assistant.",
+    url="/v1/chat/completions",
+):
+    """
+    Write prompts to a provider batch-input JSONL file.
+
+    Parameters:
+    - path: Output JSONL path
+    - prompts: List of prompts; request i gets custom_id "request-i"
+    - model: Model name
+    - max_tokens: Maximum token count
+    - temperature: Temperature for sampling
+    - top_p: Top p value for sampling
+    - system_message: System message
+    - url: Endpoint each request targets
+
+    Returns:
+    - custom_ids: List of custom ids in prompt order
+    """
+    dirname = os.path.dirname(path)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
+    custom_ids = []
+    with open(path, "w", encoding="utf-8") as f:
+        for i, prompt in enumerate(prompts):
+            custom_id = f"request-{i}"
+            custom_ids.append(custom_id)
+            f.write(
+                _batch_request(
+                    custom_id,
+                    prompt,
+                    model,
+                    max_tokens,
+                    temperature,
+                    top_p,
+                    system_message,
+                    url,
+                )
+                + "\n"
+            )
+    return custom_ids
+
+
+def write_batch_shards(
+    batch_dir,
+    prompts,
+    model,
+    max_tokens,
+    temperature,
+    top_p,
+    system_message="You are a helpful assistant.",
+    url="/v1/chat/completions",
+    max_requests=MAX_BATCH_REQUESTS,
+    max_bytes=MAX_BATCH_BYTES,
+):
+    """
+    Write prompts to batch-input JSONL files, starting a new file whenever the
+    next request would exceed the per-batch request count or file size.
+
+    Parameters:
+    - batch_dir: Directory for the "batch_input_<k>.jsonl" files
+    - prompts: List of prompts; request i gets custom_id "request-i"
+    - model: Model name
+    - max_tokens: Maximum token count
+    - temperature: Temperature for sampling
+    - top_p: Top p value for sampling
+    - system_message: System message
+    - url: Endpoint each request targets
+    - max_requests: Maximum number of requests per file
+    - max_bytes: Maximum size of a file in bytes
+
+    Returns:
+    - shards: List of (path, custom_ids) in prompt order
+    - fingerprint: Hash of all requests, identifying this set of batches
+    """
+    os.makedirs(batch_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    shards, f, size = [], None, 0
+    try:
+        for i, prompt in enumerate(prompts):
+            custom_id = f"request-{i}"
+            line = (
+                _batch_request(
+                    custom_id,
+                    prompt,
+                    model,
+                    max_tokens,
+                    temperature,
+                    top_p,
+                    system_message,
+                    url,
+                )
+                + "\n"
+            ).encode("utf-8")
+            if f is None or (
+                len(shards[-1][1]) >= max_requests or size + len(line) > max_bytes
+            ):
+                if f is not None:
+                    f.close()
+                path = os.path.join(batch_dir, f"batch_input_{len(shards)}.jsonl")
+                f, size = open(path, "wb"), 0
+                shards.append((path, []))
+            f.write(line)
+            size += len(line)
+            shards[-1][1].append(custom_id)
+            digest.update(line)
+    finally:
+        if f is not None:
+            f.close()
+    return shards, digest.hexdigest()
+
+
+def read_batch_output(path, usage=None):
+    """
+    Read a provider batch-output JSONL file.
+
+    Parameters:
+    - path: Output JSONL path
+    - usage: Optional dict filled with custom_id -> the response's "usage"
+      (for requests that report one)
+
+    Returns:
+    - dict: custom_id -> response text (None for failed requests)
+    """
+    results = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            response = record.get("response") or {}
+            body = response.get("body") or {}
+            if usage is not None and isinstance(body, dict) and body.get("usage"):
+                usage[record["custom_id"]] = body["usage"]
+            if record.get("error") or response.get("status_code", 200) != 200:
+                results[record["custom_id"]] = None
+                continue
+            try:
+                results[record["custom_id"]] = body["choices"][0]["message"]["content"]
+            except (KeyError, IndexError, TypeError):
+                results[record["custom_id"]] = None
+    return results
+
+
+class OpenAIBatchBackend:
+    """
+    OpenAI / Azure OpenAI Batch API.
+
+    Parameters:
+    - client: OpenAI or AzureOpenAI client (e.g. APIClient.client)
+    - completion_window: Batch completion window
+    - url: Endpoint the requests target ("/chat/completions" on Azure)
+
+    Methods:
+    - submit: Upload a batch-input file and create the batch
+    - status: Current batch status
+    - download: Write the batch output to a local file
+    """
+
+    terminal = {"completed", "failed", "expired", "cancelled"}
+    records_usage = False
+
+    def __init__(self, client, completion_window="24h", url="/v1/chat/completions"):
+        self.client = client
+        self.completion_window = completion_window
+        self.url = url
+
+    def submit(self, input_path):
+        with open(input_path, "rb") as f:
+            batch_file = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint=self.url,
+            completion_window=self.completion_window,
+        )
+        return batch.id
+
+    def status(self, batch_id):
+        return self.client.batches.retrieve(batch_id).status
+
+    def download(self, batch_id, output_path):
+        batch = self.client.batches.retrieve(batch_id)
+        with open(output_path, "w", encoding="utf-8") as f:
+            for file_id in (batch.output_file_id, batch.error_file_id):
+                if file_id:
+                    content = self.client.files.content(file_id).text
+                    f.write(content if content.endswith("\n") else content + "\n")
+
+
+class LocalBatchBackend:
+    """
+    File-based stand-in for a provider Batch API.
+
+    Batches are directories under `work_dir`; requests are executed when the
+    batch is first polled, and the output is written in the provider's
+    batch-output format, so the full submit/poll/join path runs offline.
+
+    Parameters:
+    - work_dir: Directory holding submitted batches
+    - handler: Callable taking a request body dict and returning the
+      response text; when omitted, api_client.iterative_prompt is used
+    - api_client: APIClient used by the default handler
+
+    Attributes:
+    - records_usage: True when requests go through api_client, whose
+      telemetry already records each call
+
+    Methods:
+    - submit: Register a batch-input file and return its id
+    - status: Current batch status (runs the batch if still pending)
+    - download: Copy the batch output to a local file
+    """
+
+    url = "/v1/chat/completions"
+    terminal = {"completed", "failed"}
+
+    def __init__(self, work_dir, handler=None, api_client=None):
+        if handler is None and api_client is None:
+            raise ValueError("LocalBatchBackend needs a handler or an api_client.")
+        self.work_dir = work_dir
+        self.records_usage = handler is None
+        self.handler = handler or self._client_handler(api_client)
+        os.makedirs(work_dir, exist_ok=True)
+
+    @staticmethod
+    def _client_handler(api_client):
+        def handler(body):
+            return api_client.iterative_prompt(
+                body["messages"][1]["content"],
+                body["max_tokens"],
+                body["temperature"],
+                top_p=body["top_p"],
+                system_message=body["messages"][0]["content"],
+            )
+
+        return handler
+
+    def _path(self, batch_id, name):
+        return os.path.join(self.work_dir, batch_id, name)
+
+    def submit(self, input_path):
+        batch_id = f"batch_{uuid.uuid4().hex}"
+        os.makedirs(os.path.join(self.work_dir, batch_id))
+        shutil.copyfile(input_path, self._path(batch_id, "input.jsonl"))
+        return batch_id
+
+    def status(self, batch_id):
+        if not os.path.exists(self._path(batch_id, "output.jsonl")):
+            self._run(batch_id)
+        return "completed"
+
+    def _run(self, batch_id):
+        tmp_path = self._path(batch_id, "output.jsonl.tmp")
+        with open(self._path(batch_id, "input.jsonl"), encoding="utf-8") as fin, open(
+            tmp_path, "w", encoding="utf-8"
+        ) as fout:
+            for line in fin:
+                if not line.strip():
+                    continue
+                request = json.loads(line)
+                try:
+                    content = self.handler(request["body"])
+                    record = {
+                        "custom_id": request["custom_id"],
+                        "response": {
+                            "status_code": 200,
+                            "body": {"choices": [{"message": {"content": content}}]},
+                        },
+                        "error": None,
+                    }
+                except Exception as e:
+                    record = {
+                        "custom_id": request["custom_id"],
+                        "response": None,
+                        "error": {"message": str(e)},
+                    }
+                fout.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self._path(batch_id, "output.jsonl"))
+
+    def download(self, batch_id, output_path):
+        shutil.copyfile(self._path(batch_id, "output.jsonl"), output_path)
+
+
+def make_batch_backend(api_client, batch, batch_dir):
+    """
+    Resolve the `batch` option of the stage functions into a backend.
+
+    Parameters:
+    - api_client: APIClient object
+    - batch: "api" for the provider Batch API, "local" for the file-based
+      stand-in, or a backend instance
+    - batch_dir: Directory for batch files
+
+    Returns:
+    - backend: Batch backend
+    """
+    if not isinstance(batch, str):
+        return batch
+    if batch == "local":
+        return LocalBatchBackend(
+            os.path.join(batch_dir, "local"), api_client=api_client
+        )
+    if batch == "api":
+        if api_client.api in ["openai", "openai-compatible"]:
+            return OpenAIBatchBackend(api_client.client)
+        if api_client.api == "azure":
+            return OpenAIBatchBackend(api_client.client, url="/chat/completions")
+        raise ValueError(f"Batch API not supported for API {api_client.api}.")
+    raise ValueError(f"Unknown batch mode {batch}. Use 'api' or 'local'.")
+
+
+def _load_manifest(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_manifest(path, manifest):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def run_batch(
+    backend,
+    prompts,
+    batch_dir,
+    model,
+    max_tokens,
+    temperature,
+    top_p,
+    system_message="You are a helpful assistant.",
+    poll_interval=30,
+    verbose=False,
+    api_client=None,
+    max_requests=MAX_BATCH_REQUESTS,
+    max_bytes=MAX_BATCH_BYTES,
+):
+    """
+    Submit prompts as batches, wait for them, and join results by custom id.
+
+    Prompts are split into one batch per `max_requests` requests or
+    `max_bytes` of input. Batch ids are saved to "batch_manifest.json" in
+    batch_dir as they are submitted; rerunning with the same requests picks
+    the batches up from the manifest, skipping submission (and the download
+    of batches already downloaded).
+
+    Parameters:
+    - backend: Batch backend (OpenAIBatchBackend or LocalBatchBackend)
+    - prompts: List of prompts
+    - batch_dir: Directory for the batch-input and batch-output JSONL files
+    - model: Model name
+    - max_tokens: Maximum token count
+    - temperature: Temperature for sampling
+    - top_p: Top p value for sampling
+    - system_message: System message
+    - poll_interval: Seconds between status checks
+    - verbose: Print batch progress
+    - api_client: Optional APIClient whose telemetry records each request's
+      usage from the batch output
+    - max_requests: Maximum number of requests per batch
+    - max_bytes: Maximum batch-input file size in bytes
+
+    Returns:
+    - responses: List of response texts in prompt order ("Error" for
+      requests that failed or are missing from the output)
+    """
+    shards, fingerprint = write_batch_shards(
+        batch_dir,
+        prompts,
+        model,
+        max_tokens,
+        temperature,
+        top_p,
+        system_message,
+        url=backend.url,
+        max_requests=max_requests,
+        max_bytes=max_bytes,
+    )
+    manifest_path = os.path.join(batch_dir, "batch_manifest.json")
+    manifest = _load_manifest(manifest_path)
+    if (
+        manifest is None
+        or manifest.get("fingerprint") != fingerprint
+        or len(manifest.get("batches", [])) != len(shards)
+    ):
+        manifest = {
+            "fingerprint": fingerprint,
+            "batches": [
+                {"id": None, "requests": len(ids), "downloaded": False}
+                for _, ids in shards
+            ],
+        }
+    elif verbose:
+        print(f"Resuming batches from {manifest_path}.")
+
+    for (input_path, custom_ids), batch in zip(shards, manifest["batches"]):
+        if batch["id"] is None:
+            batch["id"] = backend.submit(input_path)
+            _save_manifest(manifest_path, manifest)
+            if verbose:
+                print(f"Submitted batch {batch['id']} with {len(custom_ids)} requests.")
+
+    output_paths = [
+        os.path.join(batch_dir, f"batch_output_{k}.jsonl") for k in range(len(shards))
+    ]
+    pending = [
+        k
+        for k, batch in enumerate(manifest["batches"])
+        if not (batch["downloaded"] and os.path.exists(output_paths[k]))
+    ]
+    while pending:
+        waiting = []
+        for k in pending:
+            batch_id = manifest["batches"][k]["id"]
+            status = backend.status(batch_id)
+            if status not in backend.terminal:
+                if verbose:
+                    print(f"Batch {batch_id}: {status}")
+                waiting.append(k)
+                continue
+            if status != "completed":
+                raise RuntimeError(f"Batch {batch_id} ended with status '{status}'.")
+            backend.download(batch_id, output_paths[k] + ".tmp")
+            os.replace(output_paths[k] + ".tmp", output_paths[k])
+            manifest["batches"][k]["downloaded"] = True
+            _save_manifest(manifest_path, manifest)
+        pending = waiting
+        if pending:
+            time.sleep(poll_interval)
+
+    responses = []
+    record = api_client is not None and not getattr(backend, "records_usage", False)
+    for (_, custom_ids), output_path in zip(shards, output_paths):
+        usage = {}
+        results = read_batch_output(output_path, usage)
+        for custom_id in custom_ids:
+            response = results.get(custom_id)
+            responses.append(response)
+            if record:
+                tokens = usage.get(custom_id) or {}
+                api_client.telemetry.record(
+                    "batch",
+                    model,
+                    stage=api_client.stage,
+                    prompt_tokens=tokens.get("prompt_tokens", 0),
+                    completion_tokens=tokens.get("completion_tokens", 0),
+                    attempts=1,
+                    error="batch request failed" if response is None else None,
+                )
+    if verbose:
+        failed = sum(response is None for response in responses)
+        print(
+            f"{len(shards)} batch(es) completed: {len(responses) - failed} ok, {failed} failed."
+        )
+    return ["Error" if response is None else response for response in responses]
@@ -0,0 +1,170 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class ResponseCache:
+    """
+    Persistent, content-addressed cache of LLM responses backed by SQLite.
+
+    Parameters:
+    - path: Path to the SQLite database file (created if missing)
+    - max_size_bytes: Evict least recently used entries once the stored
+      responses exceed this size (None for no limit)
+
+    Attributes:
+    - hits: Number of lookups served from the cache
+    - misses: Number of lookups not found in the cache
+
+    Methods:
+    - make_key: Hash the request parameters into a cache key
+    - get: Look up a cached response
+    - set: Store a response
+    - stats: Return hit/miss counters and size information
+    - clear: Remove all entries
+    - close: Close the database connection
+    """
+
+    def __init__(self, path, max_size_bytes=None):
+        self.path = path
+        self.max_size_bytes = max_size_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        # One connection shared by all worker threads, serialized by the lock.
+        # WAL lets separate processes read while another one writes.
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+                "size INTEGER NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed)"
+            )
+            self._conn.commit()
+            self._size = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()[0]
+
+    @staticmethod
+    def make_key(api, model, system_message, prompt, max_tokens, temperature, top_p):
+        """
+        Hash the request parameters into a cache key.
+
+        Parameters:
+        - api: API type
+        - model: Model name
+        - system_message: System message
+        - prompt: Prompt text
+        - max_tokens: Maximum token count
+        - temperature: Temperature for sampling
+        - top_p: Top p value for sampling
+
+        Returns:
+        - key: Hex SHA-256 digest
+        """
+        payload = json.dumps(
+            [api, model, system_message, prompt, max_tokens, temperature, top_p],
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        Look up a cached response.
+
+        Parameters:
+        - key: Cache key from make_key
+
+        Returns:
+        - response: Cached response text, or None on a miss
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+            return row[0]
+
+    def set(self, key, response):
+        """
+        Store a response, evicting old entries if the size limit is exceeded.
+
+        Parameters:
+        - key: Cache key from make_key
+        - response: Response text
+        """
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            old = self._conn.execute(
+                "SELECT size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, accessed) "
+                "VALUES (?, ?, ?, ?)",
+                (key, response, size, time.time()),
+            )
+            self._size += size - (old[0] if old else 0)
+            if self.max_size_bytes is not None and self._size > self.max_size_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Delete least recently used entries until the size limit holds."""
+        excess = self._size - self.max_size_bytes
+        freed, victims = 0, []
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY accessed ASC"
+        ):
+            if freed >= excess:
+                break
+            victims.append((key,))
+            freed += size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+        self._size -= freed
+
+    def stats(self):
+        """
+        Return hit/miss counters and size information.
+
+        Returns:
+        - dict: hits, misses, entries, size_bytes
+        """
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries,
+            "size_bytes": self._size,
+        }
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._size = 0
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
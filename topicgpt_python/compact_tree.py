@@ -0,0 +1,482 @@
+from array import array
+
+from topicgpt_python.utils import TopicTree, paused_gc
+
+
+class CompactNode:
+    """
+    Lightweight view of one node of a CompactTopicTree.
+
+    Views hold only the tree and the node id; every attribute reads from or
+    writes to the tree's arrays. The tree hands out one view per node, so
+    views can be compared with `is` like anytree nodes.
+
+    Attributes:
+    - name, lvl, count, desc: Node fields (assignable)
+    - parent: Parent view or None (assign None to detach, a view to move)
+    - children: Child views in insertion order
+    - descendants: Views of the subtree below the node, in pre-order
+    - root: Root view of the node's tree (or of its detached subtree)
+    """
+
+    __slots__ = ("_tree", "_id")
+
+    def __init__(self, tree, node_id):
+        self._tree = tree
+        self._id = node_id
+
+    @property
+    def name(self):
+        tree = self._tree
+        return tree._names[tree._name_ids[self._id]]
+
+    @name.setter
+    def name(self, value):
+        self._tree._set_field(self._id, "name", value)
+
+    @property
+    def lvl(self):
+        return self._tree._lvls[self._id]
+
+    @lvl.setter
+    def lvl(self, value):
+        self._tree._set_field(self._id, "lvl", value)
+
+    @property
+    def count(self):
+        return self._tree._counts[self._id]
+
+    @count.setter
+    def count(self, value):
+        self._tree._set_field(self._id, "count", value)
+
+    @property
+    def desc(self):
+        return self._tree._descs[self._id]
+
+    @desc.setter
+    def desc(self, value):
+        self._tree._set_field(self._id, "desc", value)
+
+    @property
+    def parent(self):
+        parent = self._tree._parents[self._id]
+        return None if parent < 0 else self._tree._view(parent)
+
+    @parent.setter
+    def parent(self, value):
+        self._tree._set_parent(self._id, -1 if value is None else value._id)
+
+    @property
+    def children(self):
+        return tuple(self._tree._view(i) for i in self._tree._children[self._id])
+
+    @property
+    def descendants(self):
+        return tuple(self._tree._view(i) for i in self._tree._subtree(self._id))
+
+    @property
+    def root(self):
+        node_id, parents = self._id, self._tree._parents
+        while parents[node_id] >= 0:
+            node_id = parents[node_id]
+        return self._tree._view(node_id)
+
+    @property
+    def is_root(self):
+        return self._tree._parents[self._id] < 0
+
+    @property
+    def is_leaf(self):
+        return not self._tree._children[self._id]
+
+    @property
+    def path(self):
+        node_id, parents, path = self._id, self._tree._parents, []
+        while node_id >= 0:
+            path.append(self._tree._view(node_id))
+            node_id = parents[node_id]
+        return tuple(reversed(path))
+
+    def __repr__(self):
+        path = "/" + "/".join(node.name for node in self.path)
+        return (
+            f"{self.__class__.__name__}({path!r}, count={self.count}, "
+            f"desc={self.desc!r}, lvl={self.lvl})"
+        )
+
+
+class CompactTopicTree(TopicTree):
+    """
+    Array-backed TopicTree with the same public methods.
+
+    Nodes live in parallel arrays (parent id, level, count, interned name id)
+    plus a description list and one child-id list per node; CompactNode views
+    expose them with the anytree attributes the pipeline uses. The pre-order
+    traversal is computed once per structural change, and to_topic_list,
+    to_file and get_root_descendants_name read the arrays directly, so large
+    trees load, traverse and serialize without walking node objects.
+
+    Parameters:
+    - root_name: Name of the root topic
+
+    Attributes:
+    - root: Root view of the tree
+    - level_nodes: Dictionary of the last node added per level
+    - version: Incremented on every change to the tree's nodes
+    """
+
+    def __init__(self, root_name="Topics"):
+        self.version = 0
+        self._structure = 0
+        self._nodes = {}
+        self._order = (None, array("l"))
+        self._positions = (None, {})
+        self._topic_lists = {}
+        self._names, self._name_lookup = [], {}
+        self._parents = array("l")
+        self._lvls = array("l")
+        self._counts = array("q")
+        self._name_ids = array("l")
+        self._descs = []
+        self._children = []
+        self._views = []
+        self.root = self._view(self._new(root_name, 0, 1, "Root topic"))
+        self.level_nodes = {0: self.root}
+
+    # Storage -------------------------------------------------------------
+
+    def _intern(self, name):
+        name_id = self._name_lookup.get(name)
+        if name_id is None:
+            name_id = self._name_lookup[name] = len(self._names)
+            self._names.append(name)
+        return name_id
+
+    def _new(self, name, lvl, count, desc, parent=-1):
+        node_id = len(self._parents)
+        self._parents.append(-1)
+        self._lvls.append(lvl)
+        self._counts.append(count)
+        self._name_ids.append(self._intern(name))
+        self._descs.append(desc)
+        self._children.append([])
+        self._views.append(None)
+        if parent >= 0:
+            # Fast path for _set_parent on a fresh leaf
+            self._parents[node_id] = parent
+            self._children[parent].append(node_id)
+            if self._attached(parent):
+                self._index_id(node_id)
+            self._structure += 1
+            self.version += 1
+        return node_id
+
+    def _view(self, node_id):
+        view = self._views[node_id]
+        if view is None:
+            view = self._views[node_id] = CompactNode(self, node_id)
+        return view
+
+    def _attached(self, node_id):
+        while node_id > 0:
+            node_id = self._parents[node_id]
+        return node_id == 0
+
+    def _subtree(self, node_id):
+        """Ids below node_id in pre-order."""
+        order, stack = [], list(reversed(self._children[node_id]))
+        while stack:
+            child = stack.pop()
+            order.append(child)
+            stack.extend(reversed(self._children[child]))
+        return order
+
+    def _preorder(self):
+        structure, order = self._order
+        if structure != self._structure:
+            order = array("l", self._subtree(0))
+            self._order = (self._structure, order)
+        return order
+
+    def _set_parent(self, node_id, parent):
+        old = self._parents[node_id]
+        if old == parent:
+            return
+        if old >= 0:
+            if self._attached(old):
+                for i in [node_id] + self._subtree(node_id):
+                    self._unindex(self._view(i))
+            self._children[old].remove(node_id)
+        self._parents[node_id] = parent
+        if parent >= 0:
+            self._children[parent].append(node_id)
+            if self._attached(parent):
+                for i in [node_id] + self._subtree(node_id):
+                    self._index(self._view(i))
+        self._structure += 1
+        self.version += 1
+
+    def _set_field(self, node_id, field, value):
+        attached = self._attached(node_id) and node_id != 0
+        reindex = attached and field in ("name", "lvl")
+        if reindex:
+            self._unindex(self._view(node_id))
+        if field == "name":
+            self._name_ids[node_id] = self._intern(value)
+        elif field == "lvl":
+            self._lvls[node_id] = value
+        elif field == "count":
+            self._counts[node_id] = value
+        else:
+            self._descs[node_id] = value
+        if reindex:
+            self._index(self._view(node_id))
+        self.version += 1
+
+    def _index(self, node):
+        self._index_id(node._id)
+
+    def _index_id(self, node_id):
+        key = (self._lvls[node_id], self._names[self._name_ids[node_id]].casefold())
+        self._nodes.setdefault(key, []).append(node_id)
+
+    def _unindex(self, node):
+        key = self._key(node.name, node.lvl)
+        ids = self._nodes.get(key, [])
+        if node._id in ids:
+            ids.remove(node._id)
+            if not ids:
+                del self._nodes[key]
+
+    def _lookup(self, name, lvl):
+        ids = self._nodes.get(self._key(name, lvl), [])
+        if len(ids) > 1:
+            structure, positions = self._positions
+            if structure != self._structure:
+                positions = {i: k for k, i in enumerate(self._preorder())}
+                self._positions = (self._structure, positions)
+            ids = sorted(ids, key=positions.__getitem__)
+        return [self._view(i) for i in ids]
+
+    def _child(self, parent_node, name, lvl):
+        parent = parent_node._id
+        bucket = self._nodes.get(self._key(name, lvl), ())
+        children = self._children[parent]
+        if len(children) <= len(bucket) or not self._attached(parent):
+            matches = (i for i in children if self._lvls[i] == lvl)
+        else:
+            matches = (i for i in bucket if self._parents[i] == parent)
+            if len(bucket) > 1:
+                matches = sorted(matches, key=children.index)
+        found = next(
+            (i for i in matches if self._names[self._name_ids[i]] == name), None
+        )
+        return None if found is None else self._view(found)
+
+    # TopicTree interface -------------------------------------------------
+
+    @classmethod
+    def from_topic_list(cls, topic_src, from_file=False):
+        """
+        Construct a CompactTopicTree from a list of topic strings or a file.
+
+        Same result as TopicTree.from_topic_list, built straight into the
+        arrays (siblings are matched through a dict, and the index is filled
+        once at the end).
+
+        Parameters:
+        - topic_src: List of topic strings or path to a file
+        - from_file: Flag to indicate if the source is a file
+
+        Returns:
+        - tree: Constructed CompactTopicTree
+        """
+        if from_file:
+            payload = cls._load_sidecar(topic_src)
+            if payload is not None:
+                with paused_gc():
+                    return cls._from_records(payload["root"], payload["nodes"])
+        tree = cls()
+        with paused_gc():
+            tree._load_lines(cls._parse_topic_list(topic_src, from_file))
+        return tree
+
+    def _load_lines(self, topics):
+        """Add parsed (lvl, label, count, desc) topics to a new, empty tree."""
+        last, siblings = {0: 0}, {}
+        parents, lvls, counts, name_ids, descs, children = (
+            self._parents,
+            self._lvls,
+            self._counts,
+            self._name_ids,
+            self._descs,
+            self._children,
+        )
+        for lvl, label, count, desc in topics:
+            parent = last.get(lvl - 1)
+            if parent is None:
+                continue
+            existing = siblings.get((parent, label))
+            if existing is not None:
+                counts[existing] += count
+                continue
+            node_id = len(parents)
+            siblings[(parent, label)] = node_id
+            parents.append(parent)
+            lvls.append(lvl)
+            counts.append(count)
+            name_ids.append(self._intern(label))
+            descs.append(desc)
+            children.append([])
+            children[parent].append(node_id)
+            self._views.append(None)
+            last[lvl] = node_id
+        for node_id in range(1, len(parents)):
+            self._index_id(node_id)
+        self._structure += 1
+        self.version += 1
+        self.level_nodes = {lvl: self._view(i) for lvl, i in last.items()}
+
+    def _add_node(self, lvl, label, count, desc, parent_node):
+        """
+        Add a node to the tree, merging with duplicates if present.
+
+        Parameters:
+        - lvl: Level of the node
+        - label: Name of the node
+        - count: Count of the node
+        - desc: Description of the node
+        - parent_node: Parent node of the new node
+
+        Returns:
+        - node: The new or existing node (None without a parent)
+        """
+        if not parent_node:
+            return None
+        parent = parent_node._id
+        existing = self._child(parent_node, label, lvl)
+        if existing:
+            existing.count += count
+            return existing
+        new_node = self._view(self._new(label, lvl, count, desc, parent))
+        self.level_nodes[lvl] = new_node
+        return new_node
+
+    @classmethod
+    def _from_records(cls, root_name, records):
+        tree = cls(root_name)
+        if not records:
+            return tree
+        # Record ids are pre-order positions, which are also the new node ids
+        parents, lvls, counts, names, descs = zip(*records)
+        tree._parents.extend(parents)
+        tree._lvls.extend(lvls)
+        tree._counts.extend(counts)
+        tree._name_ids.extend(map(tree._intern, names))
+        tree._descs.extend(descs)
+        tree._views.extend([None] * len(records))
+        children = tree._children
+        children.extend([] for _ in records)
+        last = {0: 0}
+        for node_id, (parent, lvl) in enumerate(zip(parents, lvls), 1):
+            children[parent].append(node_id)
+            last[lvl] = node_id
+        index = tree._nodes
+        for node_id, key in enumerate(zip(lvls, map(str.casefold, names)), 1):
+            index.setdefault(key, []).append(node_id)
+        tree.level_nodes = {lvl: tree._view(i) for lvl, i in last.items()}
+        tree._structure += 1
+        tree.version += 1
+        return tree
+
+    def _records(self):
+        order = self._preorder()
+        ids = {node_id: k for k, node_id in enumerate(order, 1)}
+        ids[0] = 0
+        names, name_ids = self._names, self._name_ids
+        return [
+            [
+                ids[self._parents[i]],
+                self._lvls[i],
+                self._counts[i],
+                names[name_ids[i]],
+                self._descs[i],
+            ]
+            for i in order
+        ]
+
+    def to_file(self, fname, sidecar=True):
+        """
+        Save the tree to a file.
+
+        Parameters:
+        - fname: Path to the file
+        - sidecar: Also write the JSON sidecar (see sidecar_path)
+        """
+        names, name_ids, lvls, counts, descs = (
+            self._names,
+            self._name_ids,
+            self._lvls,
+            self._counts,
+            self._descs,
+        )
+        text = "".join(
+            f"{'    ' * (lvls[i] - 1)}[{lvls[i]}] {names[name_ids[i]]} "
+            f"(Count: {counts[i]}): {descs[i]}\n"
+            for i in self._preorder()
+            if len(descs[i]) > 0
+        )
+        with open(fname, "w") as f:
+            f.write(text)
+        if sidecar:
+            self._write_sidecar(fname)
+
+    def to_topic_list(self, desc=True, count=True):
+        """
+        Convert the tree to a list of topic strings.
+
+        Parameters:
+        - desc: Include description in the string
+        - count: Include count in the string
+
+        Returns:
+        - list: List of topic strings
+        """
+        version, topics = self._topic_lists.get((desc, count), (None, None))
+        if version != self.version:
+            names, name_ids, lvls, counts, descs = (
+                self._names,
+                self._name_ids,
+                self._lvls,
+                self._counts,
+                self._descs,
+            )
+            order = self._preorder()
+            if desc and count:
+                topics = [
+                    f"[{lvls[i]}] {names[name_ids[i]]} (Count: {counts[i]}): {descs[i]}"
+                    for i in order
+                ]
+            elif desc:
+                topics = [
+                    f"[{lvls[i]}] {names[name_ids[i]]}: {descs[i]}" for i in order
+                ]
+            elif count:
+                topics = [
+                    f"[{lvls[i]}] {names[name_ids[i]]} (Count: {counts[i]})"
+                    for i in order
+                ]
+            else:
+                topics = [f"[{lvls[i]}] {names[name_ids[i]]}" for i in order]
+            self._topic_lists[(desc, count)] = (self.version, topics)
+        return list(topics)
+
+    def get_root_descendants_name(self):
+        """Get the root description.
+
+        Returns:
+        - list: List of root descendants' names
+        """
+        names, name_ids = self._names, self._name_ids
+        return [names[name_ids[i]] for i in self._preorder()]
@@ -6,23 +6,13 @@ import os
 import regex as re
 import os
 from topicgpt_python.utils import *
-
+from topicgpt_python.batch import make_batch_backend, run_batch
+from topicgpt_python.embeddings import get_embedding_service, get_topic_index
 
 # Disable parallel tokenizers to avoid warnings
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
 
-def _maybe_get_sbert():
-    try:
-        if "TRANSFORMERS_NO_TORCHVISION" not in os.environ:
-            os.environ["TRANSFORMERS_NO_TORCHVISION"] = "1"
-        from sentence_transformers import SentenceTransformer, util as st_util
-
-        return SentenceTransformer("all-MiniLM-L6-v2"), st_util
-    except Exception:
-        return None, None
-
-
 def topic_parser(root_topics, df, verbose=False):
     """
     Return a list of indices of rows with errors and hallucinated topics.
@@ -65,6 +55,118 @@ def topic_parser(root_topics, df, verbose=False):
     return error, hallucinated
 
 
+def build_correction_prompt(
+    api_client,
+    doc,
+    response,
+    all_topics,
+    prompt_len,
+    correction_prompt,
+    context_len,
+    topic_index=None,
+):
+    """
+    Build the correction prompt for one document
+
+    Parameters:
+    - api_client: APIClient object
+    - doc: document text
+    - response: previous (invalid) assignment response
+    - all_topics: newline-joined topic list
+    - prompt_len: token count of correction_prompt
+    - correction_prompt: str
+    - context_len: int
+    - topic_index: TopicIndex over all_topics' lines (built if None)
+
+    Returns:
+    - prompt: formatted prompt
+    """
+    topics = all_topics
+    if (
+        api_client.estimate_token_count(doc)
+        + prompt_len
+        + api_client.estimate_token_count(all_topics)
+        > context_len
+    ):
+        if topic_index is None:
+            topic_index = get_topic_index(all_topics.split("\n"), api_client)
+        # Most similar topics within half the context (at least 50 when
+        # ranked); without embeddings, the first topics that fit
+        top_topics = topic_index.pack(
+            doc, context_len // 2, min_lines=50 if topic_index.ranked else 0
+        )
+        topics = "\n".join(top_topics)
+
+        max_doc_len = context_len - api_client.estimate_token_count(
+            correction_prompt + topics
+        )
+        if api_client.estimate_token_count(doc) > max_doc_len:
+            doc = api_client.truncating(doc, max_doc_len)
+
+    msg = f"Previously, this document was assigned to: {response}. Please reassign it to an existing topic in the hierarchy."
+    return correction_prompt.format(Document=doc, tree=topics, Message=msg)
+
+
+def _correction_prompt_builder(
+    api_client, topics_root, df, correction_prompt, context_len
+):
+    """
+    Return a function building the correction prompt for row i, sharing the
+    topic string, its token count and the topic index across rows.
+    """
+    topic_lines = topics_root.to_topic_list(desc=True, count=False)
+    all_topics = "\n".join(topic_lines)
+    prompt_len = api_client.estimate_token_count(correction_prompt)
+    topics_len = api_client.estimate_token_count(all_topics)
+    # Built once, on the first document that needs pruning
+    topic_index = None
+
+    def build(i):
+        nonlocal topic_index
+        doc = df.at[i, "prompted_docs"]
+        if (
+            topic_index is None
+            and api_client.estimate_token_count(doc) + prompt_len + topics_len
+            > context_len
+        ):
+            topic_index = get_topic_index(topic_lines, api_client)
+        return build_correction_prompt(
+            api_client,
+            doc,
+            df.at[i, "responses"],
+            all_topics,
+            prompt_len,
+            correction_prompt,
+            context_len,
+            topic_index,
+        )
+
+    return build
+
+
+def build_correction_prompts(
+    api_client, topics_root, df, correction_prompt, context_len, reprompt_idx
+):
+    """
+    Build correction prompts for the rows to reprompt without sending them
+
+    Parameters:
+    - api_client: APIClient object
+    - topics_root: TopicTree object
+    - df: DataFrame with 'prompted_docs' and 'responses' columns
+    - correction_prompt: str
+    - context_len: int
+    - reprompt_idx: list of row indices to correct
+
+    Returns:
+    - prompts: list of prompts, aligned with reprompt_idx
+    """
+    build = _correction_prompt_builder(
+        api_client, topics_root, df, correction_prompt, context_len
+    )
+    return [build(i) for i in tqdm(reprompt_idx, desc="Building correction prompts")]
+
+
 def correct(
     api_client,
     topics_root,
@@ -76,62 +178,47 @@ def correct(
     top_p=1.0,
     max_tokens=1000,
     verbose=False,
+    concurrency=None,
 ):
-    """Return documents with assigned topics based on relevance."""
-    all_topics = "\n".join(topics_root.to_topic_list(desc=True, count=False))
+    """
+    Return documents with assigned topics based on relevance.
 
-    for i in tqdm(reprompt_idx, desc="Correcting topics"):
-        doc = df.at[i, "prompted_docs"]
-        if (
-            api_client.estimate_token_count(doc + correction_prompt + all_topics)
-            > context_len
-        ):
-            sbert, st_util = _maybe_get_sbert()
-            if sbert is not None:
-                topic_embeddings = {
-                    topic: sbert.encode(topic, convert_to_tensor=True)
-                    for topic in all_topics.split("\n")
-                }
-                doc_embedding = sbert.encode(doc, convert_to_tensor=True)
-                top_topics = sorted(
-                    topic_embeddings,
-                    key=lambda t: st_util.cos_sim(
-                        topic_embeddings[t], doc_embedding
-                    ).cpu(),
-                    reverse=True,
-                )
-            else:
-                # Fallback: keep first N topics to fit context
-                top_topics = []
-                for t in all_topics.split("\n"):
-                    if (
-                        APIClient("openai", "gpt-4").estimate_token_count(
-                            "\n".join(top_topics + [t])
-                        )
-                        > context_len // 2
-                    ):
-                        break
-                    top_topics.append(t)
-
-            while (
-                api_client.estimate_token_count("\n".join(top_topics))
-                > context_len // 2
-                and len(top_topics) > 50
-            ):
-                top_topics.pop()
-            all_topics = "\n".join(top_topics)
-
-            max_doc_len = context_len - api_client.estimate_token_count(
-                correction_prompt + all_topics
-            )
-            if api_client.estimate_token_count(doc) > max_doc_len:
-                doc = api_client.truncating(doc, max_doc_len)
+    Parameters:
+    - concurrency: Number of requests in flight at once (1 for sequential;
+      None for 8 with openai/openai-compatible, else 1)
+    """
+    build = _correction_prompt_builder(
+        api_client, topics_root, df, correction_prompt, context_len
+    )
 
+    # Concurrent path: the same engine as assignment, with prompts built
+    # lazily as slots free up
+    concurrency = resolve_concurrency(api_client, concurrency)
+    if concurrency > 1:
+        results = api_client.concurrent_prompt(
+            (build(i) for i in reprompt_idx),
+            max_tokens,
+            temperature,
+            top_p=top_p,
+            concurrency=concurrency,
+            return_exceptions=True,
+            progress="Correcting topics",
+        )
+        for i, result in zip(reprompt_idx, results):
+            if isinstance(result, Exception):
+                print(f"Error correcting document {i+1}: {result}")
+                traceback.print_exception(type(result), result, result.__traceback__)
+                result = "Error"
+            elif verbose:
+                print(f"Document {i+1}: {result}")
+                print("-" * 20)
+            df.at[i, "responses"] = result
+        return df
+
+    for i in tqdm(reprompt_idx, desc="Correcting topics"):
         try:
-            msg = f"Previously, this document was assigned to: {df.at[i, 'responses']}. Please reassign it to an existing topic in the hierarchy."
-            prompt = correction_prompt.format(
-                Document=doc, tree=all_topics, Message=msg
-            )
+            # Built per row, so a failure affects only this row
+            prompt = build(i)
             result = api_client.iterative_prompt(
                 prompt, max_tokens=max_tokens, temperature=temperature, top_p=top_p
             )
@@ -157,52 +244,35 @@ def correct_batch(
     top_p,
     max_tokens,
     verbose=False,
+    batch_backend=None,
+    batch_dir=None,
 ):
-    """Return documents with assigned topics based on relevance."""
-    all_topics = "\n".join(topics_root.to_topic_list(desc=True, count=False))
-    prompts = []
-
-    for i in tqdm(reprompt_idx, desc="Correcting topics"):
-        doc = df.at[i, "prompted_docs"]
-        if (
-            api_client.estimate_token_count(doc + correction_prompt + all_topics)
-            > context_len
-        ):
-            topic_embeddings = {
-                topic: sbert.encode(topic, convert_to_tensor=True)
-                for topic in all_topics.split("\n")
-            }
-            doc_embedding = sbert.encode(doc, convert_to_tensor=True)
-            top_topics = sorted(
-                topic_embeddings,
-                key=lambda t: util.cos_sim(topic_embeddings[t], doc_embedding).cpu(),
-                reverse=True,
-            )
-
-            while (
-                api_client.estimate_token_count("\n".join(top_topics))
-                > context_len // 2
-                and len(top_topics) > 50
-            ):
-                top_topics.pop()
-            all_topics = "\n".join(top_topics)
-
-            max_doc_len = context_len - api_client.estimate_token_count(
-                correction_prompt + all_topics
-            )
-            if api_client.estimate_token_count(doc) > max_doc_len:
-                doc = api_client.truncate(doc, max_doc_len)
-        msg = f"Previously, this document was assigned to: {df.at[i, 'responses']}. Please reassign it to an existing topic in the hierarchy."
-        prompt = correction_prompt.format(Document=doc, tree=all_topics, Message=msg)
-        prompts.append(prompt)
-
-    responses = api_client.batch_prompt(
-        prompts, max_tokens, temperature, top_p, verbose
+    """
+    Return documents with assigned topics based on relevance, sending all
+    correction prompts at once (vLLM, or a provider batch backend if given).
+    """
+    prompts = build_correction_prompts(
+        api_client, topics_root, df, correction_prompt, context_len, reprompt_idx
     )
-    for responses, i in zip(responses, reprompt_idx):
-        df.at[i, "responses"] = responses
+
+    if batch_backend is not None:
+        responses = run_batch(
+            batch_backend,
+            prompts,
+            batch_dir,
+            api_client.model,
+            max_tokens,
+            temperature,
+            top_p,
+            verbose=verbose,
+            api_client=api_client,
+        )
+    else:
+        responses = api_client.batch_prompt(prompts, max_tokens, temperature, top_p)
+    for response, i in zip(responses, reprompt_idx):
+        df.at[i, "responses"] = response
         if verbose:
-            print(f"Document {i+1}: {responses}")
+            print(f"Document {i+1}: {response}")
             print("-" * 20)
 
     return df
@@ -218,6 +288,12 @@ def correct_topics(
     verbose=False,
     base_url=None,
     api_key=None,
+    batch=None,
+    batch_dir="data/output/batch/correction",
+    api_client=None,
+    summary_file=None,
+    embedding_dir=None,
+    concurrency=None,
 ):
     """
     Main function to parse, correct, and save topic assignments.
@@ -230,8 +306,19 @@ def correct_topics(
     - topic_path: Path to topic file
     - output_path: Path to save corrected output
     - verbose: Print verbose output
+    - batch: Run offline through a batch backend: "api" for the provider Batch API, "local" for the file-based stand-in (or a backend instance). None sends requests directly.
+    - batch_dir: Directory for batch-input/output JSONL files
+    - api_client: Existing APIClient to reuse (e.g. shared across stages); api/model/base_url/api_key are ignored when given
+    - summary_file: Optional JSON file for the run summary (requests, tokens, latency percentiles, retries, cache hits)
+    - embedding_dir: Optional persistent embedding store shared with assign_topics; stored embeddings are reused and new ones appended
+    - concurrency: Number of concurrent API requests (None for 8 with openai/openai-compatible, else sequential)
     """
-    api_client = APIClient(api=api, model=model, base_url=base_url, api_key=api_key)
+    if embedding_dir is not None:
+        get_embedding_service().open_store(embedding_dir)
+    if api_client is None:
+        api_client = APIClient(api=api, model=model, base_url=base_url, api_key=api_key)
+    api, model = api_client.api, api_client.model
+    api_client.stage = "correction"
     max_tokens, temperature, top_p = 1000, 0.6, 0.9
     context_len = (
         128000
@@ -257,7 +344,7 @@ def correct_topics(
     reprompt_idx = error + hallucinated
 
     if len(reprompt_idx) > 0:
-        if model == "vllm":
+        if api == "vllm" or batch is not None:
             df = correct_batch(
                 api_client,
                 topics_root,
@@ -267,7 +354,14 @@ def correct_topics(
                 reprompt_idx,
                 temperature=temperature,
                 top_p=top_p,
+                max_tokens=max_tokens,
                 verbose=verbose,
+                batch_backend=(
+                    make_batch_backend(api_client, batch, batch_dir)
+                    if batch is not None
+                    else None
+                ),
+                batch_dir=batch_dir,
             )
         else:
             df = correct(
@@ -278,6 +372,7 @@ def correct_topics(
                 context_len,
                 reprompt_idx,
                 verbose=verbose,
+                concurrency=concurrency,
             )
         df.to_json(output_path, lines=True, orient="records")
         error, hallucinated = topic_parser(topics_root, df, verbose)
@@ -288,6 +383,7 @@ def correct_topics(
     else:
         print("All topics are correct.")
         df.to_json(output_path, lines=True, orient="records")
+    api_client.stage_summary(summary_file, verbose)
 
 
 if __name__ == "__main__":
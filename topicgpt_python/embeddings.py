@@ -0,0 +1,516 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+
+class EmbeddingService:
+    """
+    Lazily loaded, thread-safe sentence embedding model.
+
+    One service is shared by every stage (see get_embedding_service), so the
+    SentenceTransformer is loaded at most once per process, on first use.
+    Embeddings are L2-normalized, so cosine similarity is a dot product.
+
+    Parameters:
+    - model_name: SentenceTransformer model name or path
+    - device: Device to run on ("cpu", "cuda", ...; None to auto-detect)
+    - batch_size: Batch size for encoding
+    - cache_size: Number of text embeddings memoized (LRU; 0 to disable)
+    - store_dir: Optional EmbeddingStore directory; embeddings are read from
+      and appended to it so reruns skip the model
+
+    Attributes:
+    - loads: Number of times the model was loaded
+    - encode_calls: Number of batches sent to the model
+    - sentences: Number of texts sent to the model
+    - store: EmbeddingStore or None
+
+    Methods:
+    - open_store: Attach a persistent EmbeddingStore
+    - available: Whether sentence-transformers can be loaded
+    - encode: Embed one text
+    - encode_many: Embed a list of texts (batched; memoized texts skipped)
+    - rank: Sort candidate texts by similarity to a query
+    """
+
+    def __init__(
+        self,
+        model_name=DEFAULT_EMBEDDING_MODEL,
+        device=None,
+        batch_size=64,
+        cache_size=10000,
+        store_dir=None,
+    ):
+        self.model_name = model_name
+        self.device = device
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.loads = 0
+        self.encode_calls = 0
+        self.sentences = 0
+        self._model = None
+        self._failed = False
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._encode_lock = threading.Lock()
+        self.store = None
+        if store_dir is not None:
+            self.open_store(store_dir)
+
+    def open_store(self, store_dir):
+        """
+        Attach a persistent embedding store (no-op if already attached).
+
+        Parameters:
+        - store_dir: Store directory (created if missing)
+
+        Returns:
+        - store: EmbeddingStore
+        """
+        store_dir = os.path.abspath(store_dir)
+        if self.store is None or self.store.path != store_dir:
+            self.store = EmbeddingStore(store_dir, self.model_name)
+        return self.store
+
+    @property
+    def model(self):
+        """The SentenceTransformer, loaded on first access (None if unavailable)."""
+        if self._model is None and not self._failed:
+            with self._load_lock:
+                if self._model is None and not self._failed:
+                    try:
+                        if "TRANSFORMERS_NO_TORCHVISION" not in os.environ:
+                            os.environ["TRANSFORMERS_NO_TORCHVISION"] = "1"
+                        from sentence_transformers import SentenceTransformer
+
+                        self._model = SentenceTransformer(
+                            self.model_name, device=self.device
+                        )
+                        self.loads += 1
+                    except Exception as e:
+                        print(f"Warning: embedding model unavailable ({e}).")
+                        self._failed = True
+        return self._model
+
+    @property
+    def available(self):
+        return self.model is not None
+
+    def encode(self, text):
+        """
+        Embed one text.
+
+        Parameters:
+        - text: Text to embed
+
+        Returns:
+        - embedding: Normalized 1-D float32 array
+        """
+        return self.encode_many([text])[0]
+
+    def encode_many(self, texts):
+        """
+        Embed a list of texts in batches.
+
+        Parameters:
+        - texts: List of texts
+
+        Returns:
+        - embeddings: Normalized float32 array of shape (len(texts), dim)
+        """
+        texts = list(texts)
+        vectors = [self._cache_get(text) for text in texts]
+        missing = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+        if missing and self.store is not None:
+            stored = dict(zip(missing, self.store.get_many(missing)))
+            for text, vector in stored.items():
+                if vector is not None:
+                    self._cache_set(text, vector)
+            vectors = [
+                stored.get(t) if v is None else v for t, v in zip(texts, vectors)
+            ]
+            missing = [t for t in missing if stored[t] is None]
+        if missing:
+            model = self.model
+            if model is None:
+                raise RuntimeError(
+                    "sentence-transformers is required for embedding-based "
+                    "topic selection."
+                )
+            with self._encode_lock:
+                self.encode_calls += 1
+                self.sentences += len(missing)
+                encoded = np.asarray(
+                    model.encode(
+                        missing,
+                        batch_size=self.batch_size,
+                        convert_to_numpy=True,
+                        show_progress_bar=False,
+                    ),
+                    dtype=np.float32,
+                )
+            norms = np.linalg.norm(encoded, axis=1, keepdims=True)
+            encoded = encoded / np.maximum(norms, 1e-12)
+            fresh = dict(zip(missing, encoded))
+            for text, vector in fresh.items():
+                self._cache_set(text, vector)
+            if self.store is not None:
+                self.store.add_many(missing, encoded)
+            vectors = [fresh[t] if v is None else v for t, v in zip(texts, vectors)]
+        if not vectors:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack(vectors)
+
+    def rank(self, query, candidates):
+        """
+        Sort candidate texts by cosine similarity to a query.
+
+        Parameters:
+        - query: Query text (e.g. a document)
+        - candidates: List of candidate texts (e.g. topic lines)
+
+        Returns:
+        - ranked: Distinct candidates, most similar first (ties keep input
+          order)
+        """
+        candidates = list(dict.fromkeys(candidates))
+        if not candidates:
+            return []
+        scores = self.encode_many(candidates) @ self.encode(query)
+        return [candidates[i] for i in np.argsort(-scores, kind="stable")]
+
+    def _cache_get(self, text):
+        if self.cache_size <= 0:
+            return None
+        with self._cache_lock:
+            vector = self._cache.get(text)
+            if vector is not None:
+                self._cache.move_to_end(text)
+            return vector
+
+    def _cache_set(self, text, vector):
+        if self.cache_size <= 0:
+            return
+        with self._cache_lock:
+            self._cache[text] = vector
+            self._cache.move_to_end(text)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+
+class EmbeddingStore:
+    """
+    Append-only, memory-mapped embedding store on disk.
+
+    Vectors are float16 rows of `vectors.npy`, a standard .npy file (so
+    np.load(..., mmap_mode="r") reads it too) preallocated in doubling
+    chunks; `keys.bin` holds one 20-byte sha1(model name, text) per row in
+    the same order, so the offset of a text's vector is its key's position
+    and the number of keys is the number of valid rows. The vector file is
+    mapped read-only (zero-copy) and remapped after each append. Vectors are
+    written before their keys, so an interrupted append leaves only
+    unreferenced rows. One writer process at a time.
+
+    Parameters:
+    - path: Store directory (created if missing)
+    - model_name: Embedding model name; part of every key, and checked
+      against the store's meta.json
+
+    Methods:
+    - key: Key of a text
+    - get_many: Look up vectors for texts (None where missing)
+    - add_many: Append vectors for texts not yet stored
+    """
+
+    KEY_BYTES = 20
+    MIN_ROWS = 1024
+
+    def __init__(self, path, model_name):
+        self.path = os.path.abspath(path)
+        self.model_name = model_name
+        self.dim = None
+        self._rows = {}
+        self._vectors = None
+        self._lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+        self._meta_file = os.path.join(self.path, "meta.json")
+        self._vector_file = os.path.join(self.path, "vectors.npy")
+        self._key_file = os.path.join(self.path, "keys.bin")
+        if os.path.exists(self._meta_file):
+            with open(self._meta_file) as f:
+                meta = json.load(f)
+            if meta["model"] != model_name:
+                raise ValueError(
+                    f"Embedding store {self.path} holds {meta['model']} "
+                    f"embeddings, not {model_name}."
+                )
+            self.dim = meta["dim"]
+            self._load()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def key(self, text):
+        return hashlib.sha1(f"{self.model_name}\0{text}".encode("utf-8")).digest()
+
+    def _load(self):
+        keys = b""
+        if os.path.exists(self._key_file):
+            with open(self._key_file, "rb") as f:
+                keys = f.read()
+        self._map()
+        capacity = 0 if self._vectors is None else len(self._vectors)
+        count = min(len(keys) // self.KEY_BYTES, capacity)
+        self._rows = {
+            keys[i * self.KEY_BYTES : (i + 1) * self.KEY_BYTES]: i for i in range(count)
+        }
+
+    def _map(self):
+        self._vectors = (
+            np.lib.format.open_memmap(self._vector_file, mode="r")
+            if os.path.exists(self._vector_file)
+            else None
+        )
+
+    def _grow(self, count, capacity):
+        """Copy the first `count` rows into a new file with `capacity` rows."""
+        tmp_file = self._vector_file + ".tmp"
+        grown = np.lib.format.open_memmap(
+            tmp_file, mode="w+", dtype=np.float16, shape=(capacity, self.dim)
+        )
+        if count:
+            grown[:count] = self._vectors[:count]
+        grown.flush()
+        del grown
+        os.replace(tmp_file, self._vector_file)
+
+    def get_many(self, texts):
+        """
+        Look up stored vectors.
+
+        Parameters:
+        - texts: List of texts
+
+        Returns:
+        - vectors: float32 vector per text, or None where not stored
+        """
+        with self._lock:
+            vectors = self._vectors
+            rows = [self._rows.get(self.key(text)) for text in texts]
+        found = [row for row in rows if row is not None]
+        if not found:
+            return [None] * len(rows)
+        block = iter(np.asarray(vectors[found], dtype=np.float32))
+        return [None if row is None else next(block) for row in rows]
+
+    def add_many(self, texts, vectors):
+        """
+        Append vectors for texts that are not stored yet.
+
+        Parameters:
+        - texts: List of texts
+        - vectors: Array of shape (len(texts), dim)
+        """
+        vectors = np.asarray(vectors, dtype=np.float16)
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                with open(self._meta_file, "w") as f:
+                    json.dump({"model": self.model_name, "dim": self.dim}, f)
+            new = {}
+            for text, vector in zip(texts, vectors):
+                key = self.key(text)
+                if key not in self._rows and key not in new:
+                    new[key] = vector
+            if not new:
+                return
+            # Rows past the last key are left over from an interrupted
+            # append; overwrite them.
+            count = len(self._rows)
+            end = count + len(new)
+            capacity = 0 if self._vectors is None else len(self._vectors)
+            if end > capacity:
+                self._grow(count, max(end, 2 * capacity, self.MIN_ROWS))
+            out = np.lib.format.open_memmap(self._vector_file, mode="r+")
+            out[count:end] = np.stack(list(new.values()))
+            out.flush()
+            del out
+            with open(self._key_file, "ab") as f:
+                f.truncate(count * self.KEY_BYTES)
+                f.write(b"".join(new))
+            for i, key in enumerate(new):
+                self._rows[key] = count + i
+            self._map()
+
+
+_SERVICE = None
+_SERVICE_LOCK = threading.Lock()
+
+
+def get_embedding_service():
+    """
+    Return the process-wide embedding service, creating it on first use.
+
+    Returns:
+    - service: EmbeddingService
+    """
+    global _SERVICE
+    if _SERVICE is None:
+        with _SERVICE_LOCK:
+            if _SERVICE is None:
+                _SERVICE = EmbeddingService()
+    return _SERVICE
+
+
+def configure_embeddings(
+    model_name=DEFAULT_EMBEDDING_MODEL,
+    device=None,
+    batch_size=64,
+    cache_size=10000,
+    store_dir=None,
+):
+    """
+    Replace the process-wide embedding service.
+
+    Parameters:
+    - model_name: SentenceTransformer model name or path
+    - device: Device to run on (None to auto-detect)
+    - batch_size: Batch size for encoding
+    - cache_size: Number of text embeddings memoized
+    - store_dir: Optional persistent EmbeddingStore directory
+
+    Returns:
+    - service: The new EmbeddingService
+    """
+    global _SERVICE
+    with _SERVICE_LOCK:
+        _SERVICE = EmbeddingService(
+            model_name, device, batch_size, cache_size, store_dir
+        )
+    return _SERVICE
+
+
+class TopicIndex:
+    """
+    Embedding matrix and token lengths for a fixed list of topic lines.
+
+    Built once per topic list, so pruning the list for a document costs one
+    document encode, one matrix-vector product and an argpartition instead of
+    one model call per topic. Without sentence-transformers the lines keep
+    their original order.
+
+    Parameters:
+    - lines: Topic lines (duplicates are dropped)
+    - api_client: APIClient used for token counts
+    - embedder: EmbeddingService (defaults to the shared service)
+
+    Attributes:
+    - lines: Distinct topic lines
+    - matrix: Normalized embeddings, one row per line (None if unavailable)
+    - token_lengths: Token count of each line plus its newline
+
+    Methods:
+    - ranked: Whether lines are ordered by similarity (model available)
+    - top: Indices of the k lines most similar to a document
+    - pack: Most similar lines that fit a token budget
+    """
+
+    def __init__(self, lines, api_client, embedder=None):
+        self.lines = list(dict.fromkeys(lines))
+        self.embedder = embedder or get_embedding_service()
+        self.matrix = (
+            self.embedder.encode_many(self.lines)
+            if self.lines and self.embedder.available
+            else None
+        )
+        self.token_lengths = np.asarray(
+            api_client.estimate_token_counts([line + "\n" for line in self.lines]),
+            dtype=np.int64,
+        )
+
+    @property
+    def ranked(self):
+        return self.matrix is not None
+
+    def top(self, doc, k):
+        """
+        Indices of the k lines most similar to a document.
+
+        Parameters:
+        - doc: Document text
+        - k: Number of lines
+
+        Returns:
+        - indices: Line indices, most similar first (ties keep line order)
+        """
+        n = len(self.lines)
+        k = max(0, min(k, n))
+        if not self.ranked or k == 0:
+            return np.arange(k)
+        scores = self.matrix @ self.embedder.encode(doc)
+        if k < n:
+            candidates = np.argpartition(-scores, k - 1)[:k]
+        else:
+            candidates = np.arange(n)
+        return candidates[np.lexsort((candidates, -scores[candidates]))]
+
+    def pack(self, doc, budget, min_lines=0):
+        """
+        Greedily take the most similar lines until the next one would exceed
+        the token budget.
+
+        Parameters:
+        - doc: Document text
+        - budget: Token budget for the selected lines
+        - min_lines: Keep at least this many lines even if over budget
+
+        Returns:
+        - lines: Selected lines, most similar first
+        """
+        if not self.lines:
+            return []
+        shortest = max(1, int(self.token_lengths.min()))
+        k = max(min_lines, max(0, budget) // shortest + 1)
+        order = self.top(doc, k)
+        used = np.cumsum(self.token_lengths[order])
+        count = max(min_lines, int(np.searchsorted(used, budget, side="right")))
+        return [self.lines[i] for i in order[:count]]
+
+
+_INDEXES = OrderedDict()
+_INDEX_LOCK = threading.Lock()
+_INDEX_CACHE_SIZE = 8
+
+
+def get_topic_index(lines, api_client):
+    """
+    Return the TopicIndex for a topic list, reusing it while the list and the
+    embedding service are unchanged.
+
+    Parameters:
+    - lines: Topic lines
+    - api_client: APIClient used for token counts
+
+    Returns:
+    - index: TopicIndex
+    """
+    embedder = get_embedding_service()
+    key = (id(embedder), api_client.model, tuple(lines))
+    with _INDEX_LOCK:
+        index = _INDEXES.get(key)
+        if index is not None and index.embedder is embedder:
+            _INDEXES.move_to_end(key)
+            return index
+    index = TopicIndex(lines, api_client, embedder)
+    with _INDEX_LOCK:
+        _INDEXES[key] = index
+        while len(_INDEXES) > _INDEX_CACHE_SIZE:
+            _INDEXES.popitem(last=False)
+    return index
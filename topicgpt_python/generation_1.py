@@ -1,27 +1,173 @@
 import argparse
+import json
 import os
 import traceback
+from string import Formatter
 
+import numpy as np
 import pandas as pd
 import regex
 from tqdm import tqdm
 
 from topicgpt_python.utils import *  # noqa: F403
+from topicgpt_python.embeddings import get_embedding_service, get_topic_index
 
 # Set environment variables
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
 
-def _maybe_get_sbert():
-    """Lazily import SentenceTransformer to avoid heavy deps at import-time."""
-    try:
-        if "TRANSFORMERS_NO_TORCHVISION" not in os.environ:
-            os.environ["TRANSFORMERS_NO_TORCHVISION"] = "1"
-        from sentence_transformers import SentenceTransformer, util as st_util
+class TopicPromptBuilder:
+    """
+    Build generation prompts while the topic list grows.
+
+    Keeps the topic block, an estimate of its token count and the template
+    text around the document up to date as topics are inserted, so a prompt
+    costs one document token count and one join instead of re-joining and
+    re-tokenizing the whole topic list per document. The estimate is the sum
+    of per-label counts plus the newlines between them; tokenizers can merge
+    a newline with adjacent punctuation, so when a prompt comes within one
+    token per newline of the limit the joined block is counted exactly (once
+    per insert) before deciding whether to truncate.
+
+    Parameters:
+    - generation_prompt: Prompt template with {Topics} and {Document} fields
+    - api_client: APIClient used for token counts and truncation
+    - topics_list: Initial topic lines
+
+    Attributes:
+    - lines: Topic lines (as in the tree's topic list; labels only once a
+      topic has been added)
+    - block: Topic labels joined by newlines, as inserted into the prompt
+    - topic_len: Estimated token count of the block
+    - label_lens: Token count of each label
+
+    Methods:
+    - add: Insert a topic line
+    - build: Format the prompt for a document, truncating if it is too long
+    """
 
-        return SentenceTransformer("all-MiniLM-L6-v2"), st_util
-    except Exception:
-        return None, None
+    def __init__(self, generation_prompt, api_client, topics_list):
+        self.generation_prompt = generation_prompt
+        self.api_client = api_client
+        self.prompt_len = api_client.estimate_token_count(generation_prompt)
+        self._newline_len = api_client.estimate_token_count("\n")
+        self._fields = list(Formatter().parse(generation_prompt))
+        self.label_lens = []
+        self.topic_len = 0
+        self._lines = []
+        self._labels = []
+        self._added = False
+        self._exact_len = None
+        self._index = None
+        self._segments = None
+        self._extend(topics_list)
+
+    @staticmethod
+    def _label(line):
+        # Only pass the label (before ':') to keep the prompt compact
+        return line.split(":")[0].strip()
+
+    def _extend(self, lines):
+        labels = [self._label(line) for line in lines]
+        lens = self.api_client.estimate_token_counts(labels) if labels else []
+        for line, label, length in zip(lines, labels, lens):
+            if self._labels:
+                self.topic_len += self._newline_len
+            self._lines.append(line)
+            self._labels.append(label)
+            self.label_lens.append(length)
+            self.topic_len += length
+        self._index = None
+        self._segments = None
+        self._exact_len = None
+
+    def add(self, line):
+        """
+        Insert a topic line.
+
+        Parameters:
+        - line: Topic line, e.g. "[1] Label" or "[1] Label: description"
+        """
+        self._extend([line])
+        self._added = True
+
+    @property
+    def lines(self):
+        # Once a topic is added the tree's topic list is rebuilt without
+        # descriptions, which leaves exactly the labels
+        return self._labels if self._added else self._lines
+
+    @property
+    def block(self):
+        return "\n".join(self._labels)
+
+    def _block_len(self):
+        """Exact token count of the joined block (cached until the next insert)."""
+        if self._exact_len is None:
+            self._exact_len = self.api_client.estimate_token_count(self.block)
+        return self._exact_len
+
+    def _format(self, doc, topics):
+        return self.generation_prompt.format(Document=doc, Topics=topics)
+
+    def _render(self, doc):
+        """Join the document into the template pre-filled with the topics."""
+        if self._segments is None:
+            formatter, values = Formatter(), {"Topics": self.block}
+            self._segments, current = [], []
+            for literal, field, spec, conversion in self._fields:
+                current.append(literal)
+                if field is None:
+                    continue
+                if field == "Document":
+                    self._segments.append("".join(current))
+                    current = []
+                else:
+                    value = formatter.convert_field(values[field], conversion)
+                    current.append(formatter.format_field(value, spec))
+            self._segments.append("".join(current))
+        return doc.join(self._segments)
+
+    def build(self, doc, context_len, verbose, max_top_len=500):
+        """
+        Format the prompt for a document.
+
+        Parameters:
+        - doc: Document text
+        - context_len: Token budget for the prompt
+        - verbose: Print when the document or topic list is truncated
+        - max_top_len: Tokens reserved for topics when truncating the document
+
+        Returns:
+        - prompt: Formatted prompt
+        """
+        api_client, prompt_len = self.api_client, self.prompt_len
+        doc_len = api_client.estimate_token_count(doc)
+        topic_len = self.topic_len
+        if prompt_len + doc_len + topic_len > context_len - len(self._labels):
+            topic_len = self._block_len()
+        if prompt_len + doc_len + topic_len <= context_len:
+            return self._render(doc)
+
+        # Handle cases where prompt is too long
+        if doc_len > (context_len - prompt_len - max_top_len):  # Truncate document
+            if verbose:
+                print(f"Document is too long ({doc_len} tokens). Truncating...")
+            doc = api_client.truncating(doc, context_len - prompt_len - max_top_len)
+            return self._render(doc)
+
+        # Truncate topic list
+        if verbose:
+            print(f"Too many topics ({topic_len} tokens). Pruning...")
+        # Retain the most similar topics (in list order without
+        # embeddings) that fit within the context length
+        max_top_len_actual = context_len - prompt_len - doc_len
+        if self._index is None:
+            self._index = get_topic_index(self.lines, api_client)
+        seed_str = "".join(
+            top + "\n" for top in self._index.pack(doc, max_top_len_actual)
+        )
+        return self._format(doc, seed_str)
 
 
 def prompt_formatting(
@@ -37,62 +183,12 @@ def prompt_formatting(
     """
     Format prompt to include document and seed topics.
     Handle cases where prompt is too long.
-    """
-    # Only pass the label (before ':') for seeds to keep prompt compact
-    topic_str = "\n".join([topic.split(":")[0].strip() for topic in topics_list])
-
-    # Calculate length of document, seed topics, and prompt
-    doc_len = api_client.estimate_token_count(doc)
-    prompt_len = api_client.estimate_token_count(generation_prompt)
-    topic_len = api_client.estimate_token_count(topic_str)
-    total_len = prompt_len + doc_len + topic_len
 
-    # Handle cases where prompt is too long
-    if total_len > context_len:
-        if doc_len > (context_len - prompt_len - max_top_len):  # Truncate document
-            if verbose:
-                print(f"Document is too long ({doc_len} tokens). Truncating...")
-            doc = api_client.truncating(doc, context_len - prompt_len - max_top_len)
-            prompt = generation_prompt.format(Document=doc, Topics=topic_str)
-        else:  # Truncate topic list
-            if verbose:
-                print(f"Too many topics ({topic_len} tokens). Pruning...")
-            sbert, st_util = _maybe_get_sbert()
-            if sbert is not None:
-                cos_sim = {}
-                doc_emb = sbert.encode(doc, convert_to_tensor=True)
-                for top in topics_list:
-                    top_emb = sbert.encode(top, convert_to_tensor=True)
-                    cos_sim[top] = st_util.cos_sim(top_emb, doc_emb)
-                # sort by cosine similarity (descending)
-                sim_topics = sorted(cos_sim, key=cos_sim.get, reverse=True)
-
-                # Retain only similar topics that fit within the context length
-                max_top_len_actual = context_len - prompt_len - doc_len
-                seed_len, seed_str = 0, ""
-                while seed_len < max_top_len_actual and sim_topics:
-                    new_seed = sim_topics.pop(0)
-                    token_count = api_client.estimate_token_count(new_seed + "\n")
-                    if seed_len + token_count > max_top_len_actual:
-                        break
-                    seed_str += new_seed + "\n"
-                    seed_len += token_count
-                prompt = generation_prompt.format(Document=doc, Topics=seed_str)
-            else:
-                # Fallback: greedy pack topics until they fit
-                max_top_len_actual = context_len - prompt_len - doc_len
-                seed_len, seed_str = 0, ""
-                for top in topics_list:
-                    token_count = api_client.estimate_token_count(top + "\n")
-                    if seed_len + token_count > max_top_len_actual:
-                        break
-                    seed_str += top + "\n"
-                    seed_len += token_count
-                prompt = generation_prompt.format(Document=doc, Topics=seed_str)
-    else:
-        prompt = generation_prompt.format(Document=doc, Topics=topic_str)
-
-    return prompt
+    Builds a one-off TopicPromptBuilder; generate_topics keeps one builder
+    for the whole run instead.
+    """
+    builder = TopicPromptBuilder(generation_prompt, api_client, topics_list)
+    return builder.build(doc, context_len, verbose, max_top_len)
 
 
 # Robust topic line regex:
@@ -125,6 +221,187 @@ def parse_topics(response: str):
     return out
 
 
+def save_checkpoint(
+    checkpoint_file, topics_root, topics_list, responses, saved, cursor, counter
+):
+    """
+    Write the generation state so a later run can resume it.
+
+    Responses since the last checkpoint are appended to
+    `<checkpoint_file>.responses`; the tree, topic list, cursor and
+    early-stop counter are then written atomically (temp file + rename), so
+    the state file always describes a complete prefix of the responses log.
+
+    Parameters:
+    - checkpoint_file: Path of the checkpoint state file
+    - topics_root: TopicTree object
+    - topics_list: Topic list used for the next prompt
+    - responses: All responses so far
+    - saved: Number of responses already in the responses log
+    - cursor: Index of the next document to process
+    - counter: Documents since the last new topic
+
+    Returns:
+    - saved: Number of responses now in the responses log
+    """
+    with open(checkpoint_file + ".responses", "a", encoding="utf-8") as f:
+        for response in responses[saved:]:
+            f.write(json.dumps(response, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    state = {
+        "cursor": cursor,
+        "docs_since_new_topic": counter,
+        "responses": len(responses),
+        "topics_list": topics_list,
+        "root": topics_root.root.name,
+        "nodes": topics_root._records(),
+    }
+    tmp_file = checkpoint_file + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        f.write(json.dumps(state, ensure_ascii=False))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, checkpoint_file)
+    return len(responses)
+
+
+def load_checkpoint(checkpoint_file):
+    """
+    Load the state written by save_checkpoint.
+
+    Responses logged after the last complete checkpoint are dropped from the
+    responses log.
+
+    Parameters:
+    - checkpoint_file: Path of the checkpoint state file
+
+    Returns:
+    - state: Dictionary with cursor, docs_since_new_topic, topics_list,
+      responses (list) and topics_root (TopicTree), or None if there is no
+      checkpoint
+    """
+    if not os.path.exists(checkpoint_file):
+        return None
+    with open(checkpoint_file, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    log_file = checkpoint_file + ".responses"
+    responses = []
+    if state["responses"]:
+        with open(log_file, "r", encoding="utf-8") as f:
+            for line in f:
+                if len(responses) == state["responses"]:
+                    break
+                responses.append(json.loads(line))
+    with open(log_file, "w", encoding="utf-8") as f:
+        f.writelines(json.dumps(r, ensure_ascii=False) + "\n" for r in responses)
+    state["responses"] = responses
+    state["topics_root"] = TopicTree._from_records(  # noqa: F405
+        state.pop("root"), state.pop("nodes")
+    )
+    return state
+
+
+def remove_checkpoint(checkpoint_file):
+    """Delete a checkpoint and its responses log."""
+    for path in (checkpoint_file, checkpoint_file + ".responses"):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class TopicDeduplicator:
+    """
+    Match new first-level labels to existing ones by embedding similarity.
+
+    Used by windowed generation, where documents in a window are prompted
+    against the same topic list and may propose near-identical labels.
+    Without sentence-transformers no label matches, leaving the
+    case-insensitive check in add_topics.
+
+    Parameters:
+    - threshold: Minimum cosine similarity for a label to match a topic
+    - embedder: EmbeddingService (defaults to the shared service)
+
+    Methods:
+    - match: Find the existing topic a new label duplicates
+    """
+
+    def __init__(self, threshold, embedder=None):
+        self.threshold = threshold
+        self.embedder = embedder or get_embedding_service()
+        self._nodes = []
+        self._vectors = None
+
+    def match(self, topics_root, name):
+        """
+        Find the existing first-level topic a new label duplicates.
+
+        Parameters:
+        - topics_root: TopicTree object
+        - name: New label
+
+        Returns:
+        - node: The most similar topic at or above the threshold, or None
+        """
+        if not self.embedder.available:
+            return None
+        nodes = [node for node in topics_root.root.children if node.lvl == 1]
+        if not nodes:
+            return None
+        if [n.name for n in nodes] != [n.name for n in self._nodes]:
+            self._nodes = nodes
+            self._vectors = self.embedder.encode_many([n.name for n in nodes])
+        scores = self._vectors @ self.embedder.encode(name)
+        best = int(np.argmax(scores))
+        return nodes[best] if scores[best] >= self.threshold else None
+
+
+def add_topics(response, topics_root, verbose, deduplicator=None):
+    """
+    Add the first-level topics in a response to the tree.
+
+    Topics already in the tree (case-insensitive, or similar according to
+    `deduplicator`) have their count incremented instead.
+
+    Parameters:
+    - response: Model response
+    - topics_root: TopicTree object
+    - verbose: Print skipped lines
+    - deduplicator: Optional TopicDeduplicator
+
+    Returns:
+    - added: Nodes of the new topics
+    """
+    added = []
+
+    # Parse all valid topic lines from the whole response
+    matches = parse_topics(response)
+
+    if not matches and verbose:
+        print(f"No parsable topics in response:\n{response}\n")
+
+    for lvl, name, desc in matches:
+        if lvl != 1:
+            if verbose:
+                print(
+                    f"Lower level topics are not allowed: [{lvl}] {name}: {desc}. Skipping..."
+                )
+            continue
+
+        dups = topics_root.find_duplicates(name, lvl)
+        if not dups and deduplicator is not None:
+            similar = deduplicator.match(topics_root, name)
+            if similar is not None:
+                if verbose:
+                    print(f"Merging similar topic: {name} -> {similar.name}")
+                dups = [similar]
+        if dups:
+            dups[0].count += 1
+        else:
+            added.append(topics_root._add_node(lvl, name, 1, desc, topics_root.root))
+    return added
+
+
 def generate_topics(
     topics_root,
     topics_list,
@@ -138,80 +415,147 @@ def generate_topics(
     top_p,
     verbose,
     early_stop=50,  # Modify this parameter to control early stopping
+    checkpoint_file=None,
+    checkpoint_every=10,
+    state=None,
+    window=1,
+    dedup_threshold=0.9,
 ):
     """
     Generate topics from documents using LLMs.
+
+    Parameters:
+    - checkpoint_file: Optional path to checkpoint the run to every
+      `checkpoint_every` documents and when it stops
+    - state: Checkpoint state from load_checkpoint to resume from
+    - window: Number of documents prompted concurrently against the same
+      topic list (1 for the sequential loop, where every prompt sees the
+      topics found so far)
+    - dedup_threshold: Embedding similarity above which a label proposed in
+      a window counts toward an existing topic (None to disable; only used
+      when window > 1)
     """
     responses = []
     docs_since_new_topic = 0
+    start = 0
+    if state is not None:
+        responses = state["responses"]
+        docs_since_new_topic = state["docs_since_new_topic"]
+        start = state["cursor"]
+    saved = len(responses)
+    window = max(1, window)
+    deduplicator = (
+        TopicDeduplicator(dedup_threshold)
+        if window > 1 and dedup_threshold is not None
+        else None
+    )
 
-    for i, doc in enumerate(tqdm(docs)):
-        prompt = prompt_formatting(
-            generation_prompt,
-            api_client,
-            doc,
-            seed_file,
-            topics_list,
-            context_len,
-            verbose,
-        )
-
-        try:
-            added_new_topic = False
-            response = api_client.iterative_prompt(  # noqa: F405
-                prompt, max_tokens, temperature, top_p=top_p, verbose=verbose
+    builder = TopicPromptBuilder(generation_prompt, api_client, topics_list)
+
+    def checkpoint(cursor):
+        nonlocal saved
+        if checkpoint_file is not None:
+            saved = save_checkpoint(
+                checkpoint_file,
+                topics_root,
+                builder.lines,
+                responses,
+                saved,
+                cursor,
+                docs_since_new_topic,
             )
 
-            # Parse all valid topic lines from the whole response
-            matches = parse_topics(response)
-
-            if not matches and verbose:
-                print(f"No parsable topics in response:\n{response}\n")
+    if docs_since_new_topic >= early_stop:
+        return responses, builder.lines, topics_root
 
-            for lvl, name, desc in matches:
-                if lvl != 1:
-                    if verbose:
-                        print(
-                            f"Lower level topics are not allowed: [{lvl}] {name}: {desc}. Skipping..."
+    cursor = start  # first document whose response is not applied yet
+    bar = tqdm(initial=start, total=len(docs))
+    try:
+        for first in range(start, len(docs), window):
+            # Every prompt in a window sees the same topic list
+            prompts = [
+                builder.build(doc, context_len, verbose)
+                for doc in docs[first : first + window]
+            ]
+            try:
+                if window == 1:
+                    results = [
+                        api_client.iterative_prompt(  # noqa: F405
+                            prompts[0],
+                            max_tokens,
+                            temperature,
+                            top_p=top_p,
+                            verbose=verbose,
                         )
-                    continue
-
-                dups = topics_root.find_duplicates(name, lvl)
-                if dups:
-                    dups[0].count += 1
+                    ]
                 else:
-                    topics_root._add_node(lvl, name, 1, desc, topics_root.root)
-                    topics_list = topics_root.to_topic_list(desc=False, count=False)
-                    added_new_topic = True
-
-            if added_new_topic:
-                docs_since_new_topic = 0
-            else:
-                docs_since_new_topic += 1
-                if verbose:
-                    print(f"Docs since new topic: {docs_since_new_topic}/{early_stop}")
-            if docs_since_new_topic >= early_stop:
-                if verbose:
-                    print(
-                        f"Early stop triggered: {docs_since_new_topic} consecutive documents without new topics."
+                    results = api_client.concurrent_prompt(
+                        prompts,
+                        max_tokens,
+                        temperature,
+                        top_p=top_p,
+                        concurrency=window,
+                        verbose=verbose,
+                        return_exceptions=True,
                     )
-                return responses, topics_list, topics_root
-
-            if verbose:
-                print(f"Topics: {response}")
-                print("--------------------")
-            responses.append(response)
-
-        except KeyboardInterrupt:
-            # Preserve progress cleanly on manual interrupt
-            responses.append("Interrupted")
-            break
-        except Exception:
-            traceback.print_exc()
-            responses.append("Error")
-            break
+            except KeyboardInterrupt:
+                raise
+            except Exception as e:
+                results = [e]
+
+            # Apply the window's responses in document order
+            for i, response in enumerate(results, first):
+                try:
+                    if isinstance(response, BaseException):
+                        raise response
+                    added = add_topics(response, topics_root, verbose, deduplicator)
+                    for node in added:
+                        builder.add(
+                            topics_root.node_to_str(node, count=False, desc=False)
+                        )
+                    if added:
+                        docs_since_new_topic = 0
+                    else:
+                        docs_since_new_topic += 1
+                        if verbose:
+                            print(
+                                f"Docs since new topic: {docs_since_new_topic}/{early_stop}"
+                            )
+                    if docs_since_new_topic >= early_stop:
+                        if verbose:
+                            print(
+                                f"Early stop triggered: {docs_since_new_topic} consecutive documents without new topics."
+                            )
+                        checkpoint(i + 1)
+                        return responses, builder.lines, topics_root
 
-    return responses, topics_list, topics_root
+                    if verbose:
+                        print(f"Topics: {response}")
+                        print("--------------------")
+                    responses.append(response)
+                    cursor = i + 1
+                    bar.update(1)
+                    if (i + 1) % checkpoint_every == 0:
+                        checkpoint(i + 1)
+                except KeyboardInterrupt:
+                    raise
+                except Exception:
+                    traceback.print_exc()
+                    checkpoint(i)
+                    responses.append("Error")
+                    return responses, builder.lines, topics_root
+
+    except KeyboardInterrupt:
+        # Preserve progress cleanly on manual interrupt; a resumed run
+        # retries the first unfinished document
+        checkpoint(cursor)
+        responses.append("Interrupted")
+        return responses, builder.lines, topics_root
+    finally:
+        bar.close()
+
+    checkpoint(len(docs))
+    return responses, builder.lines, topics_root
 
 
 def generate_topic_lvl1(
@@ -226,15 +570,41 @@ def generate_topic_lvl1(
     base_url=None,
     api_key=None,
     early_stop=50,
+    api_client=None,
+    summary_file=None,
+    resume=False,
+    checkpoint_file=None,
+    checkpoint_every=10,
+    window=1,
+    dedup_threshold=0.9,
 ):
     """
     Generate high-level topics
+
+    Parameters:
+    - api_client: Existing APIClient to reuse (e.g. shared across stages);
+      api/model/base_url/api_key are ignored when given
+    - summary_file: Optional JSON file for the run summary (requests,
+      tokens, latency percentiles, retries, cache hits)
+    - resume: Continue from the checkpoint of an interrupted run, if any
+    - checkpoint_file: Checkpoint path (default: `<out_file>.checkpoint`);
+      kept when the run stops on an error or interrupt, removed otherwise
+    - checkpoint_every: Number of documents between checkpoints
+    - window: Number of documents prompted concurrently against the same
+      topic list; larger windows cut wall time roughly window-fold at the
+      cost of some redundant topics (1 for sequential generation)
+    - dedup_threshold: Embedding similarity above which a label proposed in
+      a window counts toward an existing topic (None to disable)
+
     Returns:
     - topics_root (TopicTree): Root node of the topic tree
     """
-    api_client = APIClient(
-        api=api, model=model, base_url=base_url, api_key=api_key
-    )  # noqa: F405
+    if api_client is None:
+        api_client = APIClient(
+            api=api, model=model, base_url=base_url, api_key=api_key
+        )  # noqa: F405
+    api, model = api_client.api, api_client.model
+    api_client.stage = "generation_1"
     max_tokens, temperature, top_p = 1000, 0.0, 1.0
 
     if verbose:
@@ -261,8 +631,17 @@ def generate_topic_lvl1(
     docs = df["text"].tolist()
     with open(prompt_file, "r") as f:
         generation_prompt = f.read()
-    topics_root = TopicTree().from_seed_file(seed_file)  # noqa: F405
-    topics_list = topics_root.to_topic_list(desc=True, count=False)
+    if checkpoint_file is None:
+        checkpoint_file = out_file + ".checkpoint"
+    state = load_checkpoint(checkpoint_file) if resume else None
+    if state is not None:
+        if verbose:
+            print(f"Resuming from document {state['cursor']} ({checkpoint_file})")
+        topics_root, topics_list = state["topics_root"], state["topics_list"]
+    else:
+        remove_checkpoint(checkpoint_file)
+        topics_root = TopicTree().from_seed_file(seed_file)  # noqa: F405
+        topics_list = topics_root.to_topic_list(desc=True, count=False)
 
     # Generate topics
     responses, topics_list, topics_root = generate_topics(
@@ -278,6 +657,11 @@ def generate_topic_lvl1(
         top_p,
         verbose,
         early_stop,
+        checkpoint_file,
+        checkpoint_every,
+        state,
+        window,
+        dedup_threshold,
     )
 
     # Save generated topics
@@ -294,7 +678,11 @@ def generate_topic_lvl1(
         with open(backup_path, "w") as f:
             for line in responses:
                 print(line, file=f)
+    else:
+        if not responses or responses[-1] not in ("Error", "Interrupted"):
+            remove_checkpoint(checkpoint_file)
 
+    api_client.stage_summary(summary_file, verbose)
     return topics_root
 
 
@@ -344,6 +732,29 @@ if __name__ == "__main__":
     )
     parser.add_argument("--base_url", type=str, default=None)
     parser.add_argument("--api_key", type=str, default=None)
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue from the checkpoint of an interrupted run",
+    )
+    parser.add_argument(
+        "--checkpoint_every",
+        type=int,
+        default=10,
+        help="Number of documents between checkpoints",
+    )
+    parser.add_argument(
+        "--window",
+        type=int,
+        default=1,
+        help="Number of documents prompted concurrently against the same topics",
+    )
+    parser.add_argument(
+        "--dedup_threshold",
+        type=float,
+        default=0.9,
+        help="Embedding similarity for merging labels proposed in a window",
+    )
     args = parser.parse_args()
     generate_topic_lvl1(
         args.api,
@@ -356,4 +767,8 @@ if __name__ == "__main__":
         args.verbose,
         args.base_url,
         args.api_key,
+        resume=args.resume,
+        checkpoint_every=args.checkpoint_every,
+        window=args.window,
+        dedup_threshold=args.dedup_threshold,
     )
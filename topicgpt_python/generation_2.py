@@ -246,6 +246,8 @@ def generate_topic_lvl2(
     verbose,
     base_url=None,
     api_key=None,
+    api_client=None,
+    summary_file=None,
 ):
     """
     Generate subtopics for each top-level topic.
@@ -259,10 +261,15 @@ def generate_topic_lvl2(
     - out_file: Output result file
     - topic_file: Output topics file
     - verbose: Enable verbose output
+    - api_client: Existing APIClient to reuse (e.g. shared across stages); api/model/base_url/api_key are ignored when given
+    - summary_file: Optional JSON file for the run summary (requests, tokens, latency percentiles, retries, cache hits)
 
     Returns: Root node of the topic tree
     """
-    api_client = APIClient(api=api, model=model, base_url=base_url, api_key=api_key)
+    if api_client is None:
+        api_client = APIClient(api=api, model=model, base_url=base_url, api_key=api_key)
+    api, model = api_client.api, api_client.model
+    api_client.stage = "generation_2"
     max_tokens, temperature, top_p = 1000, 0.0, 1.0
 
     if verbose:
@@ -306,6 +313,7 @@ def generate_topic_lvl2(
     pd.DataFrame({"text": docs, "topics": res}).to_json(
         out_file, orient="records", lines=True
     )
+    api_client.stage_summary(summary_file, verbose)
     return topics_root
 
 
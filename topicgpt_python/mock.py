@@ -0,0 +1,280 @@
+import asyncio
+import hashlib
+import math
+import random
+import regex
+import threading
+import time
+
+# Generic top-level labels handed out by the generation stage; plain words so
+# they round-trip through every stage's topic regex.
+MOCK_TOPICS = [
+    "Agriculture",
+    "Banking",
+    "Climate",
+    "Crime",
+    "Defense",
+    "Economy",
+    "Education",
+    "Elections",
+    "Energy",
+    "Environment",
+    "Finance",
+    "Food Safety",
+    "Health",
+    "Housing",
+    "Immigration",
+    "Infrastructure",
+    "Labor",
+    "Law",
+    "Media",
+    "Public Safety",
+    "Science",
+    "Sports",
+    "Taxes",
+    "Technology",
+    "Trade",
+    "Transportation",
+    "Travel",
+    "Veterans",
+    "Water",
+    "Welfare",
+]
+MOCK_SUBTOPICS = ["Policy", "Funding", "Regulation", "Research", "Access", "Reform"]
+
+TREE_LINE = regex.compile(
+    r"(?m)^\s*\[(\d+)\] ([^:\n(]+?)\s*(?:\([^)\n]*\))?\s*(?::\s*(.*))?$"
+)
+UNSAFE_DESC = regex.compile(r"[^\w\s,\.\-\/;']")
+
+
+class MockAPIError(Exception):
+    """Simulated provider error carrying an HTTP status and response headers."""
+
+    def __init__(self, message, status_code, headers=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.response = _MockResponse(status_code, headers or {})
+
+
+class _MockResponse:
+    def __init__(self, status_code, headers):
+        self.status_code = status_code
+        self.headers = headers
+
+
+class MockLLM:
+    """
+    Offline stand-in for a chat model, used with APIClient(api="mock").
+
+    Responses are a deterministic function of the prompt and follow the
+    output format each stage's template asks for, so the whole pipeline can
+    run without network access. Latency, failures and 429s are drawn from a
+    seeded random stream.
+
+    Parameters:
+    - latency: Median latency per request in seconds
+    - latency_sigma: Spread of the latency distribution (log-space sigma for
+      "lognormal", relative half-width for "uniform")
+    - latency_distribution: "lognormal", "uniform", "exponential" or "fixed"
+    - tokens_per_second: Optional decode speed; adds completion_tokens /
+      tokens_per_second to each request
+    - error_rate: Probability of a simulated 500 error
+    - rate_limit_rate: Probability of a simulated 429 error
+    - retry_after: Retry-After (seconds) sent with simulated 429s
+    - hallucination_rate: Probability that an assignment names a topic that
+      is not in the hierarchy (exercises the correction stage)
+    - merge_rate: Probability that the refinement stage merges a pair
+    - num_topics: Number of distinct top-level topics generation can produce
+    - seed: Seed for latency/error draws and response content
+
+    Methods:
+    - complete: Produce a response (blocking)
+    - acomplete: Produce a response (async)
+    - respond: Build the response text for a prompt without delay or errors
+    """
+
+    def __init__(
+        self,
+        latency=0.05,
+        latency_sigma=0.5,
+        latency_distribution="lognormal",
+        tokens_per_second=None,
+        error_rate=0.0,
+        rate_limit_rate=0.0,
+        retry_after=0.1,
+        hallucination_rate=0.0,
+        merge_rate=0.5,
+        num_topics=10,
+        seed=0,
+    ):
+        self.latency = latency
+        self.latency_sigma = latency_sigma
+        self.latency_distribution = latency_distribution
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.hallucination_rate = hallucination_rate
+        self.merge_rate = merge_rate
+        self.topics = MOCK_TOPICS[: max(1, min(num_topics, len(MOCK_TOPICS)))]
+        self.seed = seed
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _draw(self):
+        """Draw (latency, failure) for one request from the seeded stream."""
+        with self._lock:
+            self.calls += 1
+            u = self._rng.random()
+            if self.latency_distribution == "fixed":
+                latency = self.latency
+            elif self.latency_distribution == "uniform":
+                spread = self.latency * self.latency_sigma
+                latency = self._rng.uniform(
+                    self.latency - spread, self.latency + spread
+                )
+            elif self.latency_distribution == "exponential":
+                latency = self._rng.expovariate(1 / self.latency) if self.latency else 0
+            else:
+                latency = self.latency * math.exp(
+                    self._rng.gauss(0, self.latency_sigma)
+                )
+        failure = None
+        if u < self.rate_limit_rate:
+            failure = MockAPIError(
+                "Rate limit reached (mock)",
+                429,
+                {"retry-after-ms": str(int(self.retry_after * 1000))},
+            )
+        elif u < self.rate_limit_rate + self.error_rate:
+            failure = MockAPIError("Internal server error (mock)", 500)
+        return max(0.0, latency), failure
+
+    def _prepare(self, prompt, system_message, max_tokens, timeout):
+        latency, failure = self._draw()
+        text = self.respond(prompt)
+        usage = (
+            _approx_tokens(system_message) + _approx_tokens(prompt),
+            min(max_tokens, _approx_tokens(text)),
+        )
+        if self.tokens_per_second and failure is None:
+            latency += usage[1] / self.tokens_per_second
+        if timeout is not None and latency > timeout:
+            return timeout, MockAPIError("Request timed out (mock)", 408), None
+        return latency, failure, (text, usage)
+
+    def complete(self, prompt, system_message="", max_tokens=1000, timeout=None):
+        """
+        Produce a response after a simulated delay.
+
+        Parameters:
+        - prompt: Prompt text
+        - system_message: System message
+        - max_tokens: Maximum completion tokens reported in usage
+        - timeout: Raise a 408 error if the drawn latency exceeds it
+
+        Returns:
+        - response: Response text
+        - usage: (prompt_tokens, completion_tokens)
+        """
+        latency, failure, result = self._prepare(
+            prompt, system_message, max_tokens, timeout
+        )
+        time.sleep(latency)
+        if failure is not None:
+            raise failure
+        return result
+
+    async def acomplete(self, prompt, system_message="", max_tokens=1000, timeout=None):
+        """Async counterpart of complete."""
+        latency, failure, result = self._prepare(
+            prompt, system_message, max_tokens, timeout
+        )
+        await asyncio.sleep(latency)
+        if failure is not None:
+            raise failure
+        return result
+
+    def respond(self, prompt):
+        """
+        Build the response text for a prompt.
+
+        Parameters:
+        - prompt: Prompt text built from one of the stage templates
+
+        Returns:
+        - response: Text in the format the stage's parser expects
+        """
+        rng = random.Random(_digest(self.seed, prompt))
+        if "[Top-level topics]" in prompt:
+            return self._generation_1(prompt, rng)
+        if "[Topic branch]" in prompt:
+            return self._generation_2(prompt, rng)
+        if "[Topic List]" in prompt:
+            return self._refinement(prompt, rng)
+        if "[Topic Hierarchy]" in prompt:
+            return self._assignment(prompt, rng)
+        return "Mock response."
+
+    def _generation_1(self, prompt, rng):
+        label = rng.choice(self.topics)
+        return f"[1] {label}: Documents about {label.lower()} and related issues."
+
+    def _generation_2(self, prompt, rng):
+        branch = _section(prompt, "[Topic branch]", "[Documents]")
+        match = TREE_LINE.search(branch)
+        if match is None:
+            return "None"
+        parent = match.group(2).strip()
+        documents = _section(prompt, "[Documents]", "DO NOT add").count("Document ")
+        subtopic = rng.choice(MOCK_SUBTOPICS)
+        ids = ", ".join(str(i + 1) for i in range(max(1, documents)))
+        return (
+            f"[1] {parent}\n"
+            f"    [2] {parent} {subtopic} (Document: {ids}): "
+            f"{subtopic} aspects of {parent.lower()}."
+        )
+
+    def _refinement(self, prompt, rng):
+        topics = TREE_LINE.findall(_section(prompt, "[Topic List]", "Output the"))
+        merges = []
+        for i in range(0, len(topics) - 1, 2):
+            if rng.random() >= self.merge_rate:
+                continue
+            (lvl, name, desc), (lvl2, name2, _) = topics[i], topics[i + 1]
+            name, name2 = name.strip(), name2.strip()
+            desc = UNSAFE_DESC.sub("", desc or f"Merged {name.lower()} topics").strip()
+            merges.append(f"[{lvl}] {name}: {desc} ([{lvl}] {name}, [{lvl2}] {name2})")
+        return "\n".join(merges) if merges else "None"
+
+    def _assignment(self, prompt, rng):
+        topics = TREE_LINE.findall(_section(prompt, "[Topic Hierarchy]", "[Examples]"))
+        document = _section(prompt, "[Document]", "\n\n").strip()
+        quote = " ".join(document.split()[:8])
+        if not topics or rng.random() < self.hallucination_rate:
+            return f'[1] Unlisted Topic: Not in the hierarchy (mock) ("{quote}")'
+        lvl, name, _ = topics[rng.randrange(len(topics))]
+        return f'[{lvl}] {name.strip()}: Assigned by the mock backend ("{quote}")'
+
+
+def _digest(seed, text):
+    return int.from_bytes(
+        hashlib.blake2b(f"{seed}\0{text}".encode("utf-8"), digest_size=8).digest(),
+        "big",
+    )
+
+
+def _approx_tokens(text):
+    return max(1, len(text) // 4) if text else 0
+
+
+def _section(text, start, end):
+    """Text between the `start` marker and the next `end` marker."""
+    begin = text.find(start)
+    if begin < 0:
+        return ""
+    begin += len(start)
+    stop = text.find(end, begin)
+    return text[begin:] if stop < 0 else text[begin:stop]
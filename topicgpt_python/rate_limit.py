@@ -0,0 +1,296 @@
+import asyncio
+import re
+import threading
+import time
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+
+
+def error_status(exc):
+    """
+    Return the HTTP status code carried by an SDK exception, if any.
+
+    Parameters:
+    - exc: Exception raised by an API client
+
+    Returns:
+    - status: Integer status code or None
+    """
+    for attr in ("status_code", "code", "status"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(exc, "response", None)
+    value = getattr(response, "status_code", None)
+    return value if isinstance(value, int) else None
+
+
+def error_headers(exc):
+    """
+    Return the response headers carried by an SDK exception, if any.
+
+    Parameters:
+    - exc: Exception raised by an API client
+
+    Returns:
+    - headers: Mapping of response headers (empty if unavailable)
+    """
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    return headers if headers is not None else {}
+
+
+def _header(headers, *names):
+    for name in names:
+        value = headers.get(name)
+        if value is None:
+            value = headers.get(name.title())
+        if value is not None:
+            return value
+    return None
+
+
+def parse_retry_after(headers):
+    """
+    Parse Retry-After / retry-after-ms headers into seconds.
+
+    Parameters:
+    - headers: Mapping of response headers
+
+    Returns:
+    - seconds: Delay in seconds, or None if no usable header is present
+    """
+    value = _header(headers, "retry-after-ms")
+    if value is not None:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = _header(headers, "retry-after")
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNIT_SECONDS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_reset(value):
+    """
+    Parse a rate-limit reset header into seconds from now.
+
+    Parameters:
+    - value: OpenAI-style duration ("1s", "6m0s", "20ms"), Anthropic-style
+      RFC 3339 timestamp, or a number of seconds
+
+    Returns:
+    - seconds: Time until the limit resets, or None if unparseable
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = _DURATION.findall(value)
+    if parts and "".join(n + u for n, u in parts) == value:
+        return sum(float(n) * _UNIT_SECONDS[u] for n, u in parts)
+    try:
+        reset = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        return max(0.0, reset.timestamp() - time.time())
+    except ValueError:
+        return None
+
+
+def _parse_number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class _Bucket:
+    """Token bucket that may go into debt; callers wait until it is repaid."""
+
+    def __init__(self, per_minute, burst_seconds):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.burst_seconds = burst_seconds
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount):
+        self.level -= amount
+        return 0.0 if self.level >= 0 else -self.level / self.rate
+
+    def set_limit(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * self.burst_seconds)
+        self.level = min(self.level, self.capacity)
+
+
+class RateLimiter:
+    """
+    Client-side requests/minute and tokens/minute limiter.
+
+    One limiter is shared by every thread and coroutine of an APIClient.
+    Each request reserves one request and its estimated token cost up front
+    and then waits until both buckets are back in credit, so callers are
+    served in arrival order and never burst above the configured rate.
+
+    Parameters:
+    - requests_per_minute: Request quota (None for no request limit)
+    - tokens_per_minute: Token quota (None for no token limit)
+    - burst_seconds: How many seconds of quota may be spent at once
+
+    Methods:
+    - reserve: Reserve quota and return how long the caller must wait
+    - acquire: Reserve quota and block until it is available
+    - async_acquire: Reserve quota and await until it is available
+    - pause: Hold all callers for a number of seconds
+    - penalize: Drain the buckets after an unexpected rate-limit error
+    - update_from_headers: Adjust to Retry-After and rate-limit headers
+    """
+
+    def __init__(
+        self, requests_per_minute=None, tokens_per_minute=None, burst_seconds=6
+    ):
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+        self.requests = (
+            _Bucket(requests_per_minute, burst_seconds) if requests_per_minute else None
+        )
+        self.tokens = (
+            _Bucket(tokens_per_minute, burst_seconds) if tokens_per_minute else None
+        )
+
+    def _buckets(self):
+        return [b for b in (self.requests, self.tokens) if b is not None]
+
+    def reserve(self, tokens=0):
+        """
+        Reserve one request and `tokens` tokens.
+
+        Parameters:
+        - tokens: Estimated token cost of the request
+
+        Returns:
+        - wait: Seconds the caller must wait before sending
+        """
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self._paused_until - now)
+            for bucket in self._buckets():
+                bucket.refill(now)
+            if self.requests is not None:
+                wait = max(wait, self.requests.reserve(1))
+            if self.tokens is not None:
+                wait = max(wait, self.tokens.reserve(tokens))
+            return wait
+
+    def acquire(self, tokens=0):
+        """
+        Block until the request may be sent.
+
+        Parameters:
+        - tokens: Estimated token cost of the request
+        """
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def async_acquire(self, tokens=0):
+        """
+        Await until the request may be sent.
+
+        Parameters:
+        - tokens: Estimated token cost of the request
+        """
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds):
+        """
+        Hold all callers for `seconds` (e.g. after a Retry-After header).
+
+        Parameters:
+        - seconds: Pause length in seconds
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def penalize(self):
+        """Drain both buckets so callers wait for a full refill."""
+        with self._lock:
+            now = time.monotonic()
+            for bucket in self._buckets():
+                bucket.refill(now)
+                bucket.level = min(bucket.level, 0.0)
+
+    def update_from_headers(self, headers):
+        """
+        Adjust to the provider's Retry-After and rate-limit headers.
+
+        Parameters:
+        - headers: Mapping of response headers (OpenAI/Azure or Anthropic style)
+        """
+        if not headers:
+            return
+        retry_after = parse_retry_after(headers)
+        if retry_after:
+            self.pause(retry_after)
+
+        with self._lock:
+            now = time.monotonic()
+            for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+                if bucket is None:
+                    continue
+                limit = _parse_number(
+                    _header(
+                        headers,
+                        f"x-ratelimit-limit-{kind}",
+                        f"anthropic-ratelimit-{kind}-limit",
+                    )
+                )
+                if limit and limit / 60.0 < bucket.rate:
+                    bucket.set_limit(limit)
+                remaining = _parse_number(
+                    _header(
+                        headers,
+                        f"x-ratelimit-remaining-{kind}",
+                        f"anthropic-ratelimit-{kind}-remaining",
+                    )
+                )
+                if remaining is None:
+                    continue
+                # remaining counts against the provider's per-minute limit, so
+                # only its share of that limit carries over to the bucket
+                if limit:
+                    bucket.refill(now)
+                    bucket.level = min(
+                        bucket.level, bucket.capacity * remaining / limit
+                    )
+                if remaining <= 0:
+                    reset = parse_reset(
+                        _header(
+                            headers,
+                            f"x-ratelimit-reset-{kind}",
+                            f"anthropic-ratelimit-{kind}-reset",
+                        )
+                    )
+                    if reset:
+                        self._paused_until = max(self._paused_until, now + reset)
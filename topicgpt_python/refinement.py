@@ -1,24 +1,302 @@
 import pandas as pd
-import torch
+import numpy as np
+import heapq
 import os
 import regex
 import traceback
 import argparse
 from topicgpt_python.utils import *
+from topicgpt_python.embeddings import get_embedding_service
 from anytree import RenderTree
 
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
 
-def _maybe_get_sbert():
-    try:
-        if "TRANSFORMERS_NO_TORCHVISION" not in os.environ:
-            os.environ["TRANSFORMERS_NO_TORCHVISION"] = "1"
-        from sentence_transformers import SentenceTransformer, util as st_util
+class TopicPairSelector:
+    """
+    Candidate topic pairs for refinement, most similar first.
+
+    Topic embeddings are computed once. Pairs above the threshold are taken
+    from the upper triangle of the similarity matrix one row block at a time
+    and kept as sorted NumPy arrays, so no n x n matrix or per-pair objects
+    are built. Prompted pairs are tracked in a set, and sync() follows the
+    tree as topics merge: merged-away topics stop being proposed and new
+    topics are scored against the live ones only.
+
+    Without sentence-transformers every pair scores 1.0, in list order.
+
+    Parameters:
+    - topic_sent: List of topic sentences
+    - threshold: Minimum cosine similarity (exclusive) for a candidate pair
+    - block_size: Rows of the similarity matrix computed at once
+    - max_pairs_per_topic: Optional cap on candidates kept per topic (None
+      keeps every pair above the threshold)
+
+    Attributes:
+    - prompted: Set of sorted (topic, topic) pairs already selected
+
+    Methods:
+    - select: Return the next most similar unprompted pairs
+    - select_groups: Return several groups of pairs with no topic in common
+    - clusters: Group live topics into connected components of near-duplicates
+    - sync: Update the live topics to match a new topic list
+    """
 
-        return SentenceTransformer("all-MiniLM-L6-v2"), st_util
-    except Exception:
-        return None, None
+    def __init__(
+        self, topic_sent, threshold=0.5, block_size=1024, max_pairs_per_topic=None
+    ):
+        self.threshold = threshold
+        self.block_size = block_size
+        self.max_pairs_per_topic = max_pairs_per_topic
+        self.embedder = get_embedding_service()
+        self.ranked = self.embedder.available
+        self.topics = list(dict.fromkeys(topic_sent))
+        self.index = {topic: i for i, topic in enumerate(self.topics)}
+        self.alive = [True] * len(self.topics)
+        self.prompted = set()
+        self.matrix = (
+            self.embedder.encode_many(self.topics)
+            if self.ranked and self.topics
+            else None
+        )
+        self._base = self._base_pairs()
+        self._head = next(self._base, None)
+        self._added = []
+
+    def _top_pairs(self, sims, rows, valid, threshold=None):
+        """(score, i, j) arrays for entries of sims above the threshold."""
+        threshold = self.threshold if threshold is None else threshold
+        keep = valid & (sims > threshold)
+        if self.max_pairs_per_topic and sims.shape[1] > self.max_pairs_per_topic:
+            k = self.max_pairs_per_topic
+            top = np.argpartition(np.where(keep, -sims, np.inf), k - 1, axis=1)[:, :k]
+            capped = np.zeros_like(keep)
+            np.put_along_axis(capped, top, True, axis=1)
+            keep &= capped
+        r, c = np.nonzero(keep)
+        return sims[r, c], rows[r], c
+
+    def _base_pairs(self):
+        """Yield (score, i, j) for the initial topics in selection order."""
+        n = len(self.topics)
+        if self.matrix is None:
+            if self.threshold < 1.0:
+                for i in range(n):
+                    for j in range(i + 1, n):
+                        yield 1.0, i, j
+            return
+        scores, first, second = [], [], []
+        cols = np.arange(n)
+        for start in range(0, n, self.block_size):
+            rows = cols[start : start + self.block_size]
+            sims = self.matrix[rows] @ self.matrix.T
+            s, i, j = self._top_pairs(sims, rows, cols[None, :] > rows[:, None])
+            scores.append(s)
+            first.append(i)
+            second.append(j)
+        scores = np.concatenate(scores) if scores else np.zeros(0)
+        first = np.concatenate(first) if first else np.zeros(0, dtype=int)
+        second = np.concatenate(second) if second else np.zeros(0, dtype=int)
+        # Highest score first; ties in (i, j) order
+        order = np.lexsort((second, first, -scores))
+        for start in range(0, len(order), 4096):
+            chunk = order[start : start + 4096]
+            yield from zip(
+                scores[chunk].tolist(), first[chunk].tolist(), second[chunk].tolist()
+            )
+
+    def _pop(self):
+        """Next candidate across the initial pairs and pairs added by sync()."""
+        if self._added and (
+            self._head is None
+            or self._added[0] < (-self._head[0], self._head[1], self._head[2])
+        ):
+            score, i, j = heapq.heappop(self._added)
+            return -score, i, j
+        head, self._head = self._head, next(self._base, None)
+        return head
+
+    def select(self, num_pair=2):
+        """
+        Return the next most similar pairs that have not been prompted yet.
+
+        Parameters:
+        - num_pair: Number of pairs to return
+
+        Returns:
+        - list: List of [topic, topic] pairs (also added to prompted)
+        """
+        selected = []
+        while len(selected) < num_pair:
+            candidate = self._pop()
+            if candidate is None:
+                break
+            _, i, j = candidate
+            if not (self.alive[i] and self.alive[j]):
+                continue
+            pair = [self.topics[i], self.topics[j]]
+            key = tuple(sorted(pair))
+            if key in self.prompted:
+                continue
+            self.prompted.add(key)
+            selected.append(pair)
+        return selected
+
+    def select_groups(self, num_groups, num_pair=2):
+        """
+        Return up to num_groups groups of num_pair pairs such that no topic
+        appears in two groups, so the groups can be merged concurrently.
+
+        Pairs skipped because they touch a topic already in an earlier group
+        stay candidates, in their original order, for the next call. With
+        num_groups=1 this is select(num_pair).
+
+        Parameters:
+        - num_groups: Maximum number of groups
+        - num_pair: Number of pairs per group
+
+        Returns:
+        - list: List of groups, each a list of [topic, topic] pairs
+        """
+        groups, group, used, group_topics, deferred = [], [], set(), set(), []
+        while len(groups) < num_groups:
+            candidate = self._pop()
+            if candidate is None:
+                break
+            score, i, j = candidate
+            if not (self.alive[i] and self.alive[j]):
+                continue
+            pair = [self.topics[i], self.topics[j]]
+            key = tuple(sorted(pair))
+            if key in self.prompted:
+                continue
+            if i in used or j in used:
+                deferred.append((-score, i, j))
+                continue
+            self.prompted.add(key)
+            group.append(pair)
+            group_topics.update((i, j))
+            if len(group) == num_pair:
+                groups.append(group)
+                used |= group_topics
+                group, group_topics = [], set()
+        if group:
+            groups.append(group)
+        for candidate in deferred:
+            heapq.heappush(self._added, candidate)
+        return groups
+
+    def clusters(self, threshold=None, max_size=10):
+        """
+        Group the live topics into connected components of the graph whose
+        edges are pairs above the threshold (union-find over the edges in
+        descending similarity).
+
+        Members are ordered by when their strongest edge was joined, so the
+        most similar topics stay together when a large component is split
+        into chunks of max_size.
+
+        Parameters:
+        - threshold: Minimum cosine similarity (exclusive); defaults to the
+          selector's threshold
+        - max_size: Maximum number of topics per returned cluster
+
+        Returns:
+        - list: List of clusters (lists of at least two topic sentences),
+          ordered by their first member
+        """
+        threshold = self.threshold if threshold is None else threshold
+        live = np.array(sorted(self.index.values()), dtype=int)
+        if len(live) < 2:
+            return []
+        if self.matrix is None:
+            if threshold >= 1.0:
+                return []
+            members = [self.topics[i] for i in live]
+            return [
+                members[k : k + max_size]
+                for k in range(0, len(members), max_size)
+                if len(members[k : k + max_size]) > 1
+            ]
+        scores, first, second = [], [], []
+        vectors = self.matrix[live]
+        for start in range(0, len(live), self.block_size):
+            rows = np.arange(start, min(start + self.block_size, len(live)))
+            sims = vectors[rows] @ vectors.T
+            valid = np.arange(len(live))[None, :] > rows[:, None]
+            s, i, j = self._top_pairs(sims, rows, valid, threshold)
+            scores.append(s)
+            first.append(i)
+            second.append(j)
+        scores, first, second = (
+            np.concatenate(scores),
+            np.concatenate(first),
+            np.concatenate(second),
+        )
+        order = np.lexsort((second, first, -scores))
+
+        parent = list(range(len(live)))
+
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        seen = {}
+        for a, b in zip(first[order].tolist(), second[order].tolist()):
+            ra, rb = find(a), find(b)
+            if ra != rb:
+                parent[max(ra, rb)] = min(ra, rb)
+            seen.setdefault(a, None)
+            seen.setdefault(b, None)
+
+        components = {}
+        for member in seen:
+            components.setdefault(find(member), []).append(member)
+        clusters = []
+        for root in sorted(components):
+            members = components[root]
+            for k in range(0, len(members), max_size):
+                chunk = members[k : k + max_size]
+                if len(chunk) > 1:
+                    clusters.append([self.topics[live[m]] for m in chunk])
+        return clusters
+
+    def sync(self, topic_sent):
+        """
+        Update the live topics to match a new topic list.
+
+        Topics no longer in the list are dropped; new topics are embedded
+        and scored against the live topics.
+
+        Parameters:
+        - topic_sent: Current list of topic sentences
+        """
+        current = dict.fromkeys(topic_sent)
+        for topic in [t for t in self.index if t not in current]:
+            self.alive[self.index.pop(topic)] = False
+        new = [t for t in current if t not in self.index]
+        if not new:
+            return
+        live = np.array(sorted(self.index.values()), dtype=int)
+        offset = len(self.topics)
+        rows = np.arange(offset, offset + len(new))
+        self.topics.extend(new)
+        self.alive.extend([True] * len(new))
+        self.index.update({t: int(i) for t, i in zip(new, rows)})
+        cols = np.concatenate([live, rows])
+        if self.matrix is not None:
+            self.matrix = np.vstack([self.matrix, self.embedder.encode_many(new)])
+            sims = self.matrix[rows] @ self.matrix[cols].T
+        else:
+            sims = np.ones((len(rows), len(cols)), dtype=np.float32)
+        s, i, j = self._top_pairs(sims, rows, cols[None, :] != rows[:, None])
+        # Store every pair as (lower index, higher index), once
+        new_rows = set(rows.tolist())
+        for score, a, b in zip(s.tolist(), i.tolist(), cols[j].tolist()):
+            if a < b or b not in new_rows:
+                heapq.heappush(self._added, (-score, min(a, b), max(a, b)))
 
 
 def topic_pairs(topic_sent, all_pairs, threshold=0.5, num_pair=2):
@@ -35,38 +313,10 @@ def topic_pairs(topic_sent, all_pairs, threshold=0.5, num_pair=2):
     - list: List of selected topic pairs.
     - list: List of all pairs prompted so far.
     """
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    model, st_util = _maybe_get_sbert()
-    if model is None:
-        # Fallback: no embedding-based filtering; return first pairs
-        pairs = [
-            {"index": [i, j], "score": 1.0}
-            for i in range(len(topic_sent))
-            for j in range(i + 1, len(topic_sent))
-        ]
-    else:
-        embeddings = model.encode(topic_sent, convert_to_tensor=True)
-        cosine_scores = st_util.cos_sim(embeddings, embeddings).cpu()
-        pairs = [
-            {"index": [i, j], "score": cosine_scores[i][j].item()}
-            for i in range(len(cosine_scores))
-            for j in range(i + 1, len(cosine_scores))
-        ]
-
-    pairs = sorted(pairs, key=lambda x: x["score"], reverse=True)
-    selected_pairs = []
-
-    for pair in pairs:
-        if len(selected_pairs) >= num_pair:
-            break
-        i, j = pair["index"]
-        if (
-            pair["score"] > threshold
-            and sorted([topic_sent[i], topic_sent[j]]) not in all_pairs
-        ):
-            selected_pairs.append([topic_sent[i], topic_sent[j]])
-            all_pairs.append(sorted([topic_sent[i], topic_sent[j]]))
-
+    selector = TopicPairSelector(topic_sent, threshold)
+    selector.prompted.update(tuple(pair) for pair in all_pairs)
+    selected_pairs = selector.select(num_pair)
+    all_pairs.extend(sorted(pair) for pair in selected_pairs)
     return [item for sublist in selected_pairs for item in sublist], all_pairs
 
 
@@ -79,6 +329,10 @@ def merge_topics(
     max_tokens,
     top_p,
     verbose,
+    concurrency=1,
+    strategy="pairs",
+    cluster_threshold=0.5,
+    max_cluster_size=10,
 ):
     """
     Merge similar topics based on a given refinement prompt and API client settings.
@@ -92,25 +346,79 @@ def merge_topics(
     - max_tokens (int): The maximum number of tokens to generate.
     - top_p (float): The nucleus sampling parameter.
     - verbose (bool): If True, prints each replacement made.
+    - concurrency (int): Number of disjoint topic groups prompted at once per round (1 for the sequential loop).
+    - strategy (str): "pairs" to prompt the most similar pairs two at a time, or "clusters" to prompt each cluster of near-duplicate topics once.
+    - cluster_threshold (float): "clusters" only; cosine similarity above which two topics are linked.
+    - max_cluster_size (int): "clusters" only; maximum number of topics per prompt.
 
     Returns:
     - list: List of responses from the API.
     - TopicTree: The updated topic root with merged topics.
     - dict: The updated mapping of original topics to new topics.
     """
-    topic_sent = topics_root.to_topic_list(desc=True, count=False)
-    new_pairs, all_pairs = topic_pairs(
-        topic_sent, all_pairs=[], threshold=0.5, num_pair=2
+    selector = TopicPairSelector(
+        topics_root.to_topic_list(desc=True, count=False), threshold=0.5
     )
+    responses, orig_new = [], mapping
+
+    # Clusters are disjoint, so all of them are prompted in one concurrent
+    # round and the merges applied in cluster order
+    if strategy == "clusters":
+        clusters = selector.clusters(cluster_threshold, max_cluster_size)
+        if not clusters and verbose:
+            print("No topic clusters to be merged.")
+        prompts = [
+            refinement_prompt.format(Topics="\n".join(cluster)) for cluster in clusters
+        ]
+        topics_root = _merge_round(
+            prompts,
+            topics_root,
+            orig_new,
+            responses,
+            api_client,
+            temperature,
+            max_tokens,
+            top_p,
+            concurrency,
+            verbose,
+        )
+        return responses, topics_root, orig_new
+    elif strategy != "pairs":
+        raise ValueError(f"Unknown refinement strategy: {strategy}")
+
+    if concurrency > 1:
+        groups = selector.select_groups(concurrency, 2)
+        new_pairs = [topic for group in groups for pair in group for topic in pair]
+    else:
+        new_pairs = [topic for pair in selector.select(2) for topic in pair]
     if len(new_pairs) <= 1 and verbose:
         print("No topic pairs to be merged.")
 
-    responses, orig_new = [], mapping
-
-    pattern_topic = regex.compile(
-        r"^\[(\d+)\]([\w\s\-',]+)[^:]*:([\w\s,\.\-\/;']+) \(([^)]+)\)$"
-    )
-    pattern_original = regex.compile(r"\[(\d+)\]([\w\s\-',]+),?")
+    # Concurrent mode: each round prompts disjoint groups at once and applies
+    # the merges in group order, so results do not depend on completion order
+    if concurrency > 1:
+        while groups:
+            prompts = [
+                refinement_prompt.format(
+                    Topics="\n".join(topic for pair in group for topic in pair)
+                )
+                for group in groups
+            ]
+            topics_root = _merge_round(
+                prompts,
+                topics_root,
+                orig_new,
+                responses,
+                api_client,
+                temperature,
+                max_tokens,
+                top_p,
+                concurrency,
+                verbose,
+            )
+            selector.sync(topics_root.to_topic_list(desc=True, count=False))
+            groups = selector.select_groups(concurrency, 2)
+        return responses, topics_root, orig_new
 
     while len(new_pairs) > 1:
         refiner_prompt = refinement_prompt.format(Topics="\n".join(new_pairs))
@@ -122,41 +430,94 @@ def merge_topics(
                 refiner_prompt, max_tokens, temperature, top_p
             )
             responses.append(response)
-            merges = response.split("\n")
-
-            for merge in merges:
-                match = pattern_topic.match(merge.strip())
-                if match:
-                    lvl, name, desc, originals = (
-                        int(match.group(1)),
-                        match.group(2).strip(),
-                        match.group(3).strip(),
-                        match.group(4).strip(),
-                    )
-                    orig_topics = [
-                        t[1].strip(", ")
-                        for t in regex.findall(pattern_original, originals)
-                    ]
-                    orig_lvl = [
-                        int(t[0]) for t in regex.findall(pattern_original, originals)
-                    ]
-                    original_topics = [
-                        (orig_topics[i], orig_lvl[i]) for i in range(len(orig_topics))
-                    ]
-                    topics_root = topics_root.update_tree(original_topics, name, desc)
-                    for orig in original_topics:
-                        orig_new[orig[0]] = name
-                    print(f"Updated topic tree with [{lvl}] {name}: {desc}")
+            topics_root = apply_merges(response, topics_root, orig_new)
         except Exception as e:
             print("Error when calling API!")
             traceback.print_exc()
 
-        new_pairs, all_pairs = topic_pairs(
-            topic_sent, all_pairs, threshold=0.5, num_pair=2
-        )
+        selector.sync(topics_root.to_topic_list(desc=True, count=False))
+        new_pairs = [topic for pair in selector.select(2) for topic in pair]
     return responses, topics_root, orig_new
 
 
+def _merge_round(
+    prompts,
+    topics_root,
+    mapping,
+    responses,
+    api_client,
+    temperature,
+    max_tokens,
+    top_p,
+    concurrency,
+    verbose,
+):
+    """
+    Send refinement prompts concurrently and apply the merges in prompt order.
+    Responses are appended to `responses` and `mapping` is updated in place.
+    """
+    if not prompts:
+        return topics_root
+    if verbose:
+        print(f"Prompting model to merge {len(prompts)} topic groups")
+    results = api_client.concurrent_prompt(
+        prompts,
+        max_tokens,
+        temperature,
+        top_p=top_p,
+        concurrency=max(1, concurrency),
+        return_exceptions=True,
+    )
+    for response in results:
+        try:
+            if isinstance(response, Exception):
+                raise response
+            responses.append(response)
+            topics_root = apply_merges(response, topics_root, mapping)
+        except Exception:
+            print("Error when calling API!")
+            traceback.print_exc()
+    return topics_root
+
+
+MERGE_PATTERN = regex.compile(
+    r"^\[(\d+)\]([\w\s\-',]+)[^:]*:([\w\s,\.\-\/;']+) \(([^)]+)\)$"
+)
+ORIGINAL_PATTERN = regex.compile(r"\[(\d+)\]([\w\s\-',]+),?")
+
+
+def apply_merges(response, topics_root, mapping):
+    """
+    Apply the merges in a refinement response to the topic tree.
+
+    Parameters:
+    - response (str): Model response, one "[lvl] Name: desc ([lvl] A, [lvl] B)" line per merge.
+    - topics_root (TopicTree): The topic tree to update.
+    - mapping (dict): Mapping of original topics to new topics, updated in place.
+
+    Returns:
+    - TopicTree: The updated topic tree.
+    """
+    for merge in response.split("\n"):
+        match = MERGE_PATTERN.match(merge.strip())
+        if match:
+            lvl, name, desc, originals = (
+                int(match.group(1)),
+                match.group(2).strip(),
+                match.group(3).strip(),
+                match.group(4).strip(),
+            )
+            original_topics = [
+                (t[1].strip(", "), int(t[0]))
+                for t in regex.findall(ORIGINAL_PATTERN, originals)
+            ]
+            topics_root = topics_root.update_tree(original_topics, name, desc)
+            for orig in original_topics:
+                mapping[orig[0]] = name
+            print(f"Updated topic tree with [{lvl}] {name}: {desc}")
+    return topics_root
+
+
 def remove_topics(topics_root, verbose, threshold=0.01):
     """
     Remove low-frequency topics from topic tree.
@@ -211,15 +572,8 @@ def update_generation_file(
     response_column = (
         "refined_responses" if "refined_responses" in df.columns else "responses"
     )
-    responses = df[response_column].tolist()
-    updated_responses = []
-    for response in responses:
-        updated_response = "\n".join(
-            [replace_topic_key(s, mapping, verbose) for s in response.split("\n")]
-        )
-        updated_responses.append(updated_response)
-
-    df["refined_responses"] = updated_responses
+    remapper = TopicRemapper(mapping, verbose)
+    df["refined_responses"] = remapper.apply(df[response_column])
     df.to_json(updated_file, lines=True, orient="records")
 
     if mapping_file:
@@ -227,6 +581,81 @@ def update_generation_file(
             json.dump(mapping, f, indent=4)
 
 
+class TopicRemapper:
+    """
+    Rewrite topic labels in responses according to a refinement mapping.
+
+    Chains in the mapping are resolved up front (A -> B, B -> C rewrites A
+    to C; cycles stop at the last new name), and each response is rewritten
+    in one regex pass that only matches the label right after a "[lvl]"
+    marker, looked up in a dict. Text elsewhere on the line, and labels that
+    merely contain a mapped name, are left alone.
+
+    Parameters:
+    - mapping (dict): Dictionary mapping original topics to new topics.
+    - verbose (bool): If True, prints each replacement made.
+
+    Methods:
+    - sub: Rewrite one response
+    - apply: Rewrite a column (or any iterable) of responses
+    """
+
+    LABEL = regex.compile(
+        r"(?m)^([ \t]*(?:[-*][ \t]*)?\[\d+\][ \t]*)([^:\n(\[\]]+?)(?=[ \t]*(?:[:(]|$))"
+    )
+
+    def __init__(self, mapping, verbose=False):
+        self.verbose = verbose
+        self.mapping = {}
+        for key in mapping:
+            target, seen = key, {key}
+            while target in mapping and mapping[target] not in seen:
+                target = mapping[target]
+                seen.add(target)
+            if target != key:
+                self.mapping[key] = target
+        self.folded = {}
+        for key, value in self.mapping.items():
+            self.folded.setdefault(key.casefold(), value)
+
+    def _replace(self, match):
+        name = match.group(2)
+        new = self.mapping.get(name) or self.folded.get(name.casefold())
+        if new is None:
+            return match.group(0)
+        if self.verbose:
+            print(f"Replaced '{name}' with '{new}' in text.")
+        return match.group(1) + new
+
+    def sub(self, text):
+        """
+        Rewrite the topic labels in one response.
+
+        Parameters:
+        - text (str): Response text (one topic per line).
+
+        Returns:
+        - str: The text with topics replaced according to the mapping.
+        """
+        if not self.mapping or not isinstance(text, str):
+            return text
+        return self.LABEL.sub(self._replace, text)
+
+    def apply(self, responses):
+        """
+        Rewrite a column of responses.
+
+        Parameters:
+        - responses (pd.Series or iterable): Response texts.
+
+        Returns:
+        - pd.Series or list: Rewritten responses, same type and order.
+        """
+        if isinstance(responses, pd.Series):
+            return responses.map(self.sub)
+        return [self.sub(text) for text in responses]
+
+
 def replace_topic_key(text, mapping, verbose=False):
     """
     Replace all occurrences of topic keys in the text based on the provided mapping.
@@ -239,12 +668,7 @@ def replace_topic_key(text, mapping, verbose=False):
     Returns:
     - str: The text with topics replaced according to the mapping.
     """
-    for key, value in mapping.items():
-        if key != value and key in text:
-            text = text.replace(key, value)
-            if verbose:
-                print(f"Replaced '{key}' with '{value}' in text.")
-    return text
+    return TopicRemapper(mapping, verbose).sub(text)
 
 
 def refine_topics(
@@ -260,6 +684,12 @@ def refine_topics(
     mapping_file,
     base_url=None,
     api_key=None,
+    api_client=None,
+    summary_file=None,
+    concurrency=1,
+    strategy="pairs",
+    cluster_threshold=0.5,
+    max_cluster_size=10,
 ):
     """
     Main function to refine topics by merging and updating based on API response.
@@ -275,11 +705,20 @@ def refine_topics(
     - verbose (bool): If True, prints each replacement made.
     - remove (bool): If True, removes low-frequency topics.
     - mapping_file (str): Path to save the mapping as a JSON file.
+    - api_client (APIClient): Existing client to reuse (e.g. shared across stages); api/model/base_url/api_key are ignored when given.
+    - summary_file (str): Optional JSON file for the run summary (requests, tokens, latency percentiles, retries, cache hits).
+    - concurrency (int): Number of disjoint topic groups merged concurrently per round (1 for sequential merging).
+    - strategy (str): "pairs" (the most similar pairs, two per prompt) or "clusters" (one prompt per cluster of near-duplicate topics; far fewer calls).
+    - cluster_threshold (float): "clusters" only; cosine similarity above which two topics are linked.
+    - max_cluster_size (int): "clusters" only; maximum number of topics per prompt.
 
     Returns:
     - None
     """
-    api_client = APIClient(api=api, model=model, base_url=base_url, api_key=api_key)
+    if api_client is None:
+        api_client = APIClient(api=api, model=model, base_url=base_url, api_key=api_key)
+    api, model = api_client.api, api_client.model
+    api_client.stage = "refinement"
     max_tokens, temperature, top_p = 1000, 0.0, 1.0
     topics_root = TopicTree().from_topic_list(topic_file, from_file=True)
     if verbose:
@@ -306,6 +745,10 @@ def refine_topics(
         max_tokens,
         top_p,
         verbose,
+        concurrency,
+        strategy,
+        cluster_threshold,
+        max_cluster_size,
     )
 
     if mapping_org != mapping and verbose:
@@ -320,6 +763,7 @@ def refine_topics(
 
     updated_topics_root.to_file(out_file)
     print(RenderTree(updated_topics_root.root))
+    api_client.stage_summary(summary_file, verbose)
 
 
 if __name__ == "__main__":
@@ -346,6 +790,31 @@ if __name__ == "__main__":
     )
     parser.add_argument("--base_url", type=str, default=None)
     parser.add_argument("--api_key", type=str, default=None)
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="Number of disjoint topic groups merged concurrently",
+    )
+    parser.add_argument(
+        "--strategy",
+        type=str,
+        default="pairs",
+        choices=["pairs", "clusters"],
+        help="Prompt similar topics in pairs or as clusters",
+    )
+    parser.add_argument(
+        "--cluster_threshold",
+        type=float,
+        default=0.5,
+        help="Cosine similarity above which topics are clustered (clusters only)",
+    )
+    parser.add_argument(
+        "--max_cluster_size",
+        type=int,
+        default=10,
+        help="Maximum number of topics per cluster prompt (clusters only)",
+    )
 
     args = parser.parse_args()
     refine_topics(
@@ -361,4 +830,8 @@ if __name__ == "__main__":
         args.mapping_file,
         args.base_url,
         args.api_key,
+        concurrency=args.concurrency,
+        strategy=args.strategy,
+        cluster_threshold=args.cluster_threshold,
+        max_cluster_size=args.max_cluster_size,
     )
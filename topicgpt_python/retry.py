@@ -0,0 +1,178 @@
+import random
+import threading
+
+from topicgpt_python.rate_limit import error_status
+
+# Status codes worth retrying: timeouts, conflicts, rate limits, server errors
+RETRYABLE_STATUS = {408, 409, 425, 429}
+# Status codes that will fail the same way again: bad request (including
+# context-length overflow), auth, permissions, unknown model, payload size
+FATAL_STATUS = {400, 401, 403, 404, 413, 422}
+
+# SDK exception class names, matched by name so no SDK has to be imported
+RETRYABLE_ERRORS = {
+    "APITimeoutError",
+    "APIConnectionError",
+    "RateLimitError",
+    "InternalServerError",
+    "ServiceUnavailable",
+    "DeadlineExceeded",
+    "ResourceExhausted",
+    "TooManyRequests",
+    "GatewayTimeout",
+    "BadGateway",
+    "TimeoutError",
+    "ConnectionError",
+}
+FATAL_ERRORS = {
+    "AuthenticationError",
+    "PermissionDeniedError",
+    "BadRequestError",
+    "NotFoundError",
+    "UnprocessableEntityError",
+    "InvalidArgument",
+    "PermissionDenied",
+    "Unauthenticated",
+}
+CONTEXT_OVERFLOW_MARKERS = (
+    "context_length_exceeded",
+    "maximum context length",
+    "prompt is too long",
+    "input is too long",
+)
+
+
+class RetryPolicy:
+    """
+    Retry policy for API requests.
+
+    Parameters:
+    - max_attempts: Maximum number of attempts per request
+    - base_delay: Backoff delay (seconds) after the first failure
+    - max_delay: Upper bound on a single backoff delay (seconds)
+    - jitter: Draw each delay uniformly from [0, backoff] ("full jitter")
+    - timeout: Per-attempt timeout in seconds (None for the SDK default)
+    - deadline: Total time budget across all attempts in seconds (None for
+      no limit)
+
+    Methods:
+    - is_retryable: Classify an exception as retryable or fatal
+    - backoff: Delay before the next attempt
+    - within_deadline: Whether another attempt fits into the deadline
+    """
+
+    def __init__(
+        self,
+        max_attempts=3,
+        base_delay=1.0,
+        max_delay=60.0,
+        jitter=True,
+        timeout=120.0,
+        deadline=None,
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.timeout = timeout
+        self.deadline = deadline
+
+    @staticmethod
+    def is_retryable(error):
+        """
+        Classify an exception as retryable or fatal.
+
+        Parameters:
+        - error: Exception raised by an attempt
+
+        Returns:
+        - bool: True for rate limits, server errors, timeouts and dropped
+          connections; False for auth, invalid-request and context-length
+          errors. Unrecognized errors are retried.
+        """
+        message = str(error).lower()
+        if any(marker in message for marker in CONTEXT_OVERFLOW_MARKERS):
+            return False
+
+        status = error_status(error)
+        if status is not None:
+            if status in RETRYABLE_STATUS or status >= 500:
+                return True
+            if status in FATAL_STATUS:
+                return False
+
+        names = {cls.__name__ for cls in type(error).__mro__}
+        if names & FATAL_ERRORS:
+            return False
+        if names & RETRYABLE_ERRORS:
+            return True
+        # Unrecognized errors keep the historical behaviour of being retried
+        return True
+
+    def backoff(self, attempt, retry_after=None):
+        """
+        Delay before the next attempt.
+
+        Parameters:
+        - attempt: Zero-based index of the attempt that just failed
+        - retry_after: Server-provided Retry-After in seconds, if any (capped
+          at max_delay)
+
+        Returns:
+        - delay: Seconds to wait
+        """
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        delay = min(self.max_delay, self.base_delay * (2**attempt))
+        return random.uniform(0, delay) if self.jitter else delay
+
+    def within_deadline(self, elapsed, delay):
+        """
+        Whether another attempt fits into the deadline.
+
+        Parameters:
+        - elapsed: Seconds spent on this request so far
+        - delay: Planned wait before the next attempt
+
+        Returns:
+        - bool
+        """
+        return self.deadline is None or elapsed + delay < self.deadline
+
+
+def call_with_timeout(fn, timeout, *args, **kwargs):
+    """
+    Call fn(*args, **kwargs), giving up after `timeout` seconds.
+
+    For SDK calls without a timeout option (e.g. Gemini on Vertex AI). The
+    call runs in a daemon thread; on timeout it is abandoned, not cancelled.
+
+    Parameters:
+    - fn: Callable to run
+    - timeout: Seconds to wait (None to call fn directly)
+
+    Returns:
+    - result: fn's return value (fn's exception is re-raised)
+
+    Raises:
+    - TimeoutError: fn did not return within `timeout` seconds
+    """
+    if timeout is None:
+        return fn(*args, **kwargs)
+    outcome = {}
+    done = threading.Event()
+
+    def target():
+        try:
+            outcome["result"] = fn(*args, **kwargs)
+        except BaseException as e:
+            outcome["error"] = e
+        finally:
+            done.set()
+
+    threading.Thread(target=target, daemon=True).start()
+    if not done.wait(timeout):
+        raise TimeoutError(f"Request timed out after {timeout} seconds.")
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["result"]
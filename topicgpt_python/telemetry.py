@@ -0,0 +1,354 @@
+import json
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+
+# Log-spaced latency buckets: 1ms growing by 20% per bucket up to ~30 min,
+# so percentiles are accurate to within one bucket (20%).
+LATENCY_BUCKETS = [0.001 * 1.2**i for i in range(80)]
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram with percentile estimates.
+
+    Methods:
+    - observe: Add a latency in seconds
+    - merge: Add the counts of another histogram
+    - percentile: Estimate a latency percentile
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, q):
+        """
+        Estimate a latency percentile.
+
+        Parameters:
+        - q: Quantile in [0, 1]
+
+        Returns:
+        - seconds: Upper bound of the bucket holding the quantile (0.0 if empty)
+        """
+        if self.count == 0:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                bound = LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else self.max
+                return min(bound, self.max)
+        return self.max
+
+
+class _Aggregate:
+    """Running totals for one (backend, model, stage) combination."""
+
+    fields = (
+        "requests",
+        "errors",
+        "cache_hits",
+        "deduplicated",
+        "attempts",
+        "retries",
+        "prompt_tokens",
+        "completion_tokens",
+        "cost",
+    )
+
+    def __init__(self):
+        for field in self.fields:
+            setattr(self, field, 0)
+        self.latency = LatencyHistogram()
+        self.first = None
+        self.last = None
+
+    def add(self, record):
+        self.requests += record["requests"]
+        self.errors += record["error"] is not None
+        self.cache_hits += record["cache_hit"]
+        self.deduplicated += record["deduplicated"]
+        self.attempts += record["attempts"]
+        self.retries += max(0, record["attempts"] - 1)
+        self.prompt_tokens += record["prompt_tokens"]
+        self.completion_tokens += record["completion_tokens"]
+        self.cost += record["cost"] or 0.0
+        self.latency.observe(record["latency"])
+        start = record["time"] - record["latency"]
+        self.first = start if self.first is None else min(self.first, start)
+        self.last = (
+            record["time"] if self.last is None else max(self.last, record["time"])
+        )
+
+    def merge(self, other):
+        for field in self.fields:
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+        self.latency.merge(other.latency)
+        for bound, pick in (("first", min), ("last", max)):
+            values = [
+                v
+                for v in (getattr(self, bound), getattr(other, bound))
+                if v is not None
+            ]
+            setattr(self, bound, pick(values) if values else None)
+
+
+def _label_value(value):
+    return (
+        str("" if value is None else value)
+        .replace("\\", "\\\\")
+        .replace('"', '\\"')
+        .replace("\n", "\\n")
+    )
+
+
+class Telemetry:
+    """
+    In-process aggregator for per-call API metrics.
+
+    APIClient records one entry per request (or per vLLM generate call) with
+    token usage, wall latency, attempts, cache and dedupe hits, backend and
+    pipeline stage.
+
+    Parameters:
+    - path: Optional JSONL file every record is appended to as it arrives
+    - max_records: Number of recent records kept in memory for to_jsonl
+    - prices: Optional {model: (input_usd_per_1M, output_usd_per_1M)} used to
+      compute per-call cost
+
+    Methods:
+    - record: Record one call
+    - summary: Aggregate totals and latency percentiles, optionally per stage
+    - to_jsonl: Write the in-memory records to a JSONL file
+    - to_prometheus: Render aggregates in the Prometheus text format
+    - write_summary: Write summary() to a JSON file
+    - reset: Drop all records and aggregates
+    """
+
+    def __init__(self, path=None, max_records=100000, prices=None):
+        self.path = path
+        self.prices = prices or {}
+        self.records = deque(maxlen=max_records)
+        self._aggregates = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        backend,
+        model,
+        stage=None,
+        prompt_tokens=0,
+        completion_tokens=0,
+        latency=0.0,
+        attempts=0,
+        cache_hit=False,
+        deduplicated=False,
+        error=None,
+        requests=1,
+    ):
+        """
+        Record one call.
+
+        Parameters:
+        - backend: API type
+        - model: Model name
+        - stage: Pipeline stage (e.g. "assignment")
+        - prompt_tokens: Prompt tokens billed by the provider
+        - completion_tokens: Completion tokens billed by the provider
+        - latency: Wall time in seconds, including retries
+        - attempts: Number of upstream attempts (0 for cache/dedupe hits)
+        - cache_hit: Served from the response cache
+        - deduplicated: Served by an identical request
+        - error: Error message if the call failed
+        - requests: Number of prompts covered (vLLM batches)
+        """
+        price = self.prices.get(model)
+        cost = (
+            (prompt_tokens * price[0] + completion_tokens * price[1]) / 1000000
+            if price
+            else None
+        )
+        record = {
+            "time": time.time(),
+            "backend": backend,
+            "model": model,
+            "stage": stage,
+            "requests": requests,
+            "prompt_tokens": prompt_tokens or 0,
+            "completion_tokens": completion_tokens or 0,
+            "latency": latency,
+            "attempts": attempts,
+            "cache_hit": cache_hit,
+            "deduplicated": deduplicated,
+            "error": error,
+            "cost": cost,
+        }
+        with self._lock:
+            self.records.append(record)
+            key = (backend, model, stage)
+            if key not in self._aggregates:
+                self._aggregates[key] = _Aggregate()
+            self._aggregates[key].add(record)
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def summary(self, stage=None):
+        """
+        Aggregate totals and latency percentiles.
+
+        Parameters:
+        - stage: Only include calls from this stage (None for all)
+
+        Returns:
+        - dict: requests, errors, cache_hits, deduplicated, attempts, retries,
+          prompt_tokens, completion_tokens, cost_usd, wall_seconds,
+          requests_per_second, latency percentiles, and a per-backend breakdown
+        """
+        with self._lock:
+            groups = [
+                (key, agg)
+                for key, agg in self._aggregates.items()
+                if stage is None or key[2] == stage
+            ]
+            total = _Aggregate()
+            for _, agg in groups:
+                total.merge(agg)
+            result = self._describe(total)
+            result["stage"] = stage
+            result["by_backend"] = [
+                dict(backend=key[0], model=key[1], stage=key[2], **self._describe(agg))
+                for key, agg in groups
+            ]
+        return result
+
+    @staticmethod
+    def _describe(agg):
+        wall = (agg.last - agg.first) if agg.first is not None else 0.0
+        return {
+            "requests": agg.requests,
+            "errors": agg.errors,
+            "cache_hits": agg.cache_hits,
+            "deduplicated": agg.deduplicated,
+            "attempts": agg.attempts,
+            "retries": agg.retries,
+            "prompt_tokens": agg.prompt_tokens,
+            "completion_tokens": agg.completion_tokens,
+            "cost_usd": round(agg.cost, 6),
+            "wall_seconds": round(wall, 3),
+            "requests_per_second": round(agg.requests / wall, 3) if wall else None,
+            "latency": {
+                "mean": (
+                    agg.latency.total / agg.latency.count if agg.latency.count else 0.0
+                ),
+                "max": agg.latency.max,
+                **{f"p{int(q * 100)}": agg.latency.percentile(q) for q in QUANTILES},
+            },
+        }
+
+    def to_jsonl(self, path):
+        """
+        Write the in-memory records to a JSONL file.
+
+        Parameters:
+        - path: Output file
+        """
+        with self._lock:
+            records = list(self.records)
+        with open(path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def to_prometheus(self, prefix="topicgpt"):
+        """
+        Render aggregates in the Prometheus text exposition format.
+
+        Parameters:
+        - prefix: Metric name prefix
+
+        Returns:
+        - text: Counters per backend/model/stage and a latency summary
+        """
+        counters = [
+            ("requests", "requests", "API requests"),
+            ("errors", "errors", "Failed API requests"),
+            ("cache_hits", "cache_hits", "Responses served from the cache"),
+            ("deduplicated", "deduplicated", "Responses shared with a duplicate"),
+            ("attempts", "attempts", "Upstream attempts including retries"),
+            ("retries", "retries", "Retried attempts"),
+            ("prompt_tokens", "prompt_tokens", "Prompt tokens"),
+            ("completion_tokens", "completion_tokens", "Completion tokens"),
+            ("cost", "cost_usd", "Estimated cost in USD"),
+        ]
+        with self._lock:
+            items = sorted(
+                self._aggregates.items(), key=lambda kv: tuple(map(str, kv[0]))
+            )
+            labels = {
+                key: (
+                    f'backend="{_label_value(key[0])}",'
+                    f'model="{_label_value(key[1])}",'
+                    f'stage="{_label_value(key[2])}"'
+                )
+                for key, _ in items
+            }
+            lines = []
+            for field, name, help_text in counters:
+                metric = f"{prefix}_{name}_total"
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} counter")
+                for key, agg in items:
+                    lines.append(f"{metric}{{{labels[key]}}} {getattr(agg, field)}")
+
+            metric = f"{prefix}_request_latency_seconds"
+            lines.append(f"# HELP {metric} Request wall latency including retries")
+            lines.append(f"# TYPE {metric} summary")
+            for key, agg in items:
+                for q in QUANTILES:
+                    lines.append(
+                        f'{metric}{{{labels[key]},quantile="{q}"}} '
+                        f"{agg.latency.percentile(q)}"
+                    )
+                lines.append(f"{metric}_sum{{{labels[key]}}} {agg.latency.total}")
+                lines.append(f"{metric}_count{{{labels[key]}}} {agg.latency.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_summary(self, path, stage=None):
+        """
+        Write summary() to a JSON file.
+
+        Parameters:
+        - path: Output file
+        - stage: Only include calls from this stage (None for all)
+
+        Returns:
+        - summary: The summary dict
+        """
+        summary = self.summary(stage)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        return summary
+
+    def reset(self):
+        """Drop all records and aggregates."""
+        with self._lock:
+            self.records.clear()
+            self._aggregates.clear()
@@ -1,13 +1,34 @@
 import os
+import asyncio
+import gc
+import hashlib
 import regex
 import json
 import time
+import weakref
 import pandas as pd
 from anytree import Node
 import traceback
 import subprocess
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import islice
 
 import tiktoken
+from tqdm import tqdm
+
+from topicgpt_python.cache import ResponseCache
+from topicgpt_python.retry import RetryPolicy, call_with_timeout
+from topicgpt_python.telemetry import Telemetry
+from topicgpt_python.rate_limit import (
+    RateLimiter,
+    error_headers,
+    error_status,
+    parse_retry_after,
+)
 
 # Avoid unnecessary torchvision import via transformers when not needed
 if "TRANSFORMERS_NO_TORCHVISION" not in os.environ:
@@ -18,80 +39,461 @@ from sklearn import metrics
 import numpy as np
 
 
+@lru_cache(maxsize=None)
+def _get_encoding(model):
+    """
+    Resolve the tiktoken encoding for a model once per process.
+
+    Parameters:
+    - model: Model name
+
+    Returns:
+    - enc: tiktoken Encoding (o200k_base if the model is unknown)
+    """
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        print("Warning: model not found. Using o200k_base encoding.")
+        return tiktoken.get_encoding("o200k_base")
+
+
+def _close_event_loop(loop, thread, clients):
+    """
+    Close the async SDK client bound to an APIClient's event loop, then stop
+    the loop and its thread. Runs from APIClient.close or when the client is
+    garbage collected.
+    """
+
+    async def _aclose():
+        client = clients.pop(loop, None)
+        close = getattr(client, "close", None)
+        if close is not None and asyncio.iscoroutinefunction(close):
+            await close()
+
+    if loop.is_running():
+        try:
+            asyncio.run_coroutine_threadsafe(_aclose(), loop).result(timeout=10)
+        except Exception:
+            traceback.print_exc()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=10)
+    if not loop.is_running():
+        loop.close()
+
+
+# Marks an exhausted prompt iterator in async_batch_prompt
+_EXHAUSTED = object()
+
+# Requests in flight per stage when none is given; other APIs run sequentially
+DEFAULT_CONCURRENCY = {"openai": 8, "openai-compatible": 8}
+
+
+def resolve_concurrency(api_client, concurrency=None):
+    """
+    Number of requests a stage keeps in flight.
+
+    Parameters:
+    - api_client: APIClient object
+    - concurrency: Explicit concurrency, or None for the API's default
+
+    Returns:
+    - concurrency: int (1 for sequential)
+    """
+    if concurrency is None:
+        return DEFAULT_CONCURRENCY.get(api_client.api, 1)
+    return max(1, concurrency)
+
+
+# Keep-alive pool sizing for the HTTP clients behind the OpenAI-style SDKs
+HTTP_POOL_LIMITS = {
+    "max_connections": 256,
+    "max_keepalive_connections": 64,
+    "keepalive_expiry": 120,
+}
+
+_SHARED_CLIENTS = {}
+_SHARED_CLIENTS_LOCK = threading.Lock()
+
+
+def shared_client(key, factory):
+    """
+    Return the process-wide SDK client for `key`, creating it on first use.
+
+    Keys are (api, model, base_url, ...) tuples; the model is only part of the
+    key for backends whose client is bound to one model (Gemini, vLLM).
+
+    Parameters:
+    - key: Hashable registry key
+    - factory: Zero-argument callable building the client
+
+    Returns:
+    - client: Shared client instance
+    """
+    with _SHARED_CLIENTS_LOCK:
+        client = _SHARED_CLIENTS.get(key)
+        if client is None:
+            client = factory()
+            _SHARED_CLIENTS[key] = client
+        return client
+
+
+def clear_shared_clients():
+    """Drop all shared clients (e.g. after changing credentials)."""
+    with _SHARED_CLIENTS_LOCK:
+        _SHARED_CLIENTS.clear()
+
+
+def _http_client(asynchronous=False):
+    """httpx client with a tuned keep-alive pool for the OpenAI SDK."""
+    try:
+        import httpx
+        from openai import DefaultAsyncHttpxClient, DefaultHttpxClient
+    except ImportError:  # older openai SDKs: fall back to the SDK's own pool
+        return None
+
+    limits = httpx.Limits(**HTTP_POOL_LIMITS)
+    if asynchronous:
+        return DefaultAsyncHttpxClient(limits=limits)
+    return DefaultHttpxClient(limits=limits)
+
+
+def _vertex_model(model):
+    """Initialize Vertex AI once and build a Gemini model handle."""
+    # Lazy import inside branch to avoid import-time heavy deps
+    import vertexai
+    from vertexai.generative_models import GenerativeModel
+
+    vertexai.init(
+        project=os.environ["VERTEX_PROJECT"],
+        location=os.environ["VERTEX_LOCATION"],
+    )
+    return GenerativeModel(model)
+
+
+def _gemini_model(model):
+    """Configure the Gemini SDK once and build a model handle."""
+    # Lazy import to avoid global import of google.generativeai
+    import google.generativeai as genai
+
+    genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
+    return genai.GenerativeModel(model)
+
+
+def _vllm(model):
+    """Load a vLLM engine with automatic prefix caching."""
+    from vllm import LLM as VLLM_LLM
+
+    # Stage prompts share the chat template, instructions and topic tree
+    # ahead of the document, so the KV cache for that prefix is reused.
+    return VLLM_LLM(
+        model,
+        download_dir=os.environ.get("HF_HOME", None),
+        enable_prefix_caching=True,
+    )
+
+
+def _usage(response):
+    """
+    Extract (prompt_tokens, completion_tokens) from an SDK response.
+
+    Handles OpenAI-style `usage`, Anthropic `usage` and Gemini
+    `usage_metadata`; missing counts are reported as 0.
+    """
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        prompt = getattr(usage, "prompt_tokens", None)
+        if prompt is None:
+            prompt = getattr(usage, "input_tokens", None)
+        completion = getattr(usage, "completion_tokens", None)
+        if completion is None:
+            completion = getattr(usage, "output_tokens", None)
+        return prompt or 0, completion or 0
+    metadata = getattr(response, "usage_metadata", None)
+    if metadata is not None:
+        return (
+            getattr(metadata, "prompt_token_count", 0) or 0,
+            getattr(metadata, "candidates_token_count", 0) or 0,
+        )
+    return 0, 0
+
+
+class TokenCounter:
+    """
+    Token accounting with a cached encoder and memoized counts.
+
+    Parameters:
+    - model: Model name used to resolve the encoding
+    - cache_size: Maximum number of strings whose counts are memoized (LRU)
+
+    Attributes:
+    - encode_calls: Number of strings actually sent to the tokenizer
+    - hits: Number of counts served from the memo
+
+    Methods:
+    - count: Count tokens in a string
+    - count_many: Count tokens for a list of strings (batch encode on misses)
+    - truncate: Truncate a string to a maximum token count
+    """
+
+    def __init__(self, model, cache_size=8192):
+        self.model = model
+        self.cache_size = cache_size
+        self.encode_calls = 0
+        self.hits = 0
+        self._counts = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def encoder(self):
+        return _get_encoding(self.model)
+
+    def _lookup(self, text):
+        with self._lock:
+            count = self._counts.get(text)
+            if count is not None:
+                self._counts.move_to_end(text)
+                self.hits += 1
+            return count
+
+    def _store(self, text, count):
+        if self.cache_size <= 0:
+            return
+        with self._lock:
+            self._counts[text] = count
+            self._counts.move_to_end(text)
+            while len(self._counts) > self.cache_size:
+                self._counts.popitem(last=False)
+
+    def count(self, text: str) -> int:
+        """
+        Count tokens in a string.
+
+        Parameters:
+        - text: Input text
+
+        Returns:
+        - count: Token count
+        """
+        count = self._lookup(text)
+        if count is None:
+            self.encode_calls += 1
+            count = len(self.encoder.encode(text))
+            self._store(text, count)
+        return count
+
+    def count_many(self, texts: list) -> list:
+        """
+        Count tokens for a list of strings, encoding all misses in one batch.
+
+        Parameters:
+        - texts: List of input texts
+
+        Returns:
+        - counts: List of token counts in input order
+        """
+        counts = [self._lookup(text) for text in texts]
+        misses = list(
+            dict.fromkeys(text for text, c in zip(texts, counts) if c is None)
+        )
+        if misses:
+            self.encode_calls += len(misses)
+            encoded = self.encoder.encode_batch(misses)
+            fresh = {text: len(tokens) for text, tokens in zip(misses, encoded)}
+            for text, count in fresh.items():
+                self._store(text, count)
+            counts = [fresh[t] if c is None else c for t, c in zip(texts, counts)]
+        return counts
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """
+        Truncate a string to at most max_tokens tokens.
+
+        Parameters:
+        - text: Input text
+        - max_tokens: Maximum token count
+
+        Returns:
+        - truncated: Truncated text (unchanged if it already fits)
+        """
+        count = self._lookup(text)
+        if count is not None and count <= max_tokens:
+            return text
+        self.encode_calls += 1
+        tokens = self.encoder.encode(text)
+        self._store(text, len(tokens))
+        if len(tokens) <= max_tokens:
+            return text
+        return self.encoder.decode(tokens[:max_tokens])
+
+
 class APIClient:
     """
     Prompting for OpenAI, VertexAI, and vLLM.
 
     Parameters:
-    - api: API type (e.g., 'openai', 'vertex', 'vllm', 'openai-compatible')
+    - api: API type (e.g., 'openai', 'vertex', 'vllm', 'openai-compatible',
+      or 'mock' for the offline MockLLM)
     - model: Model name
+    - token_cache_size: Number of token counts memoized by the token counter
+    - cache: Optional on-disk response cache (ResponseCache or path to a
+      SQLite file); responses are reused for identical requests
+    - requests_per_minute: Client-side request quota shared by all threads
+      and coroutines (None to disable)
+    - tokens_per_minute: Client-side token quota; each request costs its
+      estimated prompt tokens plus max_tokens (None to disable)
+    - retry_policy: RetryPolicy controlling error classification, backoff,
+      per-request timeouts and deadlines (defaults to RetryPolicy())
+    - dedupe: Coalesce identical requests: concurrent duplicates share one
+      upstream call, and completed temperature-0 responses are reused for
+      the lifetime of the client (sampled requests always get a fresh
+      response once the identical in-flight request has landed)
+    - dedupe_size: Number of completed temperature-0 responses kept for
+      reuse (LRU)
+    - telemetry: Telemetry aggregator receiving one record per call
+      (defaults to a new in-memory Telemetry)
+    - mock_options: Keyword arguments for MockLLM when api is 'mock'
+      (latency distribution, error/429 rates, seed, ...)
+
+    Attributes:
+    - stage: Pipeline stage attached to telemetry records; set by the stage
+      entry points
 
     Methods:
     - estimate_token_count: Estimate token count for a prompt
+    - estimate_token_counts: Estimate token counts for a list of prompts
     - truncating: Truncate document to max tokens
     - iterative_prompt: Prompt API one by one with retries
+    - async_iterative_prompt: Async prompting one by one with retries
+    - async_batch_prompt: Concurrent async prompting bounded by a semaphore
+    - concurrent_prompt: Synchronous wrapper around async_batch_prompt
+    - close: Close the async clients and stop the client's event loop
+    - stage_summary: Summarize telemetry for the current stage
     - batch_prompt: Batch prompting for vLLM API
+    - batch_prompt_iter: Chunked batch prompting for vLLM API, yielding results
+      chunk by chunk
     """
 
-    def __init__(self, api, model, host=None, base_url=None, api_key=None):
+    def __init__(
+        self,
+        api,
+        model,
+        host=None,
+        base_url=None,
+        api_key=None,
+        token_cache_size=8192,
+        cache=None,
+        requests_per_minute=None,
+        tokens_per_minute=None,
+        retry_policy=None,
+        dedupe=True,
+        dedupe_size=65536,
+        telemetry=None,
+        mock_options=None,
+    ):
         self.api = api
         self.model = model
         self.base_url = base_url
         self.api_key = api_key
         self.client = None
+        self.token_counter = TokenCounter(model, cache_size=token_cache_size)
+        self.cache = ResponseCache(cache) if isinstance(cache, str) else cache
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.rate_limiter = (
+            RateLimiter(requests_per_minute, tokens_per_minute)
+            if requests_per_minute or tokens_per_minute
+            else None
+        )
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._async_lock = threading.Lock()
+        self._loop = None
+        self._loop_closer = None
+        self.dedupe = dedupe
+        self.dedupe_size = dedupe_size
+        self._inflight = {}
+        self._completed = OrderedDict()
+        self._flight_lock = threading.Lock()
+        self.telemetry = telemetry if telemetry is not None else Telemetry()
+        self.stage = None
 
         # Setting API key ----
+        # SDK clients come from the process-wide registry, so every APIClient
+        # (and every pipeline stage) for the same endpoint shares one client
+        # and one keep-alive connection pool.
         if api == "openai":
             from openai import OpenAI
 
-            self.client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
-        elif api == "vertex":
-            # Lazy import inside branch to avoid import-time heavy deps
-            import vertexai
-            from vertexai.generative_models import GenerativeModel
-
-            vertexai.init(
-                project=os.environ["VERTEX_PROJECT"],
-                location=os.environ["VERTEX_LOCATION"],
+            self.client = shared_client(
+                (api, None, None),
+                lambda: OpenAI(
+                    api_key=os.environ["OPENAI_API_KEY"],
+                    http_client=_http_client(),
+                ),
             )
-            self.model_obj = GenerativeModel(self.model)
+        elif api == "vertex":
+            if self.model.startswith("claude"):
+                from anthropic import AnthropicVertex
+
+                self.client = shared_client(
+                    (api, "claude", None),
+                    lambda: AnthropicVertex(
+                        region=os.environ["VERTEX_LOCATION"],
+                        project_id=os.environ["VERTEX_PROJECT"],
+                    ),
+                )
+            else:
+                self.model_obj = shared_client(
+                    (api, self.model, None), lambda: _vertex_model(self.model)
+                )
         elif api == "ollama":
-            self.client = OpenAI(
-                base_url="http://localhost:11434/v1",
-                api_key="ollama",  # required, but unused
+            from openai import OpenAI
+
+            self.client = shared_client(
+                (api, None, "http://localhost:11434/v1"),
+                lambda: OpenAI(
+                    base_url="http://localhost:11434/v1",
+                    api_key="ollama",  # required, but unused
+                    http_client=_http_client(),
+                ),
             )
         elif api == "vllm":
             # Lazy import to avoid pulling transformers/torchvision unless needed
-            from vllm import LLM as VLLM_LLM, SamplingParams as VLLM_SamplingParams
+            from vllm import SamplingParams as VLLM_SamplingParams
 
             self.sampling_params_class = VLLM_SamplingParams
             self.hf_token = os.environ.get("HF_TOKEN")
-            self.llm = VLLM_LLM(
-                self.model,
-                download_dir=os.environ.get("HF_HOME", None),
-            )
+            self.llm = shared_client((api, self.model, None), lambda: _vllm(self.model))
             self.tokenizer = self.llm.get_tokenizer()
         elif api == "gemini":
-            # Lazy import to avoid global import of google.generativeai
-            import google.generativeai as genai
-
-            genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
-            self.model_obj = genai.GenerativeModel(self.model)
+            self.model_obj = shared_client(
+                (api, self.model, None), lambda: _gemini_model(self.model)
+            )
         elif api == "azure":
             from openai import AzureOpenAI
 
-            self.client = AzureOpenAI(
-                api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-                api_version="2024-02-01",
-                azure_endpoint=os.environ.get("AZURE_OPENAI_ENDPOINT"),
+            self.client = shared_client(
+                (api, None, os.environ.get("AZURE_OPENAI_ENDPOINT")),
+                lambda: AzureOpenAI(
+                    api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+                    api_version="2024-02-01",
+                    azure_endpoint=os.environ.get("AZURE_OPENAI_ENDPOINT"),
+                    http_client=_http_client(),
+                ),
             )
         elif api == "openai-compatible":
             from openai import OpenAI
 
-            self.client = OpenAI(
-                base_url=base_url,
-                api_key=api_key,
+            self.client = shared_client(
+                (api, None, base_url, api_key),
+                lambda: OpenAI(
+                    base_url=base_url,
+                    api_key=api_key,
+                    http_client=_http_client(),
+                ),
             )
+        elif api == "mock":
+            from topicgpt_python.mock import MockLLM
+
+            self.client = MockLLM(**(mock_options or {}))
         else:
             raise ValueError(
                 f"API {api} not supported. Custom implementation required."
@@ -107,13 +509,19 @@ class APIClient:
         Returns:
         - token_count: Estimated token
         """
-        try:
-            enc = tiktoken.encoding_for_model(self.model)
-        except KeyError:
-            enc = tiktoken.get_encoding("o200k_base")
+        return self.token_counter.count(prompt)
+
+    def estimate_token_counts(self, prompts: list) -> list:
+        """
+        Estimating token counts for several prompts with one batch encode
+
+        Parameters:
+        - prompts: List of prompt texts
 
-        token_count = len(enc.encode(prompt))
-        return token_count
+        Returns:
+        - token_counts: Estimated tokens, in input order
+        """
+        return self.token_counter.count_many(prompts)
 
     def truncating(self, document: str, max_tokens: int) -> str:
         """
@@ -126,16 +534,7 @@ class APIClient:
         Returns:
         - truncated_doc: Truncated document
         """
-        try:
-            enc = tiktoken.encoding_for_model(self.model)
-        except KeyError:
-            print("Warning: model not found. Using o200k_base encoding.")
-            enc = tiktoken.get_encoding("o200k_base")
-
-        tokens = enc.encode(document)
-        if len(tokens) > max_tokens:
-            tokens = tokens[:max_tokens]
-        return enc.decode(tokens)
+        return self.token_counter.truncate(document, max_tokens)
 
     def iterative_prompt(
         self,
@@ -144,8 +543,9 @@ class APIClient:
         temperature: float,
         top_p: float = 1.0,  # default value for top_p in openai
         system_message: str = "You are a helpful assistant.",
-        num_try: int = 3,
+        num_try: int = None,
         verbose: bool = False,
+        return_stats: bool = False,
     ):
         """
         Prompting API one by one with retries
@@ -156,11 +556,267 @@ class APIClient:
         - temperature: Temperature for sampling
         - top_p: Top p value for sampling
         - system_message: System message
-        - num_try: Number of retries
+        - num_try: Number of attempts (defaults to retry_policy.max_attempts)
         - verbose: Verbose mode
+        - return_stats: Also return a dict with attempts, latency (seconds),
+          errors, cache_hit, deduplicated (served by an identical request),
+          and the prompt_tokens/completion_tokens reported by the provider.
+          On failure the same dict is attached to the raised exception as
+          `prompt_stats`.
+
+        Returns:
+        - response: Response text (or (response, stats) if return_stats)
+        """
+        start = time.perf_counter()
+        stats = self._new_stats()
+        key = self._request_key(prompt, max_tokens, temperature, top_p, system_message)
+        flight, leader = self._join_flight(key)
+        try:
+            if not leader:
+                stats["deduplicated"] = True
+                response = flight.result()
+            else:
+                try:
+                    response = self._cache_get(key, stats)
+                    if response is None:
+                        response = self._prompt_with_retries(
+                            prompt,
+                            max_tokens,
+                            temperature,
+                            top_p,
+                            system_message,
+                            num_try,
+                            stats,
+                        )
+                        self._cache_set(key, response)
+                except BaseException as e:
+                    self._land_flight(key, flight, error=e)
+                    raise
+                self._land_flight(key, flight, response, remember=temperature == 0)
+        except Exception as e:
+            stats["latency"] = time.perf_counter() - start
+            e.prompt_stats = stats
+            self._record(stats, error=e)
+            raise
+        stats["latency"] = time.perf_counter() - start
+        self._record(stats)
+        if verbose and stats["attempts"]:
+            print(
+                "Token usage:",
+                stats["prompt_tokens"],
+                "prompt,",
+                stats["completion_tokens"],
+                "completion",
+            )
+        return (response, stats) if return_stats else response
+
+    @staticmethod
+    def _new_stats():
+        return {
+            "attempts": 0,
+            "latency": 0.0,
+            "errors": [],
+            "cache_hit": False,
+            "deduplicated": False,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+        }
+
+    def _record(self, stats, error=None, requests=1):
+        """Report a finished call to the telemetry aggregator."""
+        self.telemetry.record(
+            self.api,
+            self.model,
+            stage=self.stage,
+            prompt_tokens=stats["prompt_tokens"],
+            completion_tokens=stats["completion_tokens"],
+            latency=stats["latency"],
+            attempts=stats["attempts"],
+            cache_hit=stats["cache_hit"],
+            deduplicated=stats["deduplicated"],
+            error=None if error is None else f"{type(error).__name__}: {error}",
+            requests=requests,
+        )
+
+    def _request_key(self, prompt, max_tokens, temperature, top_p, system_message):
+        """Key identifying a request, or None if neither dedupe nor cache is on."""
+        if not self.dedupe and self.cache is None:
+            return None
+        return ResponseCache.make_key(
+            self.api,
+            self.model,
+            system_message,
+            prompt,
+            max_tokens,
+            temperature,
+            top_p,
+        )
+
+    def _join_flight(self, key):
+        """
+        Register a request for in-flight deduplication.
+
+        Returns:
+        - flight: Future carrying the response (None when dedupe is off)
+        - leader: True if the caller must send the request and land the
+          flight; False if it should wait on an identical request (or a
+          completed one) instead
+        """
+        if not self.dedupe or key is None:
+            return None, True
+        with self._flight_lock:
+            if key in self._completed:
+                self._completed.move_to_end(key)
+                flight = Future()
+                flight.set_result(self._completed[key])
+                return flight, False
+            flight = self._inflight.get(key)
+            if flight is not None:
+                return flight, False
+            flight = Future()
+            self._inflight[key] = flight
+            return flight, True
+
+    def _land_flight(self, key, flight, response=None, error=None, remember=False):
+        """
+        Publish the leader's outcome to every caller waiting on `flight`, and
+        keep the response for later identical requests if `remember` (only
+        deterministic, temperature-0 requests).
+        """
+        if flight is None:
+            return
+        with self._flight_lock:
+            self._inflight.pop(key, None)
+            if error is None and remember:
+                self._remember(key, response)
+        if flight.cancelled():
+            return
+        if error is None:
+            flight.set_result(response)
+        else:
+            flight.set_exception(error)
+
+    def _remember(self, key, response):
+        """Keep a completed response for reuse (caller holds _flight_lock)."""
+        if response is None or self.dedupe_size <= 0:
+            return
+        self._completed[key] = response
+        self._completed.move_to_end(key)
+        while len(self._completed) > self.dedupe_size:
+            self._completed.popitem(last=False)
+
+    def _cache_get(self, key, stats=None):
+        """Look up the on-disk response cache."""
+        if self.cache is None:
+            return None
+        response = self.cache.get(key)
+        if stats is not None:
+            stats["cache_hit"] = response is not None
+        return response
+
+    def _cache_set(self, key, response):
+        """Store a response in the on-disk response cache."""
+        if self.cache is not None and response is not None:
+            self.cache.set(key, response)
+
+    def _request_cost(self, prompt, system_message, max_tokens):
+        """Estimated tokens/minute cost of a request for the rate limiter."""
+        return (
+            self.estimate_token_count(system_message)
+            + self.estimate_token_count(prompt)
+            + max_tokens
+        )
+
+    def _failure_delay(self, error, attempt):
+        """
+        Seconds to wait before retrying after `error`.
+
+        Rate-limit errors are reported to the shared limiter, which then holds
+        every caller for the provider's Retry-After (or until its buckets
+        refill), so the caller itself does not need to sleep. Other retryable
+        errors back off exponentially with jitter.
+        """
+        headers = error_headers(error)
+        retry_after = parse_retry_after(headers)
+        if self.rate_limiter is not None and error_status(error) == 429:
+            self.rate_limiter.update_from_headers(headers)
+            if retry_after is None:
+                self.rate_limiter.penalize()
+            return 0
+        return self.retry_policy.backoff(attempt, retry_after)
+
+    def _should_retry(self, error, attempt, num_try, start, stats):
+        """
+        Record a failed attempt and decide whether to retry.
+
+        Returns:
+        - delay: Seconds to wait before the next attempt, or None to give up
+        """
+        reason = str(error) or type(error).__name__
+        stats["errors"].append(f"{type(error).__name__}: {error}")
+        if not self.retry_policy.is_retryable(error):
+            print(f"Attempt {attempt + 1}/{num_try} failed (not retryable): {reason}")
+            return None
+        print(f"Attempt {attempt + 1}/{num_try} failed: {reason}")
+        if attempt >= num_try - 1:
+            return None
+        delay = self._failure_delay(error, attempt)
+        if not self.retry_policy.within_deadline(time.perf_counter() - start, delay):
+            return None
+        return delay
+
+    def _prompt_with_retries(
+        self,
+        prompt,
+        max_tokens,
+        temperature,
+        top_p,
+        system_message,
+        num_try,
+        stats,
+    ):
+        """Send one prompt to the backend, retrying on failure."""
+        num_try = num_try or self.retry_policy.max_attempts
+        if self.rate_limiter is not None:
+            cost = self._request_cost(prompt, system_message, max_tokens)
+
+        start = time.perf_counter()
+        for attempt in range(num_try):
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(cost)
+            stats["attempts"] = attempt + 1
+            try:
+                response, usage = self._call(
+                    prompt,
+                    max_tokens,
+                    temperature,
+                    top_p,
+                    system_message,
+                    timeout=self.retry_policy.timeout,
+                )
+                stats["prompt_tokens"], stats["completion_tokens"] = usage
+                return response
+            except Exception as e:
+                delay = self._should_retry(e, attempt, num_try, start, stats)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+
+    def _call(
+        self,
+        prompt,
+        max_tokens,
+        temperature,
+        top_p,
+        system_message,
+        timeout=None,
+    ):
+        """
+        Send one prompt to the backend (single attempt).
 
         Returns:
         - response: Response text
+        - usage: (prompt_tokens, completion_tokens) as reported by the backend
         """
         # Formatting prompt
         message = [
@@ -168,158 +824,511 @@ class APIClient:
             {"role": "user", "content": prompt},
         ]
 
-        for attempt in range(num_try):
-            try:
-                if self.api in ["openai", "azure", "ollama", "openai-compatible"]:
-                    completion = self.client.chat.completions.create(
-                        model=self.model,
-                        messages=message,
-                        max_tokens=max_tokens,
-                        temperature=temperature,
-                        top_p=top_p,
-                    )
-                    if verbose:
-                        print(
-                            "Prompt token usage:",
-                            completion.usage.prompt_tokens,
-                            f"~${completion.usage.prompt_tokens/1000000*5}",
-                        )
-                        print(
-                            "Response token usage:",
-                            completion.usage.completion_tokens,
-                            f"~${completion.usage.completion_tokens/1000000*15}",
-                        )
-                    return completion.choices[0].message.content
+        if self.api in ["openai", "azure", "ollama", "openai-compatible"]:
+            request = dict(
+                model=self.model,
+                messages=message,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                top_p=top_p,
+            )
+            if timeout is not None:
+                request["timeout"] = timeout
+            if self.rate_limiter is not None:
+                raw = self.client.chat.completions.with_raw_response.create(**request)
+                self.rate_limiter.update_from_headers(raw.headers)
+                completion = raw.parse()
+            else:
+                completion = self.client.chat.completions.create(**request)
+            return completion.choices[0].message.content, _usage(completion)
+
+        elif self.api == "vertex" and self.model.startswith("claude"):
+            # Vertex can target either Claude via AnthropicVertex or Gemini via vertexai
+            client = self.client
+            request = dict(
+                model=self.model,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                system=system_message,
+                messages=[message[1]],
+            )
+            if timeout is not None:
+                request["timeout"] = timeout
+            if self.rate_limiter is not None:
+                raw = client.messages.with_raw_response.create(**request)
+                self.rate_limiter.update_from_headers(raw.headers)
+                message = raw.parse()
+            else:
+                message = client.messages.create(**request)
+            return message.content[0].text, _usage(message)
 
-                elif self.api == "vertex":
-                    # Vertex can target either Claude via AnthropicVertex or Gemini via vertexai
-                    if self.model.startswith("claude"):
-                        from anthropic import AnthropicVertex
+        elif self.api == "vertex":
+            config, safety_config = self._vertex_generation_args(
+                max_tokens, temperature, top_p
+            )
+            # The Vertex SDK takes no timeout, so the call is bounded from outside
+            response = call_with_timeout(
+                self.model_obj.generate_content,
+                timeout,
+                system_message
+                + prompt,  # Didn't find a way to add system message in the API
+                generation_config=config,
+                safety_settings=safety_config,
+            )
+            return response.text.strip(), _usage(response)
 
-                        client = AnthropicVertex(
-                            region=os.environ["VERTEX_LOCATION"],
-                            project_id=os.environ["VERTEX_PROJECT"],
-                        )
-                        message = client.messages.create(
-                            model=self.model,
-                            max_tokens=max_tokens,
-                            temperature=temperature,
-                            system=system_message,
-                            messages=[message[1]],
+        elif self.api == "vllm":
+            responses, usage = self._generate_batch(
+                [prompt], max_tokens, temperature, top_p, system_message
+            )
+            return responses[0], usage
+
+        elif self.api == "mock":
+            return self.client.complete(prompt, system_message, max_tokens, timeout)
+
+        elif self.api == "gemini":
+            config, safety_config = self._gemini_generation_args(
+                max_tokens, temperature, top_p
+            )
+            response = self.model_obj.generate_content(
+                system_message
+                + prompt,  # Didn't find a way to add system message in the API
+                generation_config=config,
+                safety_settings=safety_config,
+                request_options={"timeout": timeout} if timeout else None,
+            )
+            return response.text.strip(), _usage(response)
+
+    def _vertex_generation_args(self, max_tokens, temperature, top_p):
+        """Build the generation and safety config for Gemini on Vertex."""
+        from vertexai.generative_models import (
+            GenerationConfig,
+            HarmBlockThreshold,
+            HarmCategory,
+            SafetySetting,
+        )
+
+        config = GenerationConfig(
+            max_output_tokens=max_tokens,
+            temperature=temperature,
+            top_p=top_p,
+        )
+        # safety config
+        safety_config = [
+            SafetySetting(
+                category=HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT,
+                threshold=HarmBlockThreshold.BLOCK_NONE,
+            ),
+            SafetySetting(
+                category=HarmCategory.HARM_CATEGORY_HARASSMENT,
+                threshold=HarmBlockThreshold.BLOCK_NONE,
+            ),
+            SafetySetting(
+                category=HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT,
+                threshold=HarmBlockThreshold.BLOCK_NONE,
+            ),
+            SafetySetting(
+                category=HarmCategory.HARM_CATEGORY_HATE_SPEECH,
+                threshold=HarmBlockThreshold.BLOCK_NONE,
+            ),
+        ]
+        return config, safety_config
+
+    def _gemini_generation_args(self, max_tokens, temperature, top_p):
+        """Build the generation and safety config for the Gemini API."""
+        import google.generativeai as genai
+
+        config = genai.types.GenerationConfig(
+            max_output_tokens=max_tokens,
+            temperature=temperature,
+            top_p=top_p,
+        )
+        # safety config
+        safety_config = {
+            genai.types.HarmCategory.HARM_CATEGORY_HATE_SPEECH: genai.types.HarmBlockThreshold.BLOCK_NONE,
+            genai.types.HarmCategory.HARM_CATEGORY_HARASSMENT: genai.types.HarmBlockThreshold.BLOCK_NONE,
+            genai.types.HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: genai.types.HarmBlockThreshold.BLOCK_NONE,
+            genai.types.HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: genai.types.HarmBlockThreshold.BLOCK_NONE,
+        }
+        return config, safety_config
+
+    def _get_async_client(self):
+        """
+        Return the async SDK client bound to the running event loop.
+
+        Async HTTP clients cannot be shared across event loops, so one client
+        is created lazily per loop and reused by every coroutine on it.
+        """
+        loop = asyncio.get_running_loop()
+        with self._async_lock:
+            client = self._async_clients.get(loop)
+            if client is not None:
+                return client
+
+            if self.api == "openai":
+                from openai import AsyncOpenAI
+
+                client = AsyncOpenAI(
+                    api_key=os.environ["OPENAI_API_KEY"],
+                    http_client=_http_client(asynchronous=True),
+                )
+            elif self.api == "ollama":
+                from openai import AsyncOpenAI
+
+                client = AsyncOpenAI(
+                    base_url="http://localhost:11434/v1",
+                    api_key="ollama",  # required, but unused
+                    http_client=_http_client(asynchronous=True),
+                )
+            elif self.api == "azure":
+                from openai import AsyncAzureOpenAI
+
+                client = AsyncAzureOpenAI(
+                    api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+                    api_version="2024-02-01",
+                    azure_endpoint=os.environ.get("AZURE_OPENAI_ENDPOINT"),
+                    http_client=_http_client(asynchronous=True),
+                )
+            elif self.api == "openai-compatible":
+                from openai import AsyncOpenAI
+
+                client = AsyncOpenAI(
+                    base_url=self.base_url,
+                    api_key=self.api_key,
+                    http_client=_http_client(asynchronous=True),
+                )
+            elif self.api == "vertex" and self.model.startswith("claude"):
+                from anthropic import AsyncAnthropicVertex
+
+                client = AsyncAnthropicVertex(
+                    region=os.environ["VERTEX_LOCATION"],
+                    project_id=os.environ["VERTEX_PROJECT"],
+                )
+            else:
+                # Gemini (direct or on Vertex) exposes async methods on the
+                # model object itself.
+                client = self.model_obj
+            self._async_clients[loop] = client
+            return client
+
+    async def _async_call(self, prompt, max_tokens, temperature, top_p, system_message):
+        """Async counterpart of _call; returns (response, usage)."""
+        message = [
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": prompt},
+        ]
+        if self.api == "vllm":
+            # Offline vLLM has no async engine here; run it off the loop.
+            responses, usage = await asyncio.to_thread(
+                self._generate_batch,
+                [prompt],
+                max_tokens,
+                temperature,
+                top_p,
+                system_message,
+            )
+            return responses[0], usage
+        if self.api == "mock":
+            return await self.client.acomplete(prompt, system_message, max_tokens)
+
+        client = self._get_async_client()
+        if self.api in ["openai", "azure", "ollama", "openai-compatible"]:
+            request = dict(
+                model=self.model,
+                messages=message,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                top_p=top_p,
+            )
+            if self.rate_limiter is not None:
+                raw = await client.chat.completions.with_raw_response.create(**request)
+                self.rate_limiter.update_from_headers(raw.headers)
+                completion = raw.parse()
+            else:
+                completion = await client.chat.completions.create(**request)
+            return completion.choices[0].message.content, _usage(completion)
+        elif self.api == "vertex" and self.model.startswith("claude"):
+            request = dict(
+                model=self.model,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                system=system_message,
+                messages=[message[1]],
+            )
+            if self.rate_limiter is not None:
+                raw = await client.messages.with_raw_response.create(**request)
+                self.rate_limiter.update_from_headers(raw.headers)
+                response = raw.parse()
+            else:
+                response = await client.messages.create(**request)
+            return response.content[0].text, _usage(response)
+        elif self.api == "vertex":
+            config, safety_config = self._vertex_generation_args(
+                max_tokens, temperature, top_p
+            )
+        else:
+            config, safety_config = self._gemini_generation_args(
+                max_tokens, temperature, top_p
+            )
+        response = await client.generate_content_async(
+            system_message + prompt,
+            generation_config=config,
+            safety_settings=safety_config,
+        )
+        return response.text.strip(), _usage(response)
+
+    async def async_iterative_prompt(
+        self,
+        prompt: str,
+        max_tokens: int,
+        temperature: float,
+        top_p: float = 1.0,
+        system_message: str = "You are a helpful assistant.",
+        num_try: int = None,
+        verbose: bool = False,
+        return_stats: bool = False,
+    ):
+        """
+        Async counterpart of iterative_prompt
+
+        Parameters:
+        - prompt: Prompt text
+        - max_tokens: Maximum token count
+        - temperature: Temperature for sampling
+        - top_p: Top p value for sampling
+        - system_message: System message
+        - num_try: Number of attempts (defaults to retry_policy.max_attempts)
+        - verbose: Verbose mode
+        - return_stats: Also return the stats dict described in iterative_prompt
+
+        Returns:
+        - response: Response text (or (response, stats) if return_stats)
+        """
+        start = time.perf_counter()
+        stats = self._new_stats()
+        key = self._request_key(prompt, max_tokens, temperature, top_p, system_message)
+        flight, leader = self._join_flight(key)
+        try:
+            if not leader:
+                stats["deduplicated"] = True
+                # Shielded so a cancelled waiter does not cancel the flight
+                response = await asyncio.shield(asyncio.wrap_future(flight))
+            else:
+                try:
+                    response = self._cache_get(key, stats)
+                    if response is None:
+                        response = await self._async_prompt_with_retries(
+                            prompt,
+                            max_tokens,
+                            temperature,
+                            top_p,
+                            system_message,
+                            num_try,
+                            stats,
                         )
-                        message_json_str = message.model_dump_json(indent=2)
-                        message_dict = json.loads(message_json_str)
-                        text_content = message_dict["content"][0]["text"]
                         if verbose:
-                            print(
-                                "Prompt usage:",
-                                message_dict["usage"]["input_tokens"],
-                                f"${message_dict['usage']['input_tokens']/1000000*3}",
-                            )
-                            print(
-                                "Prompt usage:",
-                                message_dict["usage"]["output_tokens"],
-                                f"${message_dict['usage']['output_tokens']/1000000*15}",
-                            )
-                        return text_content
-                    else:
-                        from vertexai.generative_models import (
-                            GenerationConfig,
-                            HarmBlockThreshold,
-                            HarmCategory,
-                            SafetySetting,
-                        )
+                            print(f"Response: {response}")
+                        self._cache_set(key, response)
+                except BaseException as e:
+                    self._land_flight(key, flight, error=e)
+                    raise
+                self._land_flight(key, flight, response, remember=temperature == 0)
+        except Exception as e:
+            stats["latency"] = time.perf_counter() - start
+            e.prompt_stats = stats
+            self._record(stats, error=e)
+            raise
+        stats["latency"] = time.perf_counter() - start
+        self._record(stats)
+        if verbose and stats["attempts"]:
+            print(
+                "Token usage:",
+                stats["prompt_tokens"],
+                "prompt,",
+                stats["completion_tokens"],
+                "completion",
+            )
+        return (response, stats) if return_stats else response
 
-                        config = GenerationConfig(
-                            max_output_tokens=max_tokens,
-                            temperature=temperature,
-                            top_p=top_p,
-                        )
-                        # safety config
-                        safety_config = [
-                            SafetySetting(
-                                category=HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT,
-                                threshold=HarmBlockThreshold.BLOCK_NONE,
-                            ),
-                            SafetySetting(
-                                category=HarmCategory.HARM_CATEGORY_HARASSMENT,
-                                threshold=HarmBlockThreshold.BLOCK_NONE,
-                            ),
-                            SafetySetting(
-                                category=HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT,
-                                threshold=HarmBlockThreshold.BLOCK_NONE,
-                            ),
-                            SafetySetting(
-                                category=HarmCategory.HARM_CATEGORY_HATE_SPEECH,
-                                threshold=HarmBlockThreshold.BLOCK_NONE,
-                            ),
-                        ]
-
-                        try:
-                            response = self.model_obj.generate_content(
-                                system_message
-                                + prompt,  # Didn't find a way to add system message in the API
-                                generation_config=config,
-                                safety_settings=safety_config,
-                            )
-                            return response.text.strip()
-                        except:  # Avoid rate limiting issues
-                            traceback.print_exc()
-                            time.sleep(60)
-
-                elif self.api == "vllm":
-                    sampling_params = self.sampling_params_class(
-                        temperature=temperature,
-                        top_p=top_p,
-                        max_tokens=max_tokens,
-                        stop_token_ids=[
-                            self.tokenizer.eos_token_id,
-                            self.tokenizer.convert_tokens_to_ids("<|eot_id|>"),
-                        ],
-                    )
-                    final_prompt = self.tokenizer.apply_chat_template(
-                        message,
-                        tokenize=False,
-                        add_generation_prompt=True,
-                    )
-                    vllm_output = self.llm.generate([final_prompt], sampling_params)
-                    return [output.outputs[0].text for output in vllm_output][0]
-
-                elif self.api == "gemini":
-                    import google.generativeai as genai
-
-                    genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
-                    self.model_obj = genai.GenerativeModel(self.model)
-                    config = genai.types.GenerationConfig(
-                        max_output_tokens=max_tokens,
-                        temperature=temperature,
-                        top_p=top_p,
-                    )
-                    # safety config
-                    safety_config = {
-                        genai.types.HarmCategory.HARM_CATEGORY_HATE_SPEECH: genai.types.HarmBlockThreshold.BLOCK_NONE,
-                        genai.types.HarmCategory.HARM_CATEGORY_HARASSMENT: genai.types.HarmBlockThreshold.BLOCK_NONE,
-                        genai.types.HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: genai.types.HarmBlockThreshold.BLOCK_NONE,
-                        genai.types.HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: genai.types.HarmBlockThreshold.BLOCK_NONE,
-                    }
-                    try:
-                        response = self.model_obj.generate_content(
-                            system_message
-                            + prompt,  # Didn't find a way to add system message in the API
-                            generation_config=config,
-                            safety_settings=safety_config,
-                        )
-                        return response.text.strip()
-                    except:  # Avoid rate limiting issues
-                        traceback.print_exc()
-                        time.sleep(60)
+    async def _async_prompt_with_retries(
+        self, prompt, max_tokens, temperature, top_p, system_message, num_try, stats
+    ):
+        """Async counterpart of _prompt_with_retries."""
+        num_try = num_try or self.retry_policy.max_attempts
+        if self.rate_limiter is not None:
+            cost = self._request_cost(prompt, system_message, max_tokens)
 
+        start = time.perf_counter()
+        for attempt in range(num_try):
+            if self.rate_limiter is not None:
+                await self.rate_limiter.async_acquire(cost)
+            stats["attempts"] = attempt + 1
+            try:
+                response, usage = await asyncio.wait_for(
+                    self._async_call(
+                        prompt, max_tokens, temperature, top_p, system_message
+                    ),
+                    self.retry_policy.timeout,
+                )
+                stats["prompt_tokens"], stats["completion_tokens"] = usage
+                return response
             except Exception as e:
-                print(f"Attempt {attempt + 1}/{num_try} failed: {e}")
-                if attempt < num_try - 1:
-                    time.sleep(60)  # avoid rate limiting issues
-                else:
+                delay = self._should_retry(e, attempt, num_try, start, stats)
+                if delay is None:
                     raise
+                await asyncio.sleep(delay)
+
+    async def async_batch_prompt(
+        self,
+        prompts,
+        max_tokens: int,
+        temperature: float,
+        top_p: float = 1.0,
+        system_message: str = "You are a helpful assistant.",
+        concurrency: int = 16,
+        num_try: int = None,
+        verbose: bool = False,
+        return_exceptions: bool = False,
+        progress: str = None,
+    ):
+        """
+        Prompting API concurrently with at most `concurrency` requests in flight
+
+        Parameters:
+        - prompts: Iterable of prompts (consumed lazily, so a generator keeps
+          prompt construction bounded by the number of in-flight requests)
+        - max_tokens: Maximum token count
+        - temperature: Temperature for sampling
+        - top_p: Top p value for sampling
+        - system_message: System message
+        - concurrency: Maximum number of in-flight requests
+        - num_try: Number of attempts per prompt (defaults to the retry policy)
+        - verbose: Verbose mode
+        - return_exceptions: Return exceptions in place of failed responses
+          instead of raising the first one
+        - progress: Description for a progress bar (None to disable)
+
+        Returns:
+        - responses: List of response texts, in input order
+        """
+        if self.api == "vllm":
+            # vLLM batches internally; hand it the whole list at once.
+            return await asyncio.to_thread(
+                self.batch_prompt,
+                list(prompts),
+                max_tokens,
+                temperature,
+                top_p,
+                system_message,
+            )
+
+        semaphore = asyncio.Semaphore(concurrency)
+        bar = tqdm(desc=progress, unit="doc") if progress else None
+
+        async def _run(prompt):
+            try:
+                return await self.async_iterative_prompt(
+                    prompt,
+                    max_tokens,
+                    temperature,
+                    top_p=top_p,
+                    system_message=system_message,
+                    num_try=num_try,
+                    verbose=verbose,
+                )
+            finally:
+                semaphore.release()
+                if bar is not None:
+                    bar.update(1)
+
+        # Lazy prompts (tokenization, topic pruning) are built in a worker
+        # thread, so the requests already in flight keep being serviced
+        lazy = not isinstance(prompts, (list, tuple))
+        prompts = iter(prompts)
+        tasks = []
+        while True:
+            if lazy:
+                prompt = await asyncio.to_thread(next, prompts, _EXHAUSTED)
+            else:
+                prompt = next(prompts, _EXHAUSTED)
+            if prompt is _EXHAUSTED:
+                break
+            await semaphore.acquire()
+            tasks.append(asyncio.ensure_future(_run(prompt)))
+        if bar is not None:
+            bar.total = len(tasks)
+            bar.refresh()
+        try:
+            return await asyncio.gather(*tasks, return_exceptions=return_exceptions)
+        finally:
+            if bar is not None:
+                bar.close()
+
+    def concurrent_prompt(self, prompts, max_tokens, temperature, **kwargs):
+        """
+        Synchronous wrapper around async_batch_prompt
+
+        Parameters:
+        - prompts: Iterable of prompts
+        - max_tokens: Maximum token count
+        - temperature: Temperature for sampling
+        - kwargs: Forwarded to async_batch_prompt
+
+        Returns:
+        - responses: List of response texts, in input order
+        """
+        # Every call runs on the client's one long-lived loop, so the async
+        # SDK client and its connection pool are reused across calls
+        future = asyncio.run_coroutine_threadsafe(
+            self.async_batch_prompt(prompts, max_tokens, temperature, **kwargs),
+            self._event_loop(),
+        )
+        try:
+            return future.result()
+        except BaseException:
+            future.cancel()
+            raise
+
+    def _event_loop(self):
+        """The client's event loop, started in a daemon thread on first use."""
+        with self._async_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=loop.run_forever, name="topicgpt-api-loop", daemon=True
+                )
+                thread.start()
+                self._loop = loop
+                self._loop_closer = weakref.finalize(
+                    self, _close_event_loop, loop, thread, self._async_clients
+                )
+            return self._loop
+
+    def close(self):
+        """Close the async SDK clients and stop the client's event loop."""
+        with self._async_lock:
+            closer, self._loop, self._loop_closer = self._loop_closer, None, None
+        if closer is not None:
+            closer()
+
+    def stage_summary(self, summary_file=None, verbose=False):
+        """
+        Summarize the telemetry recorded for the current stage
+
+        Parameters:
+        - summary_file: Optional JSON file to write the summary to
+        - verbose: Print the summary
+
+        Returns:
+        - summary: Telemetry.summary() for self.stage
+        """
+        if summary_file:
+            summary = self.telemetry.write_summary(summary_file, self.stage)
+        else:
+            summary = self.telemetry.summary(self.stage)
+        if verbose:
+            print(f"Run summary ({self.stage}):", json.dumps(summary, indent=2))
+        return summary
 
     def batch_prompt(
         self,
@@ -345,6 +1354,94 @@ class APIClient:
         if self.api != "vllm":
             raise ValueError("Batch prompting not supported for this API.")
 
+        # Identical prompts are generated once and fanned back out
+        unique = list(dict.fromkeys(prompts)) if self.dedupe else list(prompts)
+        keys = [
+            self._request_key(prompt, max_tokens, temperature, top_p, system_message)
+            for prompt in unique
+        ]
+        responses = []
+        for key in keys:
+            response = None
+            if self.dedupe:
+                with self._flight_lock:
+                    response = self._completed.get(key)
+            if response is None:
+                response = self._cache_get(key)
+            responses.append(response)
+
+        missing = [i for i, response in enumerate(responses) if response is None]
+        if missing:
+            start = time.perf_counter()
+            generated, usage = self._generate_batch(
+                [unique[i] for i in missing],
+                max_tokens,
+                temperature,
+                top_p,
+                system_message,
+            )
+            stats = self._new_stats()
+            stats["attempts"] = 1
+            stats["latency"] = time.perf_counter() - start
+            stats["prompt_tokens"], stats["completion_tokens"] = usage
+            self._record(stats, requests=len(missing))
+            for i, response in zip(missing, generated):
+                responses[i] = response
+                self._cache_set(keys[i], response)
+        if not self.dedupe:
+            return responses
+
+        if temperature == 0:
+            with self._flight_lock:
+                for key, response in zip(keys, responses):
+                    self._remember(key, response)
+        by_prompt = dict(zip(unique, responses))
+        return [by_prompt[prompt] for prompt in prompts]
+
+    def batch_prompt_iter(
+        self,
+        prompts,
+        max_tokens: int,
+        temperature: float,
+        top_p: float = 1.0,
+        system_message: str = "You are a helpful assistant.",
+        chunk_size: int = 512,
+    ):
+        """
+        Chunked batch prompting for vLLM API
+
+        Prompts are pulled from the iterable `chunk_size` at a time, so peak
+        memory is bounded by one chunk of prompts and outputs, and results are
+        available as soon as their chunk finishes.
+
+        Parameters:
+        - prompts: Iterable of prompts (consumed lazily)
+        - max_tokens: Maximum token count
+        - temperature: Temperature for sampling
+        - top_p: Top p value for sampling
+        - system_message: System message
+        - chunk_size: Number of prompts per vLLM generate call
+
+        Yields:
+        - responses: List of response texts for each chunk, in input order
+        """
+        prompts = iter(prompts)
+        while True:
+            chunk = list(islice(prompts, chunk_size))
+            if not chunk:
+                return
+            yield self.batch_prompt(
+                chunk, max_tokens, temperature, top_p, system_message
+            )
+
+    def _generate_batch(self, prompts, max_tokens, temperature, top_p, system_message):
+        """
+        Run a list of prompts through vLLM in one generate call.
+
+        Returns:
+        - responses: Response texts, in input order
+        - usage: Total (prompt_tokens, completion_tokens) of the batch
+        """
         sampling_params = self.sampling_params_class(
             # only reachable when self.api == "vllm"
             temperature=temperature,
@@ -370,7 +1467,70 @@ class APIClient:
             for message in prompt_formatted
         ]
         outputs = self.llm.generate(final_prompts, sampling_params)
-        return [output.outputs[0].text for output in outputs]
+        usage = (
+            sum(len(output.prompt_token_ids or []) for output in outputs),
+            sum(len(output.outputs[0].token_ids) for output in outputs),
+        )
+        return [output.outputs[0].text for output in outputs], usage
+
+
+@contextmanager
+def paused_gc():
+    """
+    Pause the cyclic garbage collector while building many objects at once
+    (tree loads), where repeated collections would dominate the cost.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+class TopicNode(Node):
+    """
+    anytree Node that keeps the TopicTree it belongs to up to date.
+
+    Attaching or detaching a node (including `node.parent = None`) updates
+    the tree's (level, name) index for the node's whole subtree, and any
+    change to the tree's nodes (structure, name, lvl, count, desc) bumps the
+    tree's version.
+    """
+
+    TRACKED = ("name", "lvl", "count", "desc")
+
+    def _topic_tree(self):
+        return self.root.__dict__.get("_tree")
+
+    def __setattr__(self, key, value):
+        if key in TopicNode.TRACKED and key in self.__dict__:
+            tree = self._topic_tree()
+            if tree is not None:
+                reindex = key in ("name", "lvl")
+                if reindex:
+                    tree._unindex(self)
+                super().__setattr__(key, value)
+                if reindex:
+                    tree._index(self)
+                tree.version += 1
+                return
+        super().__setattr__(key, value)
+
+    def _post_attach(self, parent):
+        tree = self._topic_tree()
+        if tree is not None:
+            for node in (self,) + self.descendants:
+                tree._index(node)
+            tree.version += 1
+
+    def _pre_detach(self, parent):
+        tree = self._topic_tree()
+        if tree is not None:
+            for node in (self,) + self.descendants:
+                tree._unindex(node)
+            tree.version += 1
 
 
 class TopicTree:
@@ -383,6 +1543,7 @@ class TopicTree:
     Attributes:
     - root: Root node of the tree
     - level_nodes: Dictionary of nodes by level
+    - version: Incremented on every change to the tree's nodes
 
     Methods:
     - node_to_str: Convert a node to a string representation
@@ -392,16 +1553,67 @@ class TopicTree:
     - _remove_node_by_name_lvl: Remove a node by name and level
     - to_prompt_view: Generate a string representation of the tree with indentation by level
     - find_duplicates: Find nodes with the same name and level in the tree
-    - to_file: Save the tree to a file
+    - find: Find the first node with a given name and level
+    - to_file: Save the tree to a file (and its JSON sidecar)
+    - sidecar_path: Path of the JSON sidecar for a topic file
     - to_topic_list: Convert the tree to a list of topic strings
     - get_root_descendants_name: Get the root description
     - update_tree: Update the topic tree by merging a set of topics into a new topic
     """
 
     def __init__(self, root_name="Topics"):
-        self.root = Node(name=root_name, lvl=0, count=1, desc="Root topic", parent=None)
+        self.version = 0
+        # (lvl, casefolded name) -> nodes, and per-version caches
+        self._nodes = {}
+        self._order = (None, {})
+        self._topic_lists = {}
+        self.root = TopicNode(
+            name=root_name, lvl=0, count=1, desc="Root topic", parent=None
+        )
+        self.root._tree = self
         self.level_nodes = {0: self.root}
 
+    @staticmethod
+    def _key(name, lvl):
+        return lvl, name.casefold()
+
+    def _index(self, node):
+        self._nodes.setdefault(self._key(node.name, node.lvl), []).append(node)
+
+    def _unindex(self, node):
+        key = self._key(node.name, node.lvl)
+        nodes = self._nodes.get(key, [])
+        if node in nodes:
+            nodes.remove(node)
+            if not nodes:
+                del self._nodes[key]
+
+    def _lookup(self, name, lvl):
+        """Nodes with the given level and (case-insensitive) name, in tree order."""
+        nodes = self._nodes.get(self._key(name, lvl), [])
+        if len(nodes) > 1:
+            version, order = self._order
+            if version != self.version:
+                order = {id(n): i for i, n in enumerate(self.root.descendants)}
+                self._order = (self.version, order)
+            nodes = sorted(nodes, key=lambda n: order[id(n)])
+        return list(nodes)
+
+    def _child(self, parent_node, name, lvl):
+        """First child of parent_node with the given level and exact name."""
+        bucket = self._nodes.get(self._key(name, lvl), ())
+        if not bucket and parent_node.root is self.root:
+            return None
+        # Scan whichever is shorter: the siblings, or the unsorted bucket
+        # (sorting it into tree order would cost a pre-order walk per change)
+        children = parent_node.children
+        if len(children) <= len(bucket) or parent_node.root is not self.root:
+            return next((n for n in children if n.lvl == lvl and n.name == name), None)
+        matches = [n for n in bucket if n.parent is parent_node and n.name == name]
+        if len(matches) > 1:
+            matches.sort(key=children.index)
+        return matches[0] if matches else None
+
     @staticmethod
     def node_to_str(node, count=True, desc=True):
         """
@@ -424,19 +1636,33 @@ class TopicTree:
         else:
             return f"[{node.lvl}] {node.name} (Count: {node.count}): {node.desc}"
 
-    @staticmethod
-    def from_topic_list(topic_src, from_file=False):
+    @classmethod
+    def from_topic_list(cls, topic_src, from_file=False):
         """
         Construct a TopicTree from a list of topic strings or a file.
 
         Parameters:
         - topic_src: List of topic strings or path to a file
-        - from_file: Flag to indicate if the source is a file
+        - from_file: Flag to indicate if the source is a file (its JSON
+          sidecar is used instead when it is current)
 
         Returns:
         - tree: Constructed TopicTree
         """
-        tree = TopicTree()
+        if from_file:
+            payload = cls._load_sidecar(topic_src)
+            if payload is not None:
+                with paused_gc():
+                    return cls._from_records(payload["root"], payload["nodes"])
+        tree = cls()
+        with paused_gc():
+            for lvl, label, count, desc in cls._parse_topic_list(topic_src, from_file):
+                tree._add_node(lvl, label, count, desc, tree.level_nodes.get(lvl - 1))
+        return tree
+
+    @staticmethod
+    def _parse_topic_list(topic_src, from_file=False):
+        """Yield (lvl, label, count, desc) for each "[lvl] label (Count: n): desc" line."""
         topic_list = open(topic_src, "r").readlines() if from_file else topic_src
         topic_list = [topic for topic in topic_list if len(topic.strip()) > 0]
         pattern = regex.compile(r"^\[(\d+)\] (.+) \(Count: (\d+)\)\s?:(.+)?")
@@ -445,7 +1671,7 @@ class TopicTree:
             if not topic.strip():
                 continue
             try:
-                match = regex.match(pattern, topic.strip())
+                match = pattern.match(topic.strip())
                 lvl, label, count, desc = (
                     int(match.group(1)),
                     match.group(2).strip(),
@@ -457,9 +1683,7 @@ class TopicTree:
                 print("Error reading", topic)
                 traceback.print_exc()
 
-            tree._add_node(lvl, label, count, desc, tree.level_nodes.get(lvl - 1))
-
-        return tree
+            yield lvl, label, count, desc
 
     def from_seed_file(self, seed_file):
         """
@@ -471,7 +1695,7 @@ class TopicTree:
         Returns:
         - tree: Constructed TopicTree
         """
-        tree = TopicTree()
+        tree = type(self)()
         topic_list = open(seed_file, "r").readlines() if seed_file else []
         topic_list = [topic for topic in topic_list if len(topic.strip()) > 0]
         pattern = regex.compile(r"^\[(\d+)\] (.+)")
@@ -480,7 +1704,7 @@ class TopicTree:
             if not topic.strip():
                 continue
             try:
-                match = regex.match(pattern, topic.strip())
+                match = pattern.match(topic.strip())
                 lvl, label = (
                     int(match.group(1)),
                     match.group(2).strip(),
@@ -504,16 +1728,21 @@ class TopicTree:
         - count: Count of the node
         - desc: Description of the node
         - parent_node: Parent node of the new node
+
+        Returns:
+        - node: The new or existing node (None without a parent)
         """
         if parent_node:
-            existing = next((n for n in parent_node.children if n.name == label), None)
+            existing = self._child(parent_node, label, lvl)
             if existing:
                 existing.count += count
+                return existing
             else:
-                new_node = Node(
+                new_node = TopicNode(
                     name=label, lvl=lvl, count=count, desc=desc, parent=parent_node
                 )
                 self.level_nodes[lvl] = new_node
+                return new_node
 
     def _remove_node_by_name_lvl(self, name, lvl):
         """
@@ -523,9 +1752,7 @@ class TopicTree:
         - name: Name of the node
         - lvl: Level of the node
         """
-        node = next(
-            (n for n in self.root.descendants if n.name == name and n.lvl == lvl), None
-        )
+        node = self.find(name, lvl, exact=True)
         if node:
             node.parent = None
 
@@ -564,24 +1791,118 @@ class TopicTree:
         Returns:
         - list: List of nodes with the same name and level
         """
-        return [
-            node
-            for node in self.root.descendants
-            if node.name.lower() == name.lower() and node.lvl == level
-        ]
+        return self._lookup(name, level)
 
-    def to_file(self, fname):
+    def find(self, name, level, exact=False):
+        """
+        Find the first node with a given name and level.
+
+        Parameters:
+        - name: Name of the node (case-insensitive unless exact)
+        - level: Level of the node
+        - exact: Require the name to match case-sensitively
+
+        Returns:
+        - node: The first matching node in tree order, or None
+        """
+        return next(
+            (n for n in self._lookup(name, level) if not exact or n.name == name),
+            None,
+        )
+
+    def to_file(self, fname, sidecar=True):
         """
         Save the tree to a file.
 
         Parameters:
         - fname: Path to the file
+        - sidecar: Also write the JSON sidecar (see sidecar_path) that
+          from_topic_list loads instead of re-parsing the file
         """
+        text = "".join(
+            "    " * (node.lvl - 1) + self.node_to_str(node) + "\n"
+            for node in self.root.descendants
+            if len(node.desc) > 0
+        )
         with open(fname, "w") as f:
-            for node in self.root.descendants:
-                if len(node.desc) > 0:
-                    indentation = "    " * (node.lvl - 1)
-                    f.write(indentation + self.node_to_str(node) + "\n")
+            f.write(text)
+        if sidecar:
+            self._write_sidecar(fname)
+
+    # Sidecar serialization ------------------------------------------------
+    # "<name>.tree.json" next to a topic file holds the full tree (including
+    # nodes without descriptions, which the topic file omits) as records
+    # [parent id, lvl, count, name, desc] in pre-order, ids starting at 1
+    # (0 is the root), plus the SHA-1 of the topic file it was written with.
+
+    SIDECAR_FORMAT = "topicgpt-tree"
+    SIDECAR_VERSION = 1
+
+    @staticmethod
+    def sidecar_path(fname):
+        """Path of the JSON sidecar for a topic file."""
+        return os.path.splitext(fname)[0] + ".tree.json"
+
+    @staticmethod
+    def _file_hash(fname):
+        with open(fname, "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()
+
+    def _records(self):
+        """Pre-order [parent id, lvl, count, name, desc] records."""
+        ids, records = {id(self.root): 0}, []
+        for i, node in enumerate(self.root.descendants, 1):
+            ids[id(node)] = i
+            records.append(
+                [ids[id(node.parent)], node.lvl, node.count, node.name, node.desc]
+            )
+        return records
+
+    def _write_sidecar(self, fname):
+        path = self.sidecar_path(fname)
+        payload = {
+            "format": self.SIDECAR_FORMAT,
+            "version": self.SIDECAR_VERSION,
+            "source_sha1": self._file_hash(fname),
+            "root": self.root.name,
+            "nodes": self._records(),
+        }
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(json.dumps(payload, ensure_ascii=False, separators=(",", ":")))
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def _load_sidecar(cls, fname):
+        """The sidecar payload if it is current for fname, else None."""
+        path = cls.sidecar_path(fname)
+        try:
+            if os.path.getmtime(path) < os.path.getmtime(fname):
+                return None
+            source_sha1 = cls._file_hash(fname)
+            with open(path, "r", encoding="utf-8") as f, paused_gc():
+                payload = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if (
+            not isinstance(payload, dict)
+            or payload.get("format") != cls.SIDECAR_FORMAT
+            or payload.get("version") != cls.SIDECAR_VERSION
+            or payload.get("source_sha1") != source_sha1
+        ):
+            return None
+        return payload
+
+    @classmethod
+    def _from_records(cls, root_name, records):
+        tree = cls(root_name)
+        nodes = [tree.root]
+        for parent, lvl, count, name, desc in records:
+            node = TopicNode(
+                name=name, lvl=lvl, count=count, desc=desc, parent=nodes[parent]
+            )
+            nodes.append(node)
+            tree.level_nodes[lvl] = node
+        return tree
 
     def to_topic_list(self, desc=True, count=True):
         """
@@ -594,7 +1915,13 @@ class TopicTree:
         Returns:
         - list: List of topic strings
         """
-        return [self.node_to_str(node, count, desc) for node in self.root.descendants]
+        version, topics = self._topic_lists.get((desc, count), (None, None))
+        if version != self.version:
+            topics = [
+                self.node_to_str(node, count, desc) for node in self.root.descendants
+            ]
+            self._topic_lists[(desc, count)] = (self.version, topics)
+        return list(topics)
 
     def get_root_descendants_name(self):
         """Get the root description.
@@ -632,10 +1959,7 @@ class TopicTree:
             parent_node = self.root
 
         merged_topic_node = (
-            next(
-                (node for node in parent_node.children if node.name == new_topic_name),
-                None,
-            )
+            self._child(parent_node, new_topic_name, parent_node.lvl + 1)
             if parent_node
             else None
         )